@@ -0,0 +1,52 @@
+"""
+gunicorn configuration for myshop: `gunicorn -c gunicorn.conf.py`.
+
+The application is imported and warmed up once in the master (preload_app),
+then forked, so every worker starts with compiled URL patterns, templates and a
+primed catalog cache instead of paying for them on its first request.
+"""
+import os
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myshop.settings_production')
+
+wsgi_app = 'myshop.wsgi:application'
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+
+def _warm_up(log):
+    from mycart.warmup import warm_up
+
+    for step, (items, seconds) in warm_up().items():
+        log.info("warm-up %s: %d items in %.1f ms", step, items, seconds * 1000)
+
+
+def on_starting(server):
+    # counters left by a previous run would otherwise be added to this one's
+    from mycart.metrics import clear_directory
+
+    clear_directory()
+
+    # the shared cache outlives the workers; start from a fresh catalog version in
+    # case products changed while the site was down
+    from django.core.cache import cache
+
+    cache.clear()
+
+
+def when_ready(server):
+    # master process, after the app was preloaded and before workers fork
+    if preload_app:
+        _warm_up(server.log)
+
+
+def post_fork(server, worker):
+    from django.db import connections
+
+    connections.close_all()
+
+
+def post_worker_init(worker):
+    if not preload_app:
+        _warm_up(worker.log)
@@ -1,14 +1,123 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from django.http import HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils import timezone
+from django.utils.html import format_html
 from .models import User
 
-from .models import Product
+from .models import Product, Category, Order, ArchivedOrder, ArchivedOrderItem, ProfileCapture
+from .exports import EXPORT_FORMATS, stream_orders
+from . import profiling
+
+
+@admin.register(Category)
+class CategoryAdmin(admin.ModelAdmin):
+	list_display = ('name', 'slug')
+	prepopulated_fields = {'slug': ('name',)}
 
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-	list_display = ('id', 'name', 'price', 'old_price')
-	search_fields = ('name',)
-	list_filter = ('price',)
+	list_display = ('id', 'name', 'category', 'brand', 'price', 'old_price')
+	search_fields = ('name', 'brand')
+	list_filter = ('category', 'brand', 'price')
+	list_select_related = ('category',)
+
+
+def _export_response(queryset, fmt):
+	stamp = timezone.now().strftime('%Y%m%d-%H%M%S')
+	response = StreamingHttpResponse(stream_orders(queryset, fmt), content_type=EXPORT_FORMATS[fmt])
+	response['Content-Disposition'] = f'attachment; filename="orders-{stamp}.{fmt}"'
+	return response
+
+
+@admin.register(Order)
+class OrderAdmin(admin.ModelAdmin):
+	list_display = ('order_id', 'user', 'name', 'pincode', 'total', 'created_at')
+	search_fields = ('order_id', 'user__email', 'name')
+	date_hierarchy = 'created_at'
+	list_select_related = ('user',)
+	raw_id_fields = ('user',)
+	actions = ('export_csv', 'export_jsonl')
+
+	@admin.action(description="Export selected orders as CSV")
+	def export_csv(self, request, queryset):
+		return _export_response(queryset, 'csv')
+
+	@admin.action(description="Export selected orders as JSONL")
+	def export_jsonl(self, request, queryset):
+		return _export_response(queryset, 'jsonl')
+
+
+class ArchivedOrderItemInline(admin.TabularInline):
+	model = ArchivedOrderItem
+	extra = 0
+	can_delete = False
+	readonly_fields = ('product_id', 'product_name', 'quantity', 'price')
+
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(admin.ModelAdmin):
+	list_display = ('order_id', 'user_id', 'name', 'total', 'created_at', 'archived_at')
+	search_fields = ('order_id', 'name')
+	list_filter = ('created_at',)
+	inlines = (ArchivedOrderItemInline,)
+
+	# the archive is a record of the past; only archive_orders writes to it
+	def has_add_permission(self, request):
+		return False
+
+	def has_change_permission(self, request, obj=None):
+		return False
+
+
+@admin.register(ProfileCapture)
+class ProfileCaptureAdmin(admin.ModelAdmin):
+	list_display = ('created_at', 'method', 'path', 'view_name', 'status_code', 'duration_ms', 'samples', 'trigger')
+	list_filter = ('view_name', 'trigger')
+	search_fields = ('path',)
+	date_hierarchy = 'created_at'
+	fields = (
+		'created_at', 'method', 'path', 'view_name', 'status_code', 'duration_ms', 'samples', 'trigger',
+		'cumulative_time', 'own_time', 'stacks',
+	)
+	readonly_fields = fields
+
+	def has_add_permission(self, request):
+		return False
+
+	def has_change_permission(self, request, obj=None):
+		return False
+
+	def get_urls(self):
+		return [
+			path('<int:pk>/collapsed/', self.admin_site.admin_view(self.collapsed_view),
+				name='mycart_profilecapture_collapsed'),
+		] + super().get_urls()
+
+	def collapsed_view(self, request, pk):
+		capture = get_object_or_404(ProfileCapture, pk=pk)
+		response = HttpResponse(profiling.collapsed_stacks(capture), content_type='text/plain; charset=utf-8')
+		response['Content-Disposition'] = f'attachment; filename="{capture.name}.collapsed"'
+		return response
+
+	@admin.display(description="Top functions by cumulative time")
+	def cumulative_time(self, obj):
+		return format_html('<pre>{}</pre>', profiling.top_functions(obj, sort='cumulative'))
+
+	@admin.display(description="Top functions by own time")
+	def own_time(self, obj):
+		return format_html('<pre>{}</pre>', profiling.top_functions(obj, sort='tottime'))
+
+	@admin.display(description="Collapsed stacks")
+	def stacks(self, obj):
+		url = reverse('admin:mycart_profilecapture_collapsed', args=[obj.pk])
+		return format_html(
+			'<a href="{}">Download</a> (for flamegraph.pl or speedscope)<pre>{}</pre>',
+			url, profiling.collapsed_stacks(obj)[:20000],
+		)
+
 
 admin.site.register(User, UserAdmin)
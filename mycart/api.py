@@ -0,0 +1,122 @@
+"""Read-only JSON catalog API (v1).
+
+Rows are serialized straight from ``.values()`` so a large page never builds model
+instances. ETags are derived from the catalog version, which lets unchanged
+responses be answered with 304 before any query runs.
+"""
+import base64
+import hashlib
+
+from django.core.files.storage import default_storage
+from django.http import JsonResponse
+from django.views.decorators.http import etag, require_GET
+
+from .catalog import filter_products, get_catalog_version
+from .models import Product
+
+API_FIELDS = ('id', 'name', 'brand', 'category', 'price', 'old_price', 'image', 'description')
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 1000
+MAX_BATCH_SIZE = 1000
+
+
+class APIError(Exception):
+    pass
+
+
+def _catalog_etag(request, *args, **kwargs):
+    digest = hashlib.md5(request.get_full_path().encode(), usedforsecurity=False).hexdigest()[:12]
+    return f"{get_catalog_version()}-{digest}"
+
+
+def _error(message, status=400):
+    return JsonResponse({'error': message}, status=status)
+
+
+def _selected_fields(request):
+    raw = request.GET.get('fields')
+    if not raw:
+        return list(API_FIELDS)
+    fields = [f.strip() for f in raw.split(',') if f.strip()]
+    unknown = sorted(set(fields) - set(API_FIELDS))
+    if unknown:
+        raise APIError(f"Unknown field(s): {', '.join(unknown)}")
+    # id is always returned so clients can page and correlate results
+    return ['id'] + [f for f in fields if f != 'id']
+
+
+def _int_param(request, name, default, maximum):
+    try:
+        value = int(request.GET.get(name, default))
+    except ValueError:
+        raise APIError(f"'{name}' must be an integer")
+    if value < 1:
+        raise APIError(f"'{name}' must be positive")
+    return min(value, maximum)
+
+
+def encode_cursor(last_id):
+    return base64.urlsafe_b64encode(str(last_id).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        return int(base64.urlsafe_b64decode(padded).decode())
+    except (ValueError, UnicodeDecodeError):
+        raise APIError("Invalid cursor")
+
+
+def _serialize(rows):
+    for row in rows:
+        if 'image' in row:
+            row['image'] = default_storage.url(row['image']) if row['image'] else None
+    return rows
+
+
+@require_GET
+@etag(_catalog_etag)
+def product_list(request):
+    """List products ordered by id with cursor pagination: ?cursor=&limit=&fields=
+
+    Accepts the same category / brand / band / min_price / max_price filters as
+    the HTML listings; results always stay in id order so cursors remain stable.
+    """
+    try:
+        fields = _selected_fields(request)
+        limit = _int_param(request, 'limit', DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+        cursor = request.GET.get('cursor')
+        after = decode_cursor(cursor) if cursor else 0
+    except APIError as exc:
+        return _error(str(exc))
+
+    products, _ = filter_products(Product.objects.published().filter(id__gt=after), request.GET, sort=False)
+    rows = list(products.order_by('id').values(*fields)[:limit + 1])
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]['id'])
+
+    return JsonResponse({'results': _serialize(rows), 'next_cursor': next_cursor})
+
+
+@require_GET
+@etag(_catalog_etag)
+def product_batch(request):
+    """Fetch many products by id in a single query: ?ids=1,2,3&fields="""
+    try:
+        fields = _selected_fields(request)
+        ids = [int(i) for i in request.GET.get('ids', '').split(',') if i.strip()]
+    except APIError as exc:
+        return _error(str(exc))
+    except ValueError:
+        return _error("'ids' must be a comma separated list of integers")
+    if not ids:
+        return _error("'ids' is required")
+    if len(ids) > MAX_BATCH_SIZE:
+        return _error(f"At most {MAX_BATCH_SIZE} ids per request")
+
+    found = {row['id']: row for row in Product.objects.published().filter(id__in=ids).values(*fields)}
+    results = [found[i] for i in dict.fromkeys(ids) if i in found]
+    missing = [i for i in dict.fromkeys(ids) if i not in found]
+    return JsonResponse({'results': _serialize(results), 'missing': missing})
@@ -0,0 +1,99 @@
+"""Hot/cold split for orders.
+
+Orders older than ORDER_ARCHIVE_AFTER_DAYS are copied to the 'archive' database
+(ArchivedOrder, ArchivedOrderItem) and deleted from the main one, so the order
+page, admin and indexes only carry recent history. Each chunk is written to the
+archive before it is deleted from the main database and archived rows keep
+their original ids, so an interrupted run is simply repeated.
+
+Users with archived orders are flagged (User.has_archived_orders), so the order
+page only offers, and queries, the archive for them.
+
+The archive's tables are created by ``manage.py migrate --database archive``,
+which ``manage.py archive_orders`` runs first. Until then the archive reads as
+empty instead of failing the order page.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from .models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem, User
+from .routers import ARCHIVE_DB
+
+DEFAULT_CHUNK_SIZE = 200
+
+logger = logging.getLogger(__name__)
+
+
+def archive_cutoff(days=None):
+    days = settings.ORDER_ARCHIVE_AFTER_DAYS if days is None else days
+    return timezone.now() - timedelta(days=days)
+
+
+def archivable_orders(before):
+    return Order.objects.filter(created_at__lt=before)
+
+
+def _archive_chunk(orders):
+    items = OrderItem.objects.filter(order__in=orders).select_related('product').order_by('id')
+    with transaction.atomic(using=ARCHIVE_DB):
+        ArchivedOrder.objects.bulk_create([
+            ArchivedOrder(
+                id=o.id, order_id=o.order_id, user_id=o.user_id, name=o.name,
+                address=o.address, pincode=o.pincode, total=o.total, created_at=o.created_at,
+            )
+            for o in orders
+        ], ignore_conflicts=True)
+        ArchivedOrderItem.objects.bulk_create([
+            ArchivedOrderItem(
+                id=i.id, order_id=i.order_id, product_id=i.product_id, product_name=i.product.name,
+                quantity=i.quantity, price=i.price,
+            )
+            for i in items
+        ], ignore_conflicts=True)
+    with transaction.atomic():
+        Order.objects.filter(id__in=[o.id for o in orders]).delete()
+        User.objects.filter(id__in={o.user_id for o in orders}, has_archived_orders=False).update(
+            has_archived_orders=True,
+        )
+
+
+def archive_orders(before, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Move orders created before `before` to the archive; returns how many moved."""
+    moved = 0
+    while True:
+        orders = list(archivable_orders(before).order_by('id')[:chunk_size])
+        if not orders:
+            return moved
+        _archive_chunk(orders)
+        moved += len(orders)
+
+
+def flag_archived_users():
+    """Flag every user with archived orders, e.g. ones archived before the flag existed."""
+    user_ids = ArchivedOrder.objects.exclude(user_id=None).values_list('user_id', flat=True).distinct()
+    return User.objects.filter(id__in=list(user_ids), has_archived_orders=False).update(has_archived_orders=True)
+
+
+def archived_orders_for(user):
+    return (
+        ArchivedOrder.objects.filter(user_id=user.pk)
+        .order_by('-created_at', '-id')
+        .prefetch_related('items')
+    )
+
+
+def _archive_rows(queryset):
+    try:
+        return list(queryset)
+    except DatabaseError:
+        logger.warning("The archive database has no tables; run `manage.py migrate --database archive`.")
+        return []
+
+
+def archived_orders_page(user, start, stop):
+    """Archived orders of `user` from `start` to `stop`, newest first."""
+    return _archive_rows(archived_orders_for(user)[start:stop])
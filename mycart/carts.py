@@ -0,0 +1,112 @@
+"""Cart lines and cached cart summaries.
+
+Lines are always priced from Product.price on the server; display overrides
+carried in the session (name, image) only change how a line looks. The summary
+of a user's cart -- item count and subtotal -- is cached per user and catalog
+version, so price changes retire it with everything else keyed on the catalog,
+and ``mycart.signals`` deletes it whenever a CartItem or Cart changes. Both go
+through the default cache, which settings_production shares between workers, so
+a change made in one worker is seen by all of them. Templates get the count as
+``cart_count`` (see mycart.context_processors).
+"""
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.db.models import F, Sum
+
+from . import metrics
+from .catalog import get_catalog_version
+from .models import CartItem, Product
+
+SUMMARY_TIMEOUT = 60 * 60
+
+CartSummary = namedtuple('CartSummary', 'count subtotal')
+
+
+def session_cart_counts(entries):
+    """Return ({product_id: quantity}, {product_id: overrides}) for a session cart.
+
+    Entries are either bare product ids or dicts with `product_id` and optional
+    name/img display overrides; duplicates mean quantity.
+    """
+    counts = {}
+    overrides = {}
+    for e in entries:
+        try:
+            pid = int(e.get('product_id') if isinstance(e, dict) else e)
+        except (TypeError, ValueError):
+            continue
+        counts[pid] = counts.get(pid, 0) + 1
+        if isinstance(e, dict):
+            # prefer last override for that product id; prices always come from the product
+            override = {k: e[k] for k in ('name', 'img') if k in e}
+            if override:
+                overrides[pid] = override
+    return counts, overrides
+
+
+def _summary_key(user_id):
+    return f"cart:summary:{get_catalog_version()}:{user_id}"
+
+
+def _line(product, quantity, override):
+    image = override.get('img') or (product.image.url if product.image else '')
+    return {
+        'product': product,
+        'quantity': quantity,
+        'price': product.price,
+        'subtotal': product.price * quantity,
+        'display_name': override.get('name') or product.name,
+        'display_img': image,
+    }
+
+
+def summarize(lines):
+    return CartSummary(sum(line['quantity'] for line in lines), sum(line['subtotal'] for line in lines))
+
+
+def user_cart_lines(user, overrides):
+    """Lines of `user`'s cart in one query; also refreshes the cached summary."""
+    items = CartItem.objects.filter(cart__user=user).select_related('product').order_by('id')
+    lines = [_line(item.product, item.quantity, overrides.get(str(item.product_id), {})) for item in items]
+    summary = summarize(lines)
+    cache.set(_summary_key(user.pk), tuple(summary), SUMMARY_TIMEOUT)
+    return lines, summary
+
+
+def session_cart_lines(entries):
+    counts, overrides = session_cart_counts(entries)
+    products = Product.objects.filter(id__in=counts).order_by('id') if counts else []
+    lines = [_line(p, counts[p.id], overrides.get(p.id, {})) for p in products]
+    return lines, summarize(lines)
+
+
+def user_cart_summary(user_id):
+    """Count and subtotal of a user's cart: a cache read, or one aggregate query."""
+    key = _summary_key(user_id)
+    cached = cache.get(key)
+    metrics.cache_lookup('cart_summary', cached is not None)
+    if cached is not None:
+        return CartSummary(*cached)
+    totals = CartItem.objects.filter(cart__user_id=user_id).aggregate(
+        count=Sum('quantity'), subtotal=Sum(F('quantity') * F('product__price')),
+    )
+    summary = CartSummary(totals['count'] or 0, totals['subtotal'] or 0)
+    cache.set(key, tuple(summary), SUMMARY_TIMEOUT)
+    return summary
+
+
+def invalidate_summary(user_id):
+    cache.delete(_summary_key(user_id))
+
+
+def cart_count(request):
+    """Items in the request's cart; no query for guests, a cache read for users."""
+    if not hasattr(request, '_cart_count'):
+        if request.user.is_authenticated:
+            request._cart_count = user_cart_summary(request.user.pk).count
+        else:
+            counts, _ = session_cart_counts(request.session.get('cart', []))
+            request._cart_count = sum(counts.values())
+    return request._cart_count
+
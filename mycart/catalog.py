@@ -0,0 +1,149 @@
+"""Catalog versioning shared by every cache that depends on Product data.
+
+Any change to a Product bumps the version (see ``mycart.signals``), so caches and
+ETags keyed on it go stale together without explicit invalidation. The version
+lives in the default cache, which settings_production keeps on local disk so
+every worker sees a bump made by any of them.
+"""
+import time
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from . import metrics
+
+CATALOG_VERSION_KEY = 'catalog:version'
+FACET_CACHE_TIMEOUT = 60 * 60 * 24
+
+# (slug, label, min inclusive, max exclusive)
+PRICE_BANDS = (
+    ('under-10k', 'Under ₹10,000', None, 10000),
+    ('10k-20k', '₹10,000 - ₹20,000', 10000, 20000),
+    ('20k-40k', '₹20,000 - ₹40,000', 20000, 40000),
+    ('40k-plus', '₹40,000 and above', 40000, None),
+)
+
+SORT_OPTIONS = {
+    'price': ('price', 'id'),
+    '-price': ('-price', '-id'),
+    'newest': ('-id',),
+}
+
+
+def get_catalog_version():
+    version = cache.get(CATALOG_VERSION_KEY)
+    metrics.cache_lookup('catalog_version', version is not None)
+    if version is None:
+        # seed from the clock so a cold cache never reuses an old version number
+        cache.add(CATALOG_VERSION_KEY, time.time_ns() // 1000, None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    try:
+        return cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        get_catalog_version()
+        return cache.incr(CATALOG_VERSION_KEY)
+
+
+def _band_q(low, high):
+    q = Q()
+    if low is not None:
+        q &= Q(price__gte=low)
+    if high is not None:
+        q &= Q(price__lt=high)
+    return q
+
+
+def _int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def filter_products(queryset, params, sort=True):
+    """Apply listing filters from request GET `params` to a Product queryset.
+
+    Supported params: category (slug), brand (repeatable), band (price band slug),
+    min_price, max_price and sort (price, -price, newest). Unknown or malformed
+    values are ignored. Returns ``(queryset, filters)`` where `filters` holds the
+    values that were actually applied.
+    """
+    filters = {}
+    category = params.get('category')
+    if category:
+        queryset = queryset.filter(category__slug=category)
+        filters['category'] = category
+
+    brands = [b for b in params.getlist('brand') if b]
+    if brands:
+        queryset = queryset.filter(brand__in=brands)
+        filters['brand'] = brands
+
+    bands = {slug: (low, high) for slug, _, low, high in PRICE_BANDS}
+    band = params.get('band')
+    if band in bands:
+        queryset = queryset.filter(_band_q(*bands[band]))
+        filters['band'] = band
+
+    min_price = _int_or_none(params.get('min_price'))
+    if min_price is not None:
+        queryset = queryset.filter(price__gte=min_price)
+        filters['min_price'] = min_price
+    max_price = _int_or_none(params.get('max_price'))
+    if max_price is not None:
+        queryset = queryset.filter(price__lte=max_price)
+        filters['max_price'] = max_price
+
+    if sort:
+        order = params.get('sort')
+        if order in SORT_OPTIONS:
+            queryset = queryset.order_by(*SORT_OPTIONS[order])
+            filters['sort'] = order
+    return queryset, filters
+
+
+def facet_counts(category=None):
+    """Category, brand and price-band counts, cached per catalog version.
+
+    The GROUP BY queries only run once after each catalog change; every other
+    page view is a single cache read. Brand and band counts are scoped to
+    `category` when given.
+    """
+    from .models import Category, Product
+
+    key = f"catalog:facets:{get_catalog_version()}:{category.pk if category else 'all'}"
+    facets = cache.get(key)
+    metrics.cache_lookup('facets', facets is not None)
+    if facets is not None:
+        return facets
+
+    products = Product.objects.published()
+    if category is not None:
+        products = products.filter(category=category)
+
+    band_counts = products.aggregate(**{
+        slug: Count('id', filter=_band_q(low, high)) for slug, _, low, high in PRICE_BANDS
+    })
+    facets = {
+        'categories': list(
+            Category.objects.annotate(
+                count=Count('products', filter=Q(products__status=Product.PUBLISHED))
+            )
+            .filter(count__gt=0)
+            .values('slug', 'name', 'count')
+        ),
+        'brands': list(
+            products.exclude(brand='').values('brand')
+            .annotate(count=Count('id')).order_by('brand')
+        ),
+        'price_bands': [
+            {'slug': slug, 'label': label, 'count': band_counts[slug]}
+            for slug, label, _, _ in PRICE_BANDS
+        ],
+    }
+    cache.set(key, facets, FACET_CACHE_TIMEOUT)
+    return facets
@@ -0,0 +1,162 @@
+"""Response body compression (brotli when available, otherwise gzip).
+
+Applied to every response by mycart.middleware.CompressionMiddleware. Bodies
+are compressed in one go; streaming responses as they are produced, flushed to
+the client every STREAM_FLUSH_SIZE bytes rather than after every chunk, which
+would cost most of the compression on row-sized chunks. Tiny bodies, bodies that
+are compressed already (images, archives, anything with a Content-Encoding)
+and file responses (sent with sendfile, or pre-compressed by whitenoise) are
+left alone.
+
+Like Django's GZipMiddleware, gzip output gets a random amount of padding, so
+its length doesn't give away secrets on the page (the BREACH attack). Brotli
+can't be padded that way, so responses that vary on the session cookie are
+always gzipped.
+"""
+import re
+import secrets
+import struct
+import zlib
+
+from django.http import FileResponse
+from django.utils.cache import has_vary_header, patch_vary_headers
+from django.utils.text import compress_string
+
+try:
+    import brotli
+except ImportError:  # brotli is optional
+    brotli = None
+
+MIN_COMPRESS_SIZE = 200
+BROTLI_QUALITY = 5
+# brotli's default window is 4 MB; streams rarely need that much memory per response
+BROTLI_STREAM_LGWIN = 18
+GZIP_LEVEL = 6
+# the most padding added to a gzip body; GZipMiddleware's default
+GZIP_MAX_RANDOM_BYTES = 100
+# uncompressed bytes a stream may hold back before flushing them to the client
+STREAM_FLUSH_SIZE = 16 * 1024
+COMPRESSIBLE_TYPES = re.compile(
+    r'^(text/|application/(json|javascript|xml|xhtml\+xml|ld\+json|rss\+xml|atom\+xml)\b|image/svg\+xml)'
+)
+
+
+def accepts_encoding(request, coding):
+    """True if the Accept-Encoding header lists `coding` with a non-zero q."""
+    header = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    for part in header.split(','):
+        name, _, params = part.strip().partition(';')
+        if name.strip().lower() != coding:
+            continue
+        match = re.search(r'q\s*=\s*([0-9.]+)', params)
+        return not match or float(match.group(1)) > 0
+    return False
+
+
+def choose_encoding(request, response):
+    if brotli is not None and accepts_encoding(request, 'br') and not has_vary_header(response, 'Cookie'):
+        return 'br'
+    if accepts_encoding(request, 'gzip'):
+        return 'gzip'
+    return None
+
+
+def compress_bytes(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return compress_string(data, max_random_bytes=GZIP_MAX_RANDOM_BYTES)
+
+
+class GzipCompressor:
+    """Streaming gzip with brotli.Compressor's interface, padded like compress_string.
+
+    The padding is a random-length file name in the gzip header, which is how
+    compress_string pads too.
+    """
+
+    def __init__(self):
+        self.compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS)
+        name = b'a' * secrets.randbelow(GZIP_MAX_RANDOM_BYTES)
+        # magic, deflate, FNAME flag, no mtime, no extra flags, unknown OS
+        self.header = b'\x1f\x8b\x08\x08\x00\x00\x00\x00\x00\xff' + name + b'\x00'
+        self.crc = 0
+        self.size = 0
+
+    def process(self, data):
+        self.crc = zlib.crc32(data, self.crc)
+        self.size += len(data)
+        out, self.header = self.header + self.compressor.compress(data), b''
+        return out
+
+    def flush(self):
+        return self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        trailer = struct.pack('<II', self.crc, self.size & 0xffffffff)
+        return self.header + self.compressor.flush(zlib.Z_FINISH) + trailer
+
+
+def compress_stream(chunks, encoding):
+    """Compress an iterable of byte chunks.
+
+    Output is flushed once STREAM_FLUSH_SIZE bytes have arrived since the last
+    flush. An empty chunk flushes straight away, for streams with something
+    the client must not wait for.
+    """
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY, lgwin=BROTLI_STREAM_LGWIN)
+    else:
+        compressor = GzipCompressor()
+    out, held = [], 0
+    for chunk in chunks:
+        out.append(compressor.process(chunk))
+        held += len(chunk)
+        if held >= STREAM_FLUSH_SIZE or (held and not chunk):
+            out.append(compressor.flush())
+            yield b''.join(out)
+            out, held = [], 0
+    out.append(compressor.finish())
+    yield b''.join(out)
+
+
+def is_compressible(response):
+    if response.has_header('Content-Encoding') or isinstance(response, FileResponse):
+        return False
+    if response.status_code not in (200, 201, 203) or 'no-transform' in response.get('Cache-Control', ''):
+        return False
+    return bool(COMPRESSIBLE_TYPES.match(response.get('Content-Type', '')))
+
+
+def _weaken_etag(response):
+    # the body is no longer byte-identical to the uncompressed representation
+    etag = response.get('ETag')
+    if etag and etag.startswith('"'):
+        response['ETag'] = 'W/' + etag
+
+
+def compress_response(request, response):
+    """Compress `response` in place if it is worth it and the client accepts it."""
+    if not is_compressible(response):
+        return response
+    if not response.streaming and len(response.content) < MIN_COMPRESS_SIZE:
+        return response
+    patch_vary_headers(response, ('Accept-Encoding',))
+
+    encoding = choose_encoding(request, response)
+    if encoding is None:
+        return response
+
+    if response.streaming:
+        response.streaming_content = compress_stream(response.streaming_content, encoding)
+        # the compressed length is not known up front
+        if response.has_header('Content-Length'):
+            del response['Content-Length']
+    else:
+        compressed = compress_bytes(response.content, encoding)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+    response['Content-Encoding'] = encoding
+    _weaken_etag(response)
+    return response
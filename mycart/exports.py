@@ -0,0 +1,124 @@
+"""Streaming CSV / JSONL export of orders and their items.
+
+Orders are walked with ``.iterator(chunk_size=...)`` so only one chunk of rows is
+held in memory at a time, and ``prefetch_related`` runs once per chunk instead of
+once per order.
+"""
+import csv
+import json
+
+from django.db.models import Prefetch
+
+from .models import Order, OrderItem
+
+DEFAULT_CHUNK_SIZE = 500
+
+CSV_HEADER = [
+    'order_id', 'created_at', 'user_email', 'name', 'address', 'pincode',
+    'order_total', 'product_id', 'product_name', 'quantity', 'price', 'subtotal',
+]
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+def filter_orders(queryset=None, since=None, until=None, user=None):
+    """Narrow an Order queryset by creation date range (inclusive dates) and user.
+
+    `user` may be a User instance, a primary key or an email address.
+    """
+    if queryset is None:
+        queryset = Order.objects.all()
+    if since:
+        queryset = queryset.filter(created_at__date__gte=since)
+    if until:
+        queryset = queryset.filter(created_at__date__lte=until)
+    if user is not None and user != '':
+        if hasattr(user, 'pk'):
+            queryset = queryset.filter(user=user)
+        elif isinstance(user, str) and '@' in user:
+            queryset = queryset.filter(user__email__iexact=user)
+        else:
+            queryset = queryset.filter(user_id=int(user))
+    return queryset
+
+
+def iter_orders(queryset, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield orders with items and products attached, one prefetch per chunk."""
+    items = OrderItem.objects.select_related('product').order_by('id')
+    queryset = (
+        queryset.select_related('user')
+        .prefetch_related(Prefetch('items', queryset=items))
+        .order_by('id')
+    )
+    return queryset.iterator(chunk_size=chunk_size)
+
+
+class _Echo:
+    """File-like object whose write() hands the line straight back to csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(queryset, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield CSV lines, one per order item (orders without items get one row)."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_HEADER)
+    for order in iter_orders(queryset, chunk_size):
+        head = [
+            order.order_id,
+            order.created_at.isoformat(),
+            order.user.email if order.user else '',
+            order.name,
+            order.address,
+            order.pincode,
+            order.total,
+        ]
+        items = order.items.all()
+        if not items:
+            yield writer.writerow(head + ['', '', '', '', ''])
+            continue
+        for item in items:
+            yield writer.writerow(head + [
+                item.product_id,
+                item.product.name,
+                item.quantity,
+                item.price,
+                item.subtotal(),
+            ])
+
+
+def stream_jsonl(queryset, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield one JSON document per order with its items nested."""
+    for order in iter_orders(queryset, chunk_size):
+        record = {
+            'order_id': order.order_id,
+            'created_at': order.created_at.isoformat(),
+            'user_email': order.user.email if order.user else None,
+            'name': order.name,
+            'address': order.address,
+            'pincode': order.pincode,
+            'total': order.total,
+            'items': [
+                {
+                    'product_id': item.product_id,
+                    'product_name': item.product.name,
+                    'quantity': item.quantity,
+                    'price': item.price,
+                    'subtotal': item.subtotal(),
+                }
+                for item in order.items.all()
+            ],
+        }
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def stream_orders(queryset, fmt='csv', chunk_size=DEFAULT_CHUNK_SIZE):
+    if fmt == 'csv':
+        return stream_csv(queryset, chunk_size)
+    if fmt == 'jsonl':
+        return stream_jsonl(queryset, chunk_size)
+    raise ValueError(f"Unknown export format: {fmt}")
@@ -1,6 +1,6 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
-from .models import User
+from .models import Product, User
 
 class SignupForm(UserCreationForm):
     class Meta:
@@ -10,3 +10,33 @@ class SignupForm(UserCreationForm):
 
 class LoginForm(AuthenticationForm):
     username = forms.EmailField(label="Email")
+
+
+class ListingForm(forms.ModelForm):
+    """A seller's new listing; the photo is processed after the listing is saved."""
+    photo = forms.FileField(help_text="JPEG, PNG or WebP")
+
+    class Meta:
+        model = Product
+        fields = ['name', 'brand', 'category', 'price', 'old_price', 'description']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for field in self.fields.values():
+            field.widget.attrs['class'] = 'form-control'
+        self.fields['photo'].widget.attrs['accept'] = 'image/jpeg,image/png,image/webp'
+        self.fields['price'].widget.attrs['min'] = 1
+
+    def clean_price(self):
+        # orders are charged at the listed price
+        price = self.cleaned_data['price']
+        if price < 1:
+            raise forms.ValidationError("Price must be at least ₹1.")
+        return price
+
+    def clean(self):
+        cleaned_data = super().clean()
+        price, old_price = cleaned_data.get('price'), cleaned_data.get('old_price')
+        if price is not None and old_price is not None and old_price < price:
+            self.add_error('old_price', "Old price can't be lower than the price.")
+        return cleaned_data
@@ -0,0 +1,117 @@
+"""Idempotency keys for write views.
+
+Forms and links carry a random key (``{% idempotency_field %}`` /
+``{% idempotency_key %}``), or API clients send an ``Idempotency-Key`` header.
+The first request with a key claims it and records its redirect; a replay of the
+same key (double submit, back button, retrying proxy) gets that redirect again
+without running the view's writes. Views return failures through ``retryable``,
+so a corrected retry with the same key runs again instead of replaying them.
+"""
+import re
+import uuid
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, HttpResponseRedirect
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+IDEMPOTENCY_FIELD = 'idempotency_key'
+KEY_RE = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
+REPLAY_HEADER = 'Idempotent-Replayed'
+
+
+def new_key():
+    return uuid.uuid4().hex
+
+
+def get_key(request):
+    key = (
+        request.META.get('HTTP_IDEMPOTENCY_KEY')
+        or request.POST.get(IDEMPOTENCY_FIELD)
+        or request.GET.get(IDEMPOTENCY_FIELD)
+    )
+    if key and KEY_RE.match(key):
+        return key
+    return None
+
+
+def _scope(request):
+    if request.user.is_authenticated:
+        return f"u:{request.user.pk}"
+    if request.session.session_key is None:
+        request.session.save()
+    return f"s:{request.session.session_key}"
+
+
+def _claim(key, scope, endpoint):
+    """Insert the claim row; returns None if another request already holds the key."""
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(key=key, scope=scope, endpoint=endpoint)
+    except IntegrityError:
+        return None
+
+
+def retryable(response):
+    """Mark a view's response as a failure: the key is released instead of recorded."""
+    response.idempotent_outcome = False
+    return response
+
+
+def _replay(record):
+    if record.status_code is None:
+        # the first request with this key has not finished yet
+        response = HttpResponse("A request with this idempotency key is in progress.", status=409)
+    elif record.location:
+        response = HttpResponseRedirect(record.location)
+        response.status_code = record.status_code
+    else:
+        response = HttpResponse(status=record.status_code)
+    response[REPLAY_HEADER] = 'true'
+    return response
+
+
+def idempotent(view_func):
+    """Answer repeated requests carrying the same key from the stored outcome.
+
+    Only redirects are stored; any other outcome, or one marked ``retryable``,
+    releases the key so the client can retry. Requests without a key run normally.
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        key = get_key(request)
+        if key is None:
+            return view_func(request, *args, **kwargs)
+
+        scope = _scope(request)
+        endpoint = request.resolver_match.view_name if request.resolver_match else view_func.__name__
+        record = _claim(key, scope, endpoint)
+        if record is None:
+            existing = IdempotencyKey.objects.filter(scope=scope, key=key).first()
+            expired = timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+            if existing is not None and existing.created_at >= expired:
+                return _replay(existing)
+            IdempotencyKey.objects.filter(scope=scope, key=key, created_at__lt=expired).delete()
+            record = _claim(key, scope, endpoint)
+            if record is None:
+                return _replay(IdempotencyKey(status_code=None))
+
+        try:
+            response = view_func(request, *args, **kwargs)
+        except Exception:
+            record.delete()
+            raise
+
+        replayable = getattr(response, 'idempotent_outcome', True)
+        if replayable and 300 <= response.status_code < 400 and response.has_header('Location'):
+            record.status_code = response.status_code
+            record.location = response['Location']
+            record.save(update_fields=['status_code', 'location'])
+        else:
+            record.delete()
+        return response
+    return wrapper
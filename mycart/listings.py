@@ -0,0 +1,225 @@
+"""Seller listings: streamed photo uploads and background image processing.
+
+The ``sell`` view swaps in StreamingDiskUploadHandler, so a photo goes straight
+from the socket to a file under LISTING_UPLOAD_ROOT, never held in memory
+whatever its size. That directory is outside MEDIA_ROOT and the files have no
+extension, so nothing a client uploads is served until it has been re-encoded.
+The Product is saved as pending, and the photo is
+validated, resized and turned into variants on a per-process thread pool;
+the listing is published when that succeeds and rejected when it does not.
+``manage.py process_listings`` picks up anything a restarted worker left
+pending.
+"""
+import hashlib
+import io
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from django.db import connections
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+ALLOWED_FORMATS = {'JPEG', 'PNG', 'WEBP'}
+MAX_PIXELS = 40_000_000
+# longest side in pixels; 'main' becomes Product.image
+VARIANTS = {'main': 1200, 'medium': 600, 'thumb': 300}
+JPEG_QUALITY = 85
+
+
+def upload_path(name):
+    return os.path.join(settings.LISTING_UPLOAD_ROOT, name)
+
+
+class StreamedUploadedFile(UploadedFile):
+    """An upload already complete on disk; `path` is relative to LISTING_UPLOAD_ROOT."""
+
+    def __init__(self, path, name, content_type, size, charset, sha256):
+        self.path = path
+        self.sha256 = sha256
+        super().__init__(open(upload_path(path), 'rb'), name, content_type, size, charset)
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+class StreamingDiskUploadHandler(FileUploadHandler):
+    """Write each uploaded file to disk chunk by chunk, hashing as it goes.
+
+    Files over LISTING_MAX_UPLOAD_SIZE are dropped and listed in `too_large`.
+    """
+    chunk_size = 256 * 1024
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.too_large = []
+        self.fh = None
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        os.makedirs(settings.LISTING_UPLOAD_ROOT, exist_ok=True)
+        # the client's file name and extension are not kept; the format is checked when processing
+        self.path = uuid.uuid4().hex
+        self.fh = open(upload_path(self.path), 'wb')
+        self.sha = hashlib.sha256()
+        self.received = 0
+
+    def _discard(self):
+        self.fh.close()
+        os.remove(self.fh.name)
+        self.fh = None
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.LISTING_MAX_UPLOAD_SIZE:
+            self._discard()
+            self.too_large.append(self.file_name)
+            raise SkipFile()
+        self.fh.write(raw_data)
+        self.sha.update(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        self.fh.close()
+        self.fh = None
+        return StreamedUploadedFile(
+            self.path, self.file_name, self.content_type, file_size, self.charset, self.sha.hexdigest()
+        )
+
+    def upload_interrupted(self):
+        if self.fh is not None:
+            self._discard()
+
+
+def discard_uploads(files):
+    """Delete streamed uploads that will not be used (e.g. the form was invalid)."""
+    for uploaded in files.values():
+        if isinstance(uploaded, StreamedUploadedFile):
+            uploaded.close()
+            try:
+                os.remove(upload_path(uploaded.path))
+            except FileNotFoundError:
+                pass
+
+
+def _encode(image, longest_side):
+    copy = image.copy()
+    copy.thumbnail((longest_side, longest_side))
+    out = io.BytesIO()
+    copy.save(out, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return out.getvalue()
+
+
+def _save_hashed(data):
+    # same naming scheme as HashedUploadTo, so serve_media marks variants immutable
+    digest = hashlib.sha256(data).hexdigest()
+    name = f"products/{digest[:2]}/{digest[:32]}.jpg"
+    if not default_storage.exists(name):
+        default_storage.save(name, ContentFile(data))
+    return name
+
+
+def _load_image(path):
+    with Image.open(path) as probe:
+        if probe.format not in ALLOWED_FORMATS:
+            raise ValueError(f"unsupported image format {probe.format or 'unknown'}")
+        width, height = probe.size
+        if width * height > MAX_PIXELS:
+            raise ValueError(f"image is too large ({width}x{height})")
+        probe.verify()
+    # verify() leaves the image unusable; open it again to decode
+    with Image.open(path) as image:
+        return ImageOps.exif_transpose(image).convert('RGB')
+
+
+def process_listing(product_id):
+    """Validate and resize a pending listing's photo, then publish or reject it.
+
+    The listing is claimed first by moving it from pending to processing, so when
+    workers race for the same listing only one of them processes it.
+    """
+    claimed = (
+        Product.objects.filter(pk=product_id, status=Product.PENDING).exclude(source_file='')
+        .update(status=Product.PROCESSING)
+    )
+    if not claimed:
+        return None
+    product = Product.objects.get(pk=product_id)
+    source = upload_path(product.source_file)
+    try:
+        image = _load_image(source)
+        variants = {name: _save_hashed(_encode(image, size)) for name, size in VARIANTS.items()}
+    except (OSError, ValueError, UnidentifiedImageError, Image.DecompressionBombError) as exc:
+        product.status = Product.REJECTED
+        product.processing_error = f"Could not use this photo: {exc}"[:255]
+    else:
+        product.image.name = variants['main']
+        product.image_variants = variants
+        product.status = Product.PUBLISHED
+        product.processing_error = ''
+    product.source_file = ''
+    # saving bumps the catalog version, so listings, facets and typeahead pick it up
+    product.save(update_fields=['image', 'image_variants', 'status', 'processing_error', 'source_file'])
+    try:
+        os.remove(source)
+    except FileNotFoundError:
+        pass
+    return product
+
+
+def _run_in_worker(product_id):
+    try:
+        return process_listing(product_id)
+    except Exception:
+        logger.exception("Processing listing %s failed", product_id)
+    finally:
+        # worker threads have their own connections; don't leave them open
+        connections.close_all()
+
+
+_executor_lock = threading.Lock()
+_executor = None
+_executor_pid = None
+
+
+def _get_executor():
+    global _executor, _executor_pid
+    pid = os.getpid()
+    if _executor_pid != pid:
+        with _executor_lock:
+            if _executor_pid != pid:
+                # a forked worker must not share the parent's (thread-less) pool
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.LISTING_IMAGE_WORKERS, thread_name_prefix='listing-images',
+                )
+                _executor_pid = pid
+    return _executor
+
+
+def submit(product_id):
+    """Queue a listing for processing; with LISTING_IMAGE_WORKERS = 0 it runs inline."""
+    if not settings.LISTING_IMAGE_WORKERS:
+        return process_listing(product_id)
+    return _get_executor().submit(_run_in_worker, product_id)
+
+
+def process_pending(retry_processing=False):
+    """Process every pending listing in this process; returns how many were handled.
+
+    With `retry_processing`, listings claimed by a worker that died mid-way are
+    retried too; only safe while no other process is working on listings.
+    """
+    if retry_processing:
+        Product.objects.filter(status=Product.PROCESSING).update(status=Product.PENDING)
+    pending = Product.objects.filter(status=Product.PENDING).exclude(source_file='').values_list('pk', flat=True)
+    return sum(1 for pk in list(pending) if process_listing(pk) is not None)
@@ -0,0 +1,159 @@
+"""Routine database clean-up, run by ``manage.py collect_garbage``.
+
+Rows are deleted a small chunk at a time, each chunk in its own short
+transaction with a pause after it, so on SQLite the write lock is only ever held
+for a moment and checkout keeps working while the clean-up runs. Every step
+shares one deadline; whatever is left over is picked up by the next run.
+"""
+import time
+from datetime import timedelta
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.db import connections, router
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Cart, IdempotencyKey
+
+DEFAULT_CHUNK_SIZE = 500
+VACUUM_PAGES_PER_STEP = 1000
+
+
+class Deadline:
+    def __init__(self, seconds):
+        self.expires = time.monotonic() + seconds if seconds else None
+
+    @property
+    def passed(self):
+        return self.expires is not None and time.monotonic() >= self.expires
+
+
+def delete_in_chunks(queryset, deadline, chunk_size=DEFAULT_CHUNK_SIZE, pause=0.0):
+    """Delete `queryset` in primary key order, `chunk_size` rows per transaction.
+
+    Returns ``(deleted, finished)``; `finished` is False when the deadline cut
+    the work short.
+    """
+    model = queryset.model
+    deleted = 0
+    while not deadline.passed:
+        pks = list(queryset.order_by('pk').values_list('pk', flat=True)[:chunk_size])
+        if not pks:
+            return deleted, True
+        # count only the rows of this model, not cascaded ones
+        chunk = model._base_manager.using(queryset.db).filter(pk__in=pks)
+        deleted += chunk.delete()[1].get(model._meta.label, 0)
+        if len(pks) < chunk_size:
+            return deleted, True
+        if pause:
+            time.sleep(pause)
+    return deleted, False
+
+
+def expired_sessions():
+    return Session.objects.filter(expire_date__lt=timezone.now())
+
+
+def uses_db_sessions():
+    return settings.SESSION_ENGINE in (
+        'django.contrib.sessions.backends.db',
+        'django.contrib.sessions.backends.cached_db',
+    )
+
+
+def clear_expired_sessions(deadline, chunk_size=DEFAULT_CHUNK_SIZE, pause=0.0, using='default'):
+    if uses_db_sessions():
+        return delete_in_chunks(expired_sessions().using(using), deadline, chunk_size, pause)
+    # file/cache/cookie backends expire on their own terms
+    import_module(settings.SESSION_ENGINE).SessionStore.clear_expired()
+    return 0, True
+
+
+def stale_carts(empty_days, abandoned_days):
+    """Carts that are empty and idle for `empty_days`, or idle for `abandoned_days`."""
+    now = timezone.now()
+    return Cart.objects.filter(
+        Q(updated_at__lt=now - timedelta(days=empty_days), items__isnull=True)
+        | Q(updated_at__lt=now - timedelta(days=abandoned_days))
+    ).distinct()
+
+
+def expired_idempotency_keys():
+    return IdempotencyKey.objects.filter(
+        created_at__lt=timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+    )
+
+
+CLEANED_MODELS = (Session, Cart, IdempotencyKey)
+
+
+def holds(using, model):
+    """True if `model`'s table lives in database `using` (e.g. not in the archive)."""
+    return router.allow_migrate_model(using, model)
+
+
+def cleaned_tables(using):
+    return [model._meta.db_table for model in CLEANED_MODELS if holds(using, model)]
+
+
+def analyze(using='default', tables=None):
+    """Refresh planner statistics for `tables`; cheap and lock-friendly on SQLite and PostgreSQL."""
+    connection = connections[using]
+    tables = cleaned_tables(using) if tables is None else tables
+    if connection.vendor not in ('sqlite', 'postgresql') or not tables:
+        return False
+    with connection.cursor() as cursor:
+        for table in tables:
+            cursor.execute(f'ANALYZE {connection.ops.quote_name(table)}')
+    return True
+
+
+def vacuum(deadline, using='default', tables=None, pause=0.0):
+    """Reclaim the space of deleted rows without blocking writers.
+
+    SQLite: return free pages to the OS a batch at a time; needs
+    ``auto_vacuum=INCREMENTAL``, which `full_vacuum` switches on. PostgreSQL: plain
+    ``VACUUM (ANALYZE)`` of the cleaned tables (leave table rewrites to pg_repack).
+    Returns the number of SQLite pages released, True for PostgreSQL, or None
+    when nothing could be done.
+    """
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            for table in cleaned_tables(using) if tables is None else tables:
+                cursor.execute(f'VACUUM (ANALYZE) {connection.ops.quote_name(table)}')
+            return True
+        if connection.vendor != 'sqlite':
+            return None
+        cursor.execute('PRAGMA auto_vacuum')
+        if cursor.fetchone()[0] != 2:
+            return None
+        released = 0
+        while not deadline.passed:
+            cursor.execute('PRAGMA freelist_count')
+            free = cursor.fetchone()[0]
+            if not free:
+                break
+            # execute() only steps the pragma once (one page); a script runs it to the end
+            connection.connection.executescript(f'PRAGMA incremental_vacuum({VACUUM_PAGES_PER_STEP})')
+            released += min(free, VACUUM_PAGES_PER_STEP)
+            if pause:
+                time.sleep(pause)
+    return released
+
+
+def full_vacuum(using='default'):
+    """Rewrite a SQLite database file, blocking writers while it runs.
+
+    Also switches on incremental auto-vacuum so later runs can use `vacuum`.
+    Returns False for other databases.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        cursor.execute('VACUUM')
+    return True
@@ -0,0 +1,29 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from mycart.archive import DEFAULT_CHUNK_SIZE, archivable_orders, archive_cutoff, archive_orders, flag_archived_users
+from mycart.routers import ARCHIVE_DB
+
+
+class Command(BaseCommand):
+    help = "Move old orders and their items to the archive database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int,
+                            help="Archive orders older than this many days (default ORDER_ARCHIVE_AFTER_DAYS).")
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help="Only report how many orders would move.")
+
+    def handle(self, *args, **options):
+        if options['days'] is not None and options['days'] < 0:
+            raise CommandError("--days cannot be negative.")
+        before = archive_cutoff(options['days'])
+        if options['dry_run']:
+            count = archivable_orders(before).count()
+            self.stdout.write(f"{count} orders created before {before:%Y-%m-%d} would be archived.")
+            return
+        # plain `migrate` only covers the default database
+        call_command('migrate', database=ARCHIVE_DB, interactive=False, verbosity=0)
+        flag_archived_users()
+        moved = archive_orders(before, options['chunk_size'])
+        self.stdout.write(f"Archived {moved} orders created before {before:%Y-%m-%d}.")
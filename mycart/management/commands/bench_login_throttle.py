@@ -0,0 +1,85 @@
+import logging
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from mycart import throttle
+from mycart.models import User
+
+BENCH_DOMAIN = 'throttle-bench.invalid'
+
+
+def _attack(attempts, ips, accounts):
+    """Post `attempts` wrong passwords, round-robin over `ips` and `accounts`.
+
+    Returns ``(cpu seconds, wall seconds, {status code: count})``.
+    """
+    client = Client()
+    statuses = {}
+    # every refusal would otherwise log a "Too Many Requests" warning
+    logger = logging.getLogger('django.request')
+    level = logger.level
+    logger.setLevel(logging.ERROR)
+    cpu, wall = time.process_time(), time.perf_counter()
+    for n in range(attempts):
+        response = client.post(
+            reverse('login'),
+            {'email': accounts[n % len(accounts)], 'password': f'guess-{n}'},
+            REMOTE_ADDR=ips[n % len(ips)],
+        )
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+    logger.setLevel(level)
+    return time.process_time() - cpu, time.perf_counter() - wall, statuses
+
+
+def _reset_buckets(ips, emails):
+    for ip in ips:
+        throttle.reset('login_ip', ip)
+    for email in emails:
+        throttle.reset('login_account', email)
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay a credential-stuffing burst against the login view with and without "
+        "throttling and report the CPU it costs this process. Writes nothing: the "
+        "bench accounts are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--attempts', type=int, default=200)
+        parser.add_argument('--ips', type=int, default=4, help="Distinct client addresses in the burst.")
+        parser.add_argument('--accounts', type=int, default=10, help="Distinct accounts targeted.")
+
+    def handle(self, *args, **options):
+        ips = [f'198.51.100.{n % 250 + 1}' for n in range(options['ips'])]
+        emails = [f'victim{n}@{BENCH_DOMAIN}' for n in range(options['accounts'])]
+        # the test client's host; the bench never leaves this process
+        hosts = [*settings.ALLOWED_HOSTS, 'testserver']
+
+        with override_settings(ALLOWED_HOSTS=hosts), transaction.atomic():
+            password = make_password('correct horse battery staple')
+            User.objects.bulk_create([
+                User(email=email, username=email, phone=f'bench{n}', password=password)
+                for n, email in enumerate(emails)
+            ])
+            self.stdout.write(
+                f"{options['attempts']} failed logins from {len(ips)} IPs against {len(emails)} accounts"
+            )
+            for enabled in (False, True):
+                _reset_buckets(ips, emails)
+                with override_settings(THROTTLE_ENABLED=enabled):
+                    cpu, wall, statuses = _attack(options['attempts'], ips, emails)
+                refused = statuses.get(429, 0)
+                self.stdout.write(
+                    f"throttle {'on ' if enabled else 'off'}: cpu {cpu * 1000:8.1f} ms "
+                    f"({cpu / options['attempts'] * 1000:6.2f} ms/attempt), wall {wall * 1000:8.1f} ms, "
+                    f"{options['attempts'] - refused} hashed, {refused} refused"
+                )
+            transaction.set_rollback(True)
+        _reset_buckets(ips, emails)
@@ -0,0 +1,70 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from mycart.models import Product
+from mycart.typeahead import DEFAULT_LIMIT, build_index, tokenize
+
+
+def _typo(word, rng):
+    if len(word) < 4:
+        return word
+    i = rng.randrange(1, len(word) - 1)
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+def _queries(names, count, rng):
+    queries = []
+    for _ in range(count):
+        words = tokenize(rng.choice(names)) or ['x']
+        word = rng.choice(words)
+        kind = rng.random()
+        if kind < 0.5:
+            queries.append(word[:max(2, len(word) // 2)])   # partially typed
+        elif kind < 0.8:
+            queries.append(word)                            # whole word
+        else:
+            queries.append(_typo(word, rng))                # typo
+    return queries
+
+
+def _per_query_us(func, queries, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for q in queries:
+            func(q)
+    return (time.perf_counter() - started) / (rounds * len(queries)) * 1e6
+
+
+class Command(BaseCommand):
+    help = "Compare typeahead index lookups with the icontains query the search view used."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--rounds', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        names = list(Product.objects.values_list('name', flat=True))
+        if not names:
+            raise CommandError("No products to benchmark against.")
+        rng = random.Random(options['seed'])
+        queries = _queries(names, options['queries'], rng)
+
+        started = time.perf_counter()
+        index = build_index()
+        build_ms = (time.perf_counter() - started) * 1000
+
+        def icontains(q):
+            return list(Product.objects.filter(name__icontains=q).values_list('id', 'name')[:DEFAULT_LIMIT])
+
+        index_us = _per_query_us(lambda q: index.suggest(q), queries, options['rounds'])
+        db_us = _per_query_us(icontains, queries, options['rounds'])
+        hits_index = sum(1 for q in queries if index.suggest(q))
+        hits_db = sum(1 for q in queries if icontains(q))
+
+        self.stdout.write(f"{len(names)} products, {len(queries)} queries x {options['rounds']} rounds")
+        self.stdout.write(f"index build:   {build_ms:8.2f} ms")
+        self.stdout.write(f"typeahead:     {index_us:8.2f} us/query  ({hits_index} queries with results)")
+        self.stdout.write(f"icontains:     {db_us:8.2f} us/query  ({hits_db} queries with results)")
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from mycart.pincodes import PincodeDataError, ZONES, read_csv, write_table
+
+
+class Command(BaseCommand):
+    help = ("Build the memory-mapped pincode data file from a CSV with columns "
+            f"pincode, zone ({', '.join(ZONES)}), eta_days and optional serviceable.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv', help="Source CSV file.")
+        parser.add_argument('--output', '-o', default=None,
+                            help=f"Data file to write (default: PINCODE_DATA_FILE, {settings.PINCODE_DATA_FILE}).")
+
+    def handle(self, *args, **options):
+        output = options['output'] or settings.PINCODE_DATA_FILE
+        try:
+            count = write_table(read_csv(options['csv']), output)
+        except (OSError, PincodeDataError) as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(f"Wrote {count} pincodes to {output}."))
@@ -0,0 +1,77 @@
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from mycart import maintenance, profiling
+from mycart.models import Cart, IdempotencyKey, ProfileCapture
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired sessions, stale carts, expired idempotency keys and old profiles in small "
+        "chunks, then refresh statistics. Safe to run from cron while the site is live."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=maintenance.DEFAULT_CHUNK_SIZE,
+                            help="Rows deleted per transaction.")
+        parser.add_argument('--pause', type=float, default=0.05,
+                            help="Seconds to sleep between chunks so other writers get the lock.")
+        parser.add_argument('--time-limit', type=float, default=60,
+                            help="Stop after this many seconds (0 for no limit); the next run continues.")
+        parser.add_argument('--empty-cart-days', type=int, default=7,
+                            help="Delete empty carts untouched for this many days.")
+        parser.add_argument('--abandoned-cart-days', type=int, default=90,
+                            help="Delete any cart untouched for this many days.")
+        parser.add_argument('--vacuum', action='store_true',
+                            help="Reclaim free space without blocking writers (SQLite incremental "
+                                 "vacuum, PostgreSQL VACUUM).")
+        parser.add_argument('--full-vacuum', action='store_true',
+                            help="Rewrite the SQLite file and enable incremental vacuum. Blocks "
+                                 "writers while it runs; use in a maintenance window.")
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS,
+                            help="Database to clean up and vacuum; steps for tables it does not hold "
+                                 "are skipped.")
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be at least 1.")
+        database = options['database']
+        deadline = maintenance.Deadline(options['time_limit'])
+        chunking = {'chunk_size': options['chunk_size'], 'pause': options['pause']}
+
+        steps = (
+            ('expired sessions', Session, lambda: maintenance.clear_expired_sessions(
+                deadline, using=database, **chunking)),
+            ('stale carts', Cart, lambda: maintenance.delete_in_chunks(
+                maintenance.stale_carts(options['empty_cart_days'], options['abandoned_cart_days']).using(database),
+                deadline, **chunking)),
+            ('expired idempotency keys', IdempotencyKey, lambda: maintenance.delete_in_chunks(
+                maintenance.expired_idempotency_keys().using(database), deadline, **chunking)),
+            ('old profile captures', ProfileCapture, lambda: maintenance.delete_in_chunks(
+                profiling.stale_captures().using(database), deadline, **chunking)),
+        )
+        finished = True
+        for label, model, step in steps:
+            if not maintenance.holds(database, model):
+                continue
+            deleted, done = step()
+            finished = finished and done
+            self.stdout.write(f"{label}: {deleted} deleted{'' if done else ' (time limit reached)'}")
+        if not finished:
+            self.stdout.write("Run again to continue.")
+
+        if maintenance.analyze(database):
+            self.stdout.write("statistics refreshed")
+        if options['full_vacuum']:
+            if not maintenance.full_vacuum(database):
+                raise CommandError("--full-vacuum is only supported on SQLite.")
+            self.stdout.write("database rewritten, incremental vacuum enabled")
+        elif options['vacuum']:
+            released = maintenance.vacuum(deadline, database, pause=options['pause'])
+            if released is None:
+                self.stdout.write("vacuum skipped: run once with --full-vacuum to enable incremental vacuum")
+            elif released is True:
+                self.stdout.write("tables vacuumed")
+            else:
+                self.stdout.write(f"vacuum: {released} free pages released")
@@ -0,0 +1,40 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from mycart.exports import DEFAULT_CHUNK_SIZE, EXPORT_FORMATS, filter_orders, stream_orders
+
+
+def _parse_date(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Invalid date '{value}', expected YYYY-MM-DD.")
+
+
+class Command(BaseCommand):
+    help = "Stream orders and their items as CSV or JSONL (constant memory)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='csv')
+        parser.add_argument('--since', help="Only orders created on or after this date (YYYY-MM-DD).")
+        parser.add_argument('--until', help="Only orders created on or before this date (YYYY-MM-DD).")
+        parser.add_argument('--user', help="Only orders of this user (id or email).")
+        parser.add_argument('--output', '-o', help="Write to this file instead of stdout.")
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        since = _parse_date(options['since']) if options['since'] else None
+        until = _parse_date(options['until']) if options['until'] else None
+        try:
+            orders = filter_orders(since=since, until=until, user=options['user'])
+        except ValueError:
+            raise CommandError("--user must be a numeric id or an email address.")
+
+        lines = stream_orders(orders, options['format'], options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as fh:
+                fh.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
@@ -0,0 +1,90 @@
+import copy
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from mycart.compression import brotli
+from mycart.models import Product, User
+
+MINIFYING_LOADERS = [
+    ('django.template.loaders.cached.Loader', [
+        ('mycart.template_loaders.MinifyingLoader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]),
+]
+PLAIN_LOADERS = [
+    ('django.template.loaders.cached.Loader', [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]),
+]
+
+
+def _templates(loaders):
+    templates = copy.deepcopy(settings.TEMPLATES)
+    templates[0]['APP_DIRS'] = False
+    templates[0]['OPTIONS']['loaders'] = loaders
+    return templates
+
+
+def _body(response):
+    return b''.join(response.streaming_content) if response.streaming else response.content
+
+
+class Command(BaseCommand):
+    help = ("Measure page sizes and server time with and without template minification, "
+            "for each content encoding the compression middleware can send.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20, help="Requests per measurement (median is shown).")
+        parser.add_argument('--user', help="Email of a user to log in as, for pages such as the seller hub.")
+        parser.add_argument('urls', nargs='*', help="Paths to measure (default: home, mobiles, a product page).")
+
+    def _urls(self, options):
+        if options['urls']:
+            return options['urls']
+        urls = [reverse('home'), reverse('mobiles')]
+        product = Product.objects.published().order_by('id').first()
+        if product is not None:
+            urls.append(reverse('product_detail', args=[product.pk]))
+        if options['user']:
+            urls.append(reverse('sell'))
+        return urls
+
+    def handle(self, *args, **options):
+        client = Client()
+        # any session cookie keeps PrerenderedPageMiddleware from answering instead of the views
+        client.cookies[settings.SESSION_COOKIE_NAME] = 'measure-pages'
+        if options['user']:
+            user = User.objects.filter(email=options['user']).first()
+            if user is None:
+                raise CommandError(f"No user with email '{options['user']}'.")
+            client.force_login(user)
+        encodings = ['identity', 'gzip'] + (['br'] if brotli is not None else [])
+        hosts = [*settings.ALLOWED_HOSTS, 'testserver']
+
+        self.stdout.write(f"{'page':<28} {'templates':<9} " + ' '.join(
+            f"{e + ' bytes':>12} {e + ' ms':>9}" for e in encodings
+        ))
+        for url in self._urls(options):
+            for label, loaders in (('plain', PLAIN_LOADERS), ('minified', MINIFYING_LOADERS)):
+                with override_settings(ALLOWED_HOSTS=hosts, TEMPLATES=_templates(loaders)):
+                    cells = []
+                    for encoding in encodings:
+                        size, timings = None, []
+                        for _ in range(options['repeat']):
+                            started = time.perf_counter()
+                            response = client.get(url, HTTP_ACCEPT_ENCODING=encoding)
+                            body = _body(response)
+                            timings.append(time.perf_counter() - started)
+                            if response.status_code != 200:
+                                raise CommandError(f"{url} returned HTTP {response.status_code}")
+                            size = len(body)
+                        cells.append(f"{size:>12} {statistics.median(timings) * 1000:>9.2f}")
+                self.stdout.write(f"{url:<28} {label:<9} " + ' '.join(cells))
@@ -0,0 +1,64 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+# Runs in a fresh interpreter so every trial is a genuine cold start.
+PROBE = r"""
+import json, os, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+from django.core.handlers.wsgi import WSGIHandler
+from django.test import Client
+application = WSGIHandler()
+result = {'boot': time.perf_counter() - started, 'warmup': 0.0}
+if sys.argv[1] == 'warm':
+    from mycart.warmup import warm_up
+    t = time.perf_counter()
+    warm_up()
+    result['warmup'] = time.perf_counter() - t
+client = Client(HTTP_HOST=sys.argv[2])
+for label in ('first', 'second'):
+    t = time.perf_counter()
+    for url in sys.argv[3:]:
+        status = client.get(url).status_code
+        if status >= 400:
+            raise SystemExit(f"{url} returned HTTP {status}")
+    result[label] = time.perf_counter() - t
+print(json.dumps(result))
+"""
+
+
+class Command(BaseCommand):
+    help = ("Measure process boot time and first-request latency with and without "
+            "mycart.warmup, each trial in a fresh interpreter.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--trials', type=int, default=5)
+        parser.add_argument('urls', nargs='*', help="Paths requested after boot (default: home, mobiles).")
+
+    def _trial(self, mode, urls):
+        host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost'
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'myshop.settings'))
+        proc = subprocess.run(
+            [sys.executable, '-c', PROBE, mode, host, *urls],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            raise CommandError(proc.stderr.strip() or proc.stdout.strip())
+        return json.loads(proc.stdout.strip().splitlines()[-1])
+
+    def handle(self, *args, **options):
+        urls = options['urls'] or [reverse('home'), reverse('mobiles')]
+        self.stdout.write(f"settings={os.environ.get('DJANGO_SETTINGS_MODULE')} urls={' '.join(urls)}")
+        self.stdout.write(f"{'mode':<6} {'boot':>9} {'warm-up':>9} {'1st req':>9} {'2nd req':>9}  (median ms)")
+        for mode in ('cold', 'warm'):
+            runs = [self._trial(mode, urls) for _ in range(options['trials'])]
+            row = [statistics.median(r[key] for r in runs) * 1000 for key in ('boot', 'warmup', 'first', 'second')]
+            self.stdout.write(f"{mode:<6} " + ' '.join(f"{v:9.1f}" for v in row))
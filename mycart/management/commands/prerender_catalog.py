@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from mycart.prerender import PrerenderError, prerender_catalog
+
+
+class Command(BaseCommand):
+    help = "Render home, listing and product pages for anonymous visitors to static HTML."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=None,
+                            help=f"Target directory (default: PRERENDER_ROOT, {settings.PRERENDER_ROOT}).")
+        parser.add_argument('--jobs', '-j', type=int, default=4, help="Pages rendered in parallel.")
+        parser.add_argument('--force', action='store_true', help="Re-render every page, even unchanged ones.")
+
+    def handle(self, *args, **options):
+        try:
+            result = prerender_catalog(options['output'], jobs=options['jobs'], force=options['force'])
+        except PrerenderError as exc:
+            raise CommandError(str(exc))
+
+        if options['verbosity'] > 1:
+            for url in result['rendered']:
+                self.stdout.write(f"rendered {url}")
+            for url in result['removed']:
+                self.stdout.write(f"removed  {url}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(result['rendered'])} rendered, {len(result['skipped'])} unchanged, "
+            f"{len(result['removed'])} removed."
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from mycart.listings import process_pending
+
+
+class Command(BaseCommand):
+    help = "Process pending seller listings, e.g. ones left behind when a worker restarted mid-upload."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retry-processing', action='store_true',
+            help="Also retry listings a dead worker left in processing. Only use while no web worker is running.",
+        )
+
+    def handle(self, *args, **options):
+        count = process_pending(retry_processing=options['retry_processing'])
+        self.stdout.write(self.style.SUCCESS(f"Processed {count} pending listing(s)."))
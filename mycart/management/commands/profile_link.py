@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from mycart.models import User
+from mycart.profiling import PROFILE_PARAM, make_token
+
+
+class Command(BaseCommand):
+    help = "Print a URL that profiles a request when opened by the given staff user."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Path to profile, e.g. /accounts/cart/")
+        parser.add_argument('--user', required=True, help="Email of the staff user who will open it.")
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(email=options['user'], is_staff=True).first()
+        if user is None:
+            raise CommandError(f"No staff user with email '{options['user']}'.")
+        separator = '&' if '?' in options['path'] else '?'
+        self.stdout.write(f"{options['path']}{separator}{PROFILE_PARAM}={make_token(user)}")
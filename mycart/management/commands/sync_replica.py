@@ -0,0 +1,57 @@
+import os
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+def _sqlite_path(alias):
+    try:
+        database = settings.DATABASES[alias]
+    except KeyError:
+        raise CommandError(f"Unknown database alias '{alias}'.")
+    if database['ENGINE'] != 'django.db.backends.sqlite3':
+        raise CommandError(f"'{alias}' is not a SQLite database; use the database's own replication.")
+    return str(database['NAME'])
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the primary SQLite database to a replica file with the online backup "
+        "API, then swap it in atomically. Stand-in for real replication in local setups."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--replica', default='replica', help="Database alias to refresh.")
+        parser.add_argument('--pages', type=int, default=1024,
+                            help="Pages copied per backup step; writers may run between steps.")
+        parser.add_argument('--interval', type=float,
+                            help="Keep running, copying every this many seconds.")
+
+    def sync(self, source, target, pages):
+        started = time.perf_counter()
+        tmp = f"{target}.tmp{os.getpid()}"
+        src = sqlite3.connect(source)
+        dst = sqlite3.connect(tmp)
+        try:
+            src.backup(dst, pages=pages, sleep=0.005)
+        finally:
+            dst.close()
+            src.close()
+        # connections already open keep reading the old file; new ones get the copy
+        os.replace(tmp, target)
+        connections[self.replica].close()
+        self.stdout.write(f"replica refreshed in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    def handle(self, *args, **options):
+        self.replica = options['replica']
+        source = _sqlite_path(DEFAULT_DB_ALIAS)
+        target = _sqlite_path(self.replica)
+        if os.path.abspath(source) == os.path.abspath(target):
+            raise CommandError("The replica must be a different file from the primary.")
+        self.sync(source, target, options['pages'])
+        while options['interval']:
+            time.sleep(options['interval'])
+            self.sync(source, target, options['pages'])
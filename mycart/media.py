@@ -0,0 +1,190 @@
+"""Content-hashed uploads and efficient serving of MEDIA_ROOT files.
+
+Uploads are stored under a name derived from their SHA-256, so a URL always
+refers to the same bytes and can be cached forever. ``serve_media`` answers
+conditional and single-range requests and either hands the transfer to the front
+web server (``X-Sendfile`` / ``X-Accel-Redirect``) or streams the file with a
+``FileResponse``, which WSGI servers such as gunicorn send with ``sendfile()``.
+"""
+import hashlib
+import mimetypes
+import os
+import re
+from email.utils import parsedate_to_datetime
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.deconstruct import deconstructible
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_safe
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+HASHED_NAME_RE = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{32}\.[A-Za-z0-9]+$')
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+@deconstructible
+class HashedUploadTo:
+    """``upload_to`` callable naming files ``<prefix>/<h[:2]>/<h[:32]><ext>``.
+
+    `field` is the name of the file field on the instance whose content is hashed.
+    """
+
+    def __init__(self, prefix, field='image'):
+        self.prefix = prefix.strip('/')
+        self.field = field
+
+    def __call__(self, instance, filename):
+        digest = content_hash(getattr(instance, self.field).file)
+        ext = os.path.splitext(filename)[1].lower()
+        return f"{self.prefix}/{digest[:2]}/{digest[:32]}{ext}"
+
+    def __eq__(self, other):
+        return isinstance(other, HashedUploadTo) and (self.prefix, self.field) == (other.prefix, other.field)
+
+
+def content_hash(fileobj):
+    sha = hashlib.sha256()
+    if hasattr(fileobj, 'seek'):
+        fileobj.seek(0)
+    chunks = fileobj.chunks() if hasattr(fileobj, 'chunks') else iter(lambda: fileobj.read(64 * 1024), b'')
+    for chunk in chunks:
+        sha.update(chunk)
+    if hasattr(fileobj, 'seek'):
+        fileobj.seek(0)
+    return sha.hexdigest()
+
+
+def is_hashed_name(path):
+    return bool(HASHED_NAME_RE.search(path))
+
+
+class FileRange:
+    """Read-only view of ``length`` bytes of an open file from its current offset.
+
+    ``fileno()`` is exposed so a WSGI ``file_wrapper`` can still use ``sendfile``;
+    gunicorn starts at the file's current offset and stops at Content-Length.
+    """
+
+    def __init__(self, fileobj, length):
+        self.fileobj = fileobj
+        self.remaining = length
+        self.name = fileobj.name
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.fileobj.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.fileobj.fileno()
+
+    def close(self):
+        self.fileobj.close()
+
+
+def parse_range(header, size):
+    """Return ``(start, end)`` inclusive for a single satisfiable byte range.
+
+    Returns None when the header should be ignored (absent, malformed or a
+    multi-range request) and raises ValueError when it is unsatisfiable.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+    first, last = match.groups()
+    if first == '':
+        length = int(last)
+        if length == 0:
+            raise ValueError(header)
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def _if_range_matches(request, etag, last_modified):
+    value = request.META.get('HTTP_IF_RANGE')
+    if not value:
+        return True
+    if value.startswith('"'):
+        return value == etag
+    try:
+        return int(parsedate_to_datetime(value).timestamp()) == int(last_modified)
+    except (TypeError, ValueError):
+        return False
+
+
+def _offload_response(path, full_path, content_type):
+    mode = settings.MEDIA_SENDFILE_MODE
+    response = HttpResponse(content_type=content_type)
+    if mode == 'x-accel-redirect':
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT_PREFIX.rstrip('/') + '/' + quote(path)
+    elif mode == 'x-sendfile':
+        response['X-Sendfile'] = full_path
+    else:
+        raise ValueError(f"Unknown MEDIA_SENDFILE_MODE: {mode!r}")
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404("Invalid media path")
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        raise Http404("Media file not found")
+    if not os.path.isfile(full_path):
+        raise Http404("Media file not found")
+
+    size = stat.st_size
+    etag = quote_etag(f"{int(stat.st_mtime):x}-{size:x}")
+    cache_control = IMMUTABLE_CACHE_CONTROL if is_hashed_name(path) else f"public, max-age={settings.MEDIA_MAX_AGE}"
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if not_modified is not None:
+        not_modified['Cache-Control'] = cache_control
+        return not_modified
+
+    if settings.MEDIA_SENDFILE_MODE:
+        # the front server handles ranges and conditional requests from here on
+        response = _offload_response(path, full_path, content_type)
+    else:
+        byte_range = None
+        if _if_range_matches(request, etag, stat.st_mtime):
+            try:
+                byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+            except ValueError:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f"bytes */{size}"
+                return response
+
+        fileobj = open(full_path, 'rb')
+        if byte_range is None:
+            response = FileResponse(fileobj, content_type=content_type)
+        else:
+            start, end = byte_range
+            fileobj.seek(start)
+            response = FileResponse(FileRange(fileobj, end - start + 1), status=206, content_type=content_type)
+            response['Content-Range'] = f"bytes {start}-{end}/{size}"
+            response['Content-Length'] = str(end - start + 1)
+        response['Accept-Ranges'] = 'bytes'
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = cache_control
+    return response
@@ -0,0 +1,346 @@
+"""Application metrics in the Prometheus text exposition format.
+
+Every process keeps its samples in its own memory-mapped file under
+METRICS_DIR, so recording a sample is a struct write into shared pages and the
+``/metrics`` view adds up the files of all gunicorn workers. Counters of workers
+that have exited are kept; gauges only count processes that are still alive.
+Without METRICS_DIR (runserver, tests) samples live in anonymous memory and only
+the current process is reported.
+
+File layout (little endian)::
+
+    header: magic (8 bytes) | bytes used (uint32) | padding (4 bytes)
+    entry:  key length (uint32) | key (JSON, padded to 8 bytes) | value (double)
+"""
+import glob
+import json
+import mmap
+import os
+import struct
+import threading
+from bisect import bisect_left
+from functools import lru_cache
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+from .throttle import client_ip
+
+MAGIC = b'MYCMET01'
+HEADER = struct.Struct('<8sI4x')
+KEY_LENGTH = struct.Struct('<I')
+VALUE = struct.Struct('<d')
+INITIAL_SIZE = 64 * 1024
+FILE_PATTERN = 'metrics-*.db'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Store:
+    """Append-only ``key -> double`` slots owned by one process."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.offsets = {}
+        self.lock = threading.Lock()
+        if path is None:
+            self._file = None
+            self._map = mmap.mmap(-1, INITIAL_SIZE)
+        else:
+            self._file = open(path, 'w+b')
+            self._file.truncate(INITIAL_SIZE)
+            self._map = mmap.mmap(self._file.fileno(), INITIAL_SIZE)
+        self.used = HEADER.size
+        HEADER.pack_into(self._map, 0, MAGIC, self.used)
+
+    def _grow(self, needed):
+        size = len(self._map)
+        while size < needed:
+            size *= 2
+        if self._file is None:
+            grown = mmap.mmap(-1, size)
+            grown[:self.used] = self._map[:self.used]
+        else:
+            self._file.truncate(size)
+            grown = mmap.mmap(self._file.fileno(), size)
+        self._map.close()
+        self._map = grown
+
+    def _offset(self, key):
+        offset = self.offsets.get(key)
+        if offset is None:
+            encoded = key.encode()
+            padded = (KEY_LENGTH.size + len(encoded) + 7) // 8 * 8
+            end = self.used + padded + VALUE.size
+            if end > len(self._map):
+                self._grow(end)
+            KEY_LENGTH.pack_into(self._map, self.used, len(encoded))
+            self._map[self.used + KEY_LENGTH.size:self.used + KEY_LENGTH.size + len(encoded)] = encoded
+            offset = self.used + padded
+            VALUE.pack_into(self._map, offset, 0.0)
+            # publish the entry only once it is complete
+            self.used = end
+            HEADER.pack_into(self._map, 0, MAGIC, self.used)
+            self.offsets[key] = offset
+        return offset
+
+    def add(self, key, amount):
+        with self.lock:
+            offset = self._offset(key)
+            VALUE.pack_into(self._map, offset, VALUE.unpack_from(self._map, offset)[0] + amount)
+
+    def set(self, key, value):
+        with self.lock:
+            VALUE.pack_into(self._map, self._offset(key), value)
+
+    def items(self):
+        with self.lock:
+            return list(_read_entries(self._map))
+
+
+def _read_entries(buffer):
+    magic, used = HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        return
+    position = HEADER.size
+    while position < used:
+        (length,) = KEY_LENGTH.unpack_from(buffer, position)
+        start = position + KEY_LENGTH.size
+        key = bytes(buffer[start:start + length]).decode()
+        offset = position + (KEY_LENGTH.size + length + 7) // 8 * 8
+        yield key, VALUE.unpack_from(buffer, offset)[0]
+        position = offset + VALUE.size
+
+
+def _read_file(path):
+    with open(path, 'rb') as fh:
+        return list(_read_entries(fh.read()))
+
+
+_store_lock = threading.Lock()
+_store = None
+_store_pid = None
+
+
+def _get_store():
+    """This process's store; a forked worker gets a new one instead of the parent's."""
+    global _store, _store_pid
+    pid = os.getpid()
+    if _store_pid != pid:
+        with _store_lock:
+            if _store_pid != pid:
+                directory = getattr(settings, 'METRICS_DIR', None)
+                path = None
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                    path = os.path.join(directory, f'metrics-{pid}.db')
+                _store = _Store(path)
+                _store_pid = pid
+    return _store
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def clear_directory():
+    """Remove the files of a previous run; call before any worker starts."""
+    directory = getattr(settings, 'METRICS_DIR', None)
+    if directory:
+        for path in glob.glob(os.path.join(directory, FILE_PATTERN)):
+            os.remove(path)
+
+
+REGISTRY = {}
+
+
+@lru_cache(maxsize=4096)
+def _encode_key(name, labels):
+    return json.dumps([name, labels])
+
+
+def _key(name, labels):
+    return _encode_key(name, tuple(sorted(labels.items())))
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        REGISTRY[name] = self
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        _get_store().add(_key(self.name, labels), amount)
+
+
+class Gauge(Metric):
+    """Summed over live processes; each process sets its own value."""
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        _get_store().set(_key(self.name, labels), value)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        store = _get_store()
+        # buckets are stored individually and made cumulative when exported
+        le = self.buckets[bisect_left(self.buckets, value)]
+        store.add(_key(self.name + '_bucket', dict(labels, le=_format(le))), 1)
+        store.add(_key(self.name + '_sum', labels), value)
+
+
+REQUEST_LATENCY = Histogram('mycart_request_duration_seconds', 'Time spent producing a response, by URL name.')
+CART_ADDITIONS = Counter('mycart_cart_additions_total', 'Products added to a cart.')
+CART_REMOVALS = Counter('mycart_cart_removals_total', 'Products removed from a cart.')
+CART_MERGES = Counter('mycart_login_cart_merges_total', 'Anonymous session carts merged into a user cart at login.')
+ORDERS = Counter('mycart_place_order_total', 'place_order outcomes.')
+CACHE_LOOKUPS = Counter('mycart_cache_lookups_total', 'Cache reads by cache and result.')
+DB_CONNECTIONS = Gauge('mycart_db_connections', 'Database connections held open between requests.')
+DB_CONNECTIONS_OPENED = Counter('mycart_db_connections_opened_total', 'Database connections opened.')
+THROTTLED = Counter('mycart_throttled_total', 'Login, signup and password reset attempts refused by the throttle.')
+
+
+def cache_lookup(cache_name, hit):
+    CACHE_LOOKUPS.inc(cache=cache_name, result='hit' if hit else 'miss')
+
+
+def _format(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _collect():
+    """``{key: value}`` summed across every process that wrote samples."""
+    directory = getattr(settings, 'METRICS_DIR', None)
+    if directory:
+        sources = []
+        for path in glob.glob(os.path.join(directory, FILE_PATTERN)):
+            pid = int(os.path.basename(path)[len('metrics-'):-len('.db')])
+            try:
+                sources.append((_pid_alive(pid), _read_file(path)))
+            except (FileNotFoundError, struct.error):
+                continue
+    else:
+        sources = [(True, _get_store().items())]
+
+    totals = {}
+    for alive, entries in sources:
+        for key, value in entries:
+            name, labels = json.loads(key)
+            metric = REGISTRY.get(name)
+            if metric is not None and metric.kind == 'gauge' and not alive:
+                continue
+            sample = (name, tuple(tuple(pair) for pair in labels))
+            totals[sample] = totals.get(sample, 0.0) + value
+    return totals
+
+
+def _line(name, labels, value):
+    if labels:
+        rendered = ','.join(
+            '{}="{}"'.format(k, str(v).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+            for k, v in labels
+        )
+        return f'{name}{{{rendered}}} {_format(value)}'
+    return f'{name} {_format(value)}'
+
+
+def _histogram_lines(metric, totals):
+    series = {}
+    for (name, labels), value in totals.items():
+        if name == metric.name + '_bucket':
+            le = dict(labels)['le']
+            base = tuple(pair for pair in labels if pair[0] != 'le')
+            series.setdefault(base, {'buckets': {}, 'sum': 0.0})['buckets'][le] = value
+        elif name == metric.name + '_sum':
+            series.setdefault(labels, {'buckets': {}, 'sum': 0.0})['sum'] = value
+    lines = []
+    for labels in sorted(series):
+        cumulative = 0.0
+        for bound in metric.buckets:
+            cumulative += series[labels]['buckets'].get(_format(bound), 0.0)
+            lines.append(_line(metric.name + '_bucket', labels + (('le', _format(bound)),), cumulative))
+        lines.append(_line(metric.name + '_sum', labels, series[labels]['sum']))
+        lines.append(_line(metric.name + '_count', labels, cumulative))
+    return lines
+
+
+def _hit_ratio_lines(totals):
+    lookups = {}
+    for (name, labels), value in totals.items():
+        if name == CACHE_LOOKUPS.name:
+            labels = dict(labels)
+            counts = lookups.setdefault(labels['cache'], {'hit': 0.0, 'miss': 0.0})
+            counts[labels['result']] += value
+    lines = [
+        '# HELP mycart_cache_hit_ratio Share of cache reads that were hits.',
+        '# TYPE mycart_cache_hit_ratio gauge',
+    ]
+    for cache_name in sorted(lookups):
+        counts = lookups[cache_name]
+        lines.append(_line(
+            'mycart_cache_hit_ratio', (('cache', cache_name),),
+            counts['hit'] / (counts['hit'] + counts['miss']),
+        ))
+    return lines
+
+
+def render():
+    """All registered metrics as Prometheus text format."""
+    totals = _collect()
+    lines = []
+    for name in sorted(REGISTRY):
+        metric = REGISTRY[name]
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.kind}')
+        if metric.kind == 'histogram':
+            lines.extend(_histogram_lines(metric, totals))
+        else:
+            for sample_name, labels in sorted(totals):
+                if sample_name == name:
+                    lines.append(_line(name, labels, totals[sample_name, labels]))
+    lines.extend(_hit_ratio_lines(totals))
+    return '\n'.join(lines) + '\n'
+
+
+def _may_scrape(request):
+    token = settings.METRICS_TOKEN
+    if token:
+        scheme, _, given = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+        if scheme.lower() == 'bearer' and constant_time_compare(given.strip(), token):
+            return True
+    # the real client behind trusted proxies, not the proxy's own address
+    if client_ip(request) in settings.METRICS_ALLOWED_IPS:
+        return True
+    return request.user.is_authenticated and request.user.is_staff
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint for METRICS_TOKEN bearers, METRICS_ALLOWED_IPS and staff users."""
+    if not _may_scrape(request):
+        return HttpResponseForbidden()
+    return HttpResponse(render(), content_type=CONTENT_TYPE)
@@ -0,0 +1,149 @@
+import os
+import time
+
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.utils.cache import patch_vary_headers
+from whitenoise.base import WhiteNoise
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from . import compression, metrics, prerender, profiling, routers
+
+
+class PrerenderedPageMiddleware(WhiteNoise):
+    """Serve pages written by ``manage.py prerender_catalog`` to anonymous visitors.
+
+    Only plain GET/HEAD requests without a query string, session or messages
+    cookie are eligible; everyone else falls through to the normal views. The
+    pages are scanned once, and again only after the command finishes a run
+    (it replaces its manifest), so a re-run is picked up without restarting
+    workers and without touching the filesystem for each page. Only the pages
+    the manifest lists are served, never the manifest or other files in the
+    directory.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        super().__init__(application=None, max_age=0, index_file=True)
+        self.loaded_stamp = None
+        self.reload()
+
+    def reload(self):
+        root = settings.PRERENDER_ROOT
+        stamp = prerender.manifest_stamp(root)
+        if stamp != self.loaded_stamp:
+            self.files = {}
+            if stamp is not None:
+                self.add_pages(root)
+            self.loaded_stamp = stamp
+
+    def add_pages(self, root):
+        stat_cache = {}
+        for url in prerender.load_manifest(root):
+            if any(part.startswith('.') for part in url.split('/')):
+                continue
+            path = prerender.page_path(root, url)
+            for variant in (path, path + '.gz', path + '.br'):
+                try:
+                    stat_cache[variant] = os.stat(variant)
+                except FileNotFoundError:
+                    pass
+            if path in stat_cache:
+                index_url = f"{url.rstrip('/')}/{prerender.INDEX_FILE}"
+                self.add_file_to_dictionary(index_url, path, stat_cache=stat_cache)
+
+    def __call__(self, request):
+        if (
+            request.method in ('GET', 'HEAD')
+            and not request.META.get('QUERY_STRING')
+            and settings.SESSION_COOKIE_NAME not in request.COOKIES
+            and CookieStorage.cookie_name not in request.COOKIES
+        ):
+            self.reload()
+            page = self.files.get(request.path_info)
+            if page is not None:
+                response = WhiteNoiseMiddleware.serve(page, request)
+                patch_vary_headers(response, ('Cookie',))
+                return response
+        return self.get_response(request)
+
+
+class MetricsMiddleware:
+    """Record how long each response took, labelled with the URL name.
+
+    Goes first in MIDDLEWARE so the time includes the other middleware. For
+    streaming responses only the time to the first byte is measured.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        response = self.get_response(request)
+        match = request.resolver_match
+        metrics.REQUEST_LATENCY.observe(
+            time.perf_counter() - started,
+            view=match.view_name if match else 'unmatched',
+        )
+        return response
+
+
+class CompressionMiddleware:
+    """Compress responses with brotli or gzip, see mycart.compression.
+
+    Goes near the top of MIDDLEWARE so it sees the final response body.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return compression.compress_response(request, self.get_response(request))
+
+
+class ReplicaPinningMiddleware:
+    """Let GET/HEAD requests read catalog and order history from a replica.
+
+    Other methods, and clients that wrote within REPLICA_PIN_SECONDS, read from
+    the primary. See mycart.routers.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        use_replica = request.method in ('GET', 'HEAD') and routers.PIN_COOKIE not in request.COOKIES
+        token = routers.start_request(use_replica)
+        try:
+            response = self.get_response(request)
+        finally:
+            wrote = routers.finish_request(token)
+        if wrote:
+            response.set_cookie(
+                routers.PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax',
+            )
+        return response
+
+
+class ProfilingMiddleware:
+    """Run the view under the profiler when mycart.profiling says so.
+
+    Goes last in MIDDLEWARE: it calls the view itself from process_view, so
+    every other middleware (CSRF included) must have had its turn already.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        trigger = profiling.trigger_for(request)
+        if trigger is None:
+            return None
+        response, profile, sampler, seconds = profiling.run_profiled(view_func, request, view_args, view_kwargs)
+        capture = profiling.save_capture(request, response, profile, sampler, seconds, trigger)
+        response['X-Profile-Capture'] = capture.name
+        return response
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_mobiles_category(apps, schema_editor):
+    """Every product created so far is a phone listed on the mobiles page."""
+    Category = apps.get_model('mycart', 'Category')
+    Product = apps.get_model('mycart', 'Product')
+    mobiles, _ = Category.objects.get_or_create(slug='mobiles', defaults={'name': 'Mobiles'})
+    Product.objects.filter(category__isnull=True).update(category=mobiles)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mycart', '0007_order_orderitem'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Category',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('slug', models.SlugField(unique=True)),
+            ],
+            options={
+                'verbose_name_plural': 'categories',
+                'ordering': ('name',),
+            },
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='brand',
+            field=models.CharField(blank=True, db_index=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='category',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='products', to='mycart.category'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'price'], name='mycart_prod_categor_87642d_idx'),
+        ),
+        migrations.RunPython(create_mobiles_category, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:26
+
+import mycart.media
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mycart', '0008_category_product_brand'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='image',
+            field=models.ImageField(upload_to=mycart.media.HashedUploadTo('products')),
+        ),
+    ]
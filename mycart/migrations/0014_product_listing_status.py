@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:44
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mycart', '0013_profilecapture'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, help_text='Resized copies of the image by variant name'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='processing_error',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='seller',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='listings', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='source_file',
+            field=models.CharField(blank=True, help_text='Uploaded photo waiting to be processed, relative to MEDIA_ROOT', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('published', 'Published'), ('rejected', 'Rejected')], db_index=True, default='published', max_length=10),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mycart', '0014_product_listing_status'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('published', 'Published'), ('rejected', 'Rejected')], db_index=True, default='published', max_length=10),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mycart', '0015_product_listing_processing'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='source_file',
+            field=models.CharField(blank=True, help_text='Uploaded photo waiting to be processed, relative to LISTING_UPLOAD_ROOT', max_length=255),
+        ),
+    ]
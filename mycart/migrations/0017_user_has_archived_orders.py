@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mycart', '0016_product_source_file_upload_root'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='has_archived_orders',
+            field=models.BooleanField(default=False, help_text='Set by manage.py archive_orders'),
+        ),
+    ]
@@ -1,12 +1,14 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 from .managers import CustomUserManager
+from .media import HashedUploadTo
 from django.conf import settings
 
 class User(AbstractUser):
     email = models.EmailField(unique=True)
     phone = models.CharField(max_length=15, unique=True, null=True, blank=True)
     otp = models.IntegerField(null=True, blank=True)
+    has_archived_orders = models.BooleanField(default=False, help_text="Set by manage.py archive_orders")
 
 
     USERNAME_FIELD = "email"
@@ -18,12 +20,48 @@ class User(AbstractUser):
         return self.email
 
 
+class Category(models.Model):
+    name = models.CharField(max_length=100)
+    slug = models.SlugField(unique=True)
+
+    class Meta:
+        ordering = ("name",)
+        verbose_name_plural = "categories"
+
+    def __str__(self):
+        return self.name
+
+
+class ProductQuerySet(models.QuerySet):
+    def published(self):
+        return self.filter(status=Product.PUBLISHED)
+
+
 class Product(models.Model):
+    PENDING = "pending"
+    PROCESSING = "processing"
+    PUBLISHED = "published"
+    REJECTED = "rejected"
+    STATUSES = ((PENDING, "Pending"), (PROCESSING, "Processing"), (PUBLISHED, "Published"), (REJECTED, "Rejected"))
+
     name = models.CharField(max_length=100)
     price = models.IntegerField()
     old_price = models.IntegerField(null=True, blank=True)
-    image = models.ImageField(upload_to="products/")
+    image = models.ImageField(upload_to=HashedUploadTo("products"))
     description = models.TextField()
+    category = models.ForeignKey(Category, null=True, blank=True, on_delete=models.SET_NULL, related_name="products")
+    brand = models.CharField(max_length=100, blank=True, db_index=True)
+    # seller listings start pending and are published once their photo is processed (see mycart.listings)
+    status = models.CharField(max_length=10, choices=STATUSES, default=PUBLISHED, db_index=True)
+    seller = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name="listings")
+    source_file = models.CharField(max_length=255, blank=True, help_text="Uploaded photo waiting to be processed, relative to LISTING_UPLOAD_ROOT")
+    image_variants = models.JSONField(default=dict, blank=True, help_text="Resized copies of the image by variant name")
+    processing_error = models.CharField(max_length=255, blank=True)
+
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        indexes = [models.Index(fields=["category", "price"])]
 
     def __str__(self):
         return self.name
@@ -33,6 +71,8 @@ class Cart(models.Model):
     """Simple per-user cart (one cart per user)."""
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="cart")
     created_at = models.DateTimeField(auto_now_add=True)
+    # last time an item was added, removed or merged in; used to prune abandoned carts
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return f"Cart({self.user})"
@@ -70,8 +110,94 @@ class OrderItem(models.Model):
     quantity = models.PositiveIntegerField(default=1)
     price = models.IntegerField(help_text='Price per item at time of purchase')
 
+    @property
+    def product_name(self):
+        return self.product.name
+
     def subtotal(self):
         return self.price * self.quantity
 
     def __str__(self):
         return f"{self.product} x{self.quantity} (@{self.price})"
+
+
+class ArchivedOrder(models.Model):
+    """An Order moved out of the main database by ``manage.py archive_orders``.
+
+    Lives in the 'archive' database (see mycart.routers), so it keeps plain ids
+    instead of foreign keys into the main database. The primary key is the
+    original Order's.
+    """
+    order_id = models.CharField(max_length=64, unique=True)
+    user_id = models.IntegerField(null=True, blank=True)
+    name = models.CharField(max_length=200, blank=True)
+    address = models.TextField(blank=True)
+    pincode = models.CharField(max_length=20, blank=True)
+    total = models.IntegerField(default=0)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["user_id", "-created_at"])]
+
+    def __str__(self):
+        return f"Archived order {self.order_id}"
+
+
+class ArchivedOrderItem(models.Model):
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='items')
+    product_id = models.IntegerField()
+    # copied at archive time; the product may be gone by the time anyone looks
+    product_name = models.CharField(max_length=100)
+    quantity = models.PositiveIntegerField(default=1)
+    price = models.IntegerField(help_text='Price per item at time of purchase')
+
+    def subtotal(self):
+        return self.price * self.quantity
+
+    def __str__(self):
+        return f"{self.product_name} x{self.quantity} (@{self.price})"
+
+
+class IdempotencyKey(models.Model):
+    """Outcome of a write request, so a replay with the same key is not re-executed.
+
+    A row with no status_code is a claim for a request that is still running.
+    """
+    key = models.CharField(max_length=64)
+    scope = models.CharField(max_length=64, help_text='User id or session key the key belongs to')
+    endpoint = models.CharField(max_length=100, blank=True)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    location = models.CharField(max_length=500, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        unique_together = ("scope", "key")
+
+    def __str__(self):
+        return f"{self.endpoint} {self.key} -> {self.status_code}"
+
+
+class ProfileCapture(models.Model):
+    """A profile of one request, written by mycart.middleware.ProfilingMiddleware.
+
+    The profile itself is on disk under PROFILE_ROOT: ``<name>.prof`` (pstats)
+    and ``<name>.collapsed`` (stack samples in flame-graph collapsed format).
+    """
+    TRIGGERS = (("token", "Signed token"), ("sample", "Random sample"))
+
+    name = models.CharField(max_length=32, unique=True)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=500)
+    view_name = models.CharField(max_length=200, blank=True, db_index=True)
+    status_code = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField()
+    samples = models.PositiveIntegerField(default=0)
+    trigger = models.CharField(max_length=10, choices=TRIGGERS)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms)"
@@ -0,0 +1,146 @@
+"""Pincode serviceability and delivery estimates from a memory-mapped data file.
+
+The file is a small header followed by fixed-width records sorted by pincode, so
+a lookup is a binary search over the mapped pages: no database table, no network
+call, and every worker process shares the same page-cached copy. Regenerate it
+from CSV with ``manage.py build_pincodes``.
+
+Layout (little endian)::
+
+    header: magic (8 bytes) | record count (uint32)
+    record: pincode (uint32) | zone (uint8) | serviceable (uint8) | eta days (uint16)
+"""
+import csv
+import mmap
+import os
+import re
+import struct
+import threading
+from collections import namedtuple
+
+from django.conf import settings
+
+MAGIC = b'MYCPIN01'
+HEADER = struct.Struct('<8sI')
+RECORD = struct.Struct('<IBBH')
+ZONES = ('local', 'metro', 'regional', 'rest_of_india', 'special')
+PINCODE_RE = re.compile(r'^[1-9][0-9]{5}$')
+
+Serviceability = namedtuple('Serviceability', 'pincode zone serviceable eta_days')
+
+
+class PincodeDataError(Exception):
+    pass
+
+
+class PincodeTable:
+    """Read-only view over one pincode data file."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as fh:
+            self._map = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, self.count = HEADER.unpack_from(self._map, 0)
+        except struct.error:
+            raise PincodeDataError(f"{path} is too short to be a pincode file")
+        if magic != MAGIC:
+            raise PincodeDataError(f"{path} is not a pincode file")
+        if len(self._map) != HEADER.size + self.count * RECORD.size:
+            raise PincodeDataError(f"{path} is truncated")
+
+    def _record(self, index):
+        return RECORD.unpack_from(self._map, HEADER.size + index * RECORD.size)
+
+    def lookup(self, pincode):
+        low, high = 0, self.count - 1
+        while low <= high:
+            mid = (low + high) // 2
+            code, zone, serviceable, eta_days = self._record(mid)
+            if code < pincode:
+                low = mid + 1
+            elif code > pincode:
+                high = mid - 1
+            else:
+                return Serviceability(code, ZONES[zone], bool(serviceable), eta_days)
+        return None
+
+    def close(self):
+        self._map.close()
+
+
+_lock = threading.Lock()
+_table = None
+_table_id = None
+
+
+def get_table():
+    """The table for PINCODE_DATA_FILE, reopened when the file is replaced.
+
+    Returns None when no data file has been built.
+    """
+    global _table, _table_id
+    try:
+        stat = os.stat(settings.PINCODE_DATA_FILE)
+    except FileNotFoundError:
+        return None
+    table_id = (settings.PINCODE_DATA_FILE, stat.st_ino, stat.st_mtime_ns)
+    if table_id != _table_id:
+        with _lock:
+            if table_id != _table_id:
+                # the previous map stays valid for readers still holding it
+                _table = PincodeTable(settings.PINCODE_DATA_FILE)
+                _table_id = table_id
+    return _table
+
+
+def normalize(pincode):
+    """Return the pincode as an int, or None if it is not a valid Indian pincode."""
+    pincode = (pincode or '').strip()
+    return int(pincode) if PINCODE_RE.match(pincode) else None
+
+
+def lookup(pincode):
+    """Serviceability for a pincode string, or None if unknown or malformed."""
+    code = normalize(pincode)
+    table = get_table()
+    if code is None or table is None:
+        return None
+    return table.lookup(code)
+
+
+def read_csv(path):
+    """Yield ``(pincode, zone_index, serviceable, eta_days)`` from a CSV file.
+
+    Columns: pincode, zone (one of ZONES), eta_days and optionally serviceable
+    (1/0, yes/no, true/false; defaults to serviceable).
+    """
+    with open(path, newline='', encoding='utf-8') as fh:
+        for line, row in enumerate(csv.DictReader(fh), start=2):
+            code = normalize(row.get('pincode'))
+            zone = (row.get('zone') or '').strip().lower()
+            if code is None:
+                raise PincodeDataError(f"line {line}: invalid pincode {row.get('pincode')!r}")
+            if zone not in ZONES:
+                raise PincodeDataError(f"line {line}: unknown zone {zone!r}, expected one of {', '.join(ZONES)}")
+            try:
+                eta_days = int(row.get('eta_days'))
+            except (TypeError, ValueError):
+                raise PincodeDataError(f"line {line}: eta_days must be an integer")
+            serviceable = (row.get('serviceable') or '1').strip().lower() not in ('0', 'no', 'false', 'n')
+            yield code, ZONES.index(zone), serviceable, eta_days
+
+
+def write_table(records, path):
+    """Write records (de-duplicated, last one wins) sorted by pincode; returns the count."""
+    unique = {}
+    for code, zone, serviceable, eta_days in records:
+        unique[code] = (zone, int(serviceable), min(max(eta_days, 0), 0xFFFF))
+    tmp = f"{path}.tmp{os.getpid()}"
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(tmp, 'wb') as fh:
+        fh.write(HEADER.pack(MAGIC, len(unique)))
+        for code in sorted(unique):
+            fh.write(RECORD.pack(code, *unique[code]))
+    # atomic swap: running workers notice the new inode on their next lookup
+    os.replace(tmp, path)
+    return len(unique)
@@ -0,0 +1,198 @@
+"""Pre-render anonymous catalog pages to static HTML under ``PRERENDER_ROOT``.
+
+Each page gets a fingerprint built from the data and templates it depends on and
+is only re-rendered when that fingerprint changes. Pages are written as
+``<url>/index.html`` (plus ``.gz`` / ``.br`` siblings) so whitenoise, or the web
+server, can serve them without running any view code.
+"""
+import gzip
+import hashlib
+import json
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.backends.base import SessionBase
+from django.db import connections
+from django.http import HttpRequest
+from django.template.loader import get_template
+from django.urls import resolve, reverse
+
+from .compression import brotli
+from .models import Category, Product
+
+MANIFEST_NAME = '.prerender-manifest.json'
+INDEX_FILE = 'index.html'
+PAGE_TEMPLATES = (
+    'home.html',
+    'items/mobiles.html',
+    'items/category.html',
+    'items/_filters.html',
+    'product_detail.html',
+)
+
+
+class PrerenderError(Exception):
+    pass
+
+
+def _digest(*parts):
+    raw = json.dumps(parts, sort_keys=True, default=str).encode()
+    return hashlib.sha1(raw, usedforsecurity=False).hexdigest()
+
+
+def _templates_digest():
+    return _digest([get_template(name).template.source for name in PAGE_TEMPLATES])
+
+
+def catalog_pages():
+    """Return ``{url: fingerprint}`` for every page that can be pre-rendered."""
+    templates = _templates_digest()
+    products = list(Product.objects.published().order_by('id').values())
+    categories = list(Category.objects.order_by('id').values())
+    product_digest = {p['id']: _digest(p) for p in products}
+    catalog = _digest(templates, categories, sorted(product_digest.items()))
+
+    pages = {
+        '/': catalog,
+        reverse('home'): catalog,
+    }
+    for category in categories:
+        members = [product_digest[p['id']] for p in products if p['category_id'] == category['id']]
+        # facet counts on listing pages depend on every category's membership
+        membership = [(p['id'], p['category_id']) for p in products]
+        fingerprint = _digest(templates, category, members, membership)
+        pages[reverse('category_listing', args=[category['slug']])] = fingerprint
+        if category['slug'] == 'mobiles':
+            pages[reverse('mobiles')] = fingerprint
+    for product in products:
+        url = reverse('product_detail', args=[product['id']])
+        pages[url] = _digest(templates, product_digest[product['id']])
+    return pages
+
+
+def _anonymous_request(url):
+    request = HttpRequest()
+    request.method = 'GET'
+    request.path = request.path_info = url
+    request.META = {
+        'REQUEST_METHOD': 'GET',
+        'SERVER_NAME': settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost',
+        'SERVER_PORT': '443',
+    }
+    request.user = AnonymousUser()
+    # an unsaved, in-memory session; nothing rendered here may depend on it
+    request.session = SessionBase()
+    # lets templates drop per-visitor markup from the shared static copy
+    request.prerender = True
+    return request
+
+
+def render_page(url):
+    """Render `url` as an anonymous visitor would see it and return the HTML bytes."""
+    try:
+        request = _anonymous_request(url)
+        match = resolve(url)
+        request.resolver_match = match
+        response = match.func(request, *match.args, **match.kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        if response.status_code != 200:
+            raise PrerenderError(f"{url} returned HTTP {response.status_code}")
+        return response.content
+    finally:
+        # worker threads each hold their own connection
+        connections.close_all()
+
+
+def page_path(root, url):
+    return os.path.join(root, url.strip('/'), INDEX_FILE)
+
+
+def write_page(root, url, content):
+    """Atomically write the page and its pre-compressed variants."""
+    path = page_path(root, url)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    variants = [(path, content), (path + '.gz', gzip.compress(content, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append((path + '.br', brotli.compress(content)))
+    for target, data in variants:
+        tmp = f"{target}.tmp{os.getpid()}"
+        with open(tmp, 'wb') as fh:
+            fh.write(data)
+        os.replace(tmp, target)
+
+
+def remove_page(root, url):
+    directory = os.path.dirname(page_path(root, url))
+    for name in (INDEX_FILE, INDEX_FILE + '.gz', INDEX_FILE + '.br'):
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass
+
+
+def load_manifest(root):
+    try:
+        with open(os.path.join(root, MANIFEST_NAME)) as fh:
+            return json.load(fh)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def manifest_stamp(root):
+    """Identifies the last completed run in `root`, or None if there was none.
+
+    The manifest is replaced at the end of every run, so servers compare this
+    to notice new pages without scanning the directory on each request.
+    """
+    try:
+        stat = os.stat(os.path.join(root, MANIFEST_NAME))
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+
+def save_manifest(root, manifest):
+    path = os.path.join(root, MANIFEST_NAME)
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as fh:
+        json.dump(manifest, fh, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def prerender_catalog(root=None, jobs=4, force=False):
+    """Render changed pages in parallel and drop pages that no longer exist.
+
+    Returns a dict with the lists of ``rendered``, ``skipped`` and ``removed`` urls.
+    """
+    root = root or settings.PRERENDER_ROOT
+    if force and os.path.isdir(root):
+        shutil.rmtree(root)
+    os.makedirs(root, exist_ok=True)
+
+    previous = load_manifest(root)
+    pages = catalog_pages()
+    stale = [
+        url for url, fingerprint in pages.items()
+        if force or previous.get(url) != fingerprint or not os.path.exists(page_path(root, url))
+    ]
+
+    manifest = {url: fp for url, fp in previous.items() if url in pages and url not in stale}
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        for url, content in zip(stale, pool.map(render_page, stale)):
+            write_page(root, url, content)
+            manifest[url] = pages[url]
+
+    removed = [url for url in previous if url not in pages]
+    for url in removed:
+        remove_page(root, url)
+    save_manifest(root, manifest)
+
+    return {
+        'rendered': stale,
+        'skipped': [url for url in pages if url not in stale],
+        'removed': removed,
+    }
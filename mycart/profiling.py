@@ -0,0 +1,191 @@
+"""On-demand request profiling for production.
+
+A request is profiled when a staff user passes a signed token (``?_profile=`` or
+an ``X-Profile`` header, see `make_token` / ``manage.py profile_link``), or at
+random with probability PROFILE_SAMPLE_RATE. The view runs under cProfile while
+a background thread samples its stack every PROFILE_SAMPLE_INTERVAL seconds.
+Both are written under PROFILE_ROOT and listed as ProfileCapture rows in the
+admin, with a cumulative-time table and the collapsed stacks for flame graphs.
+Only the newest PROFILE_MAX_CAPTURES, no older than PROFILE_MAX_AGE_DAYS, are
+kept: older ones are deleted, files included, whenever a capture is written and
+by ``manage.py collect_garbage``.
+"""
+import cProfile
+import io
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import Q
+from django.utils import timezone
+
+PROFILE_PARAM = '_profile'
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+TOKEN_SALT = 'mycart.profiling'
+MAX_STACK_DEPTH = 100
+
+
+def make_token(user):
+    """A token that lets `user` (who must be staff) profile requests for PROFILE_TOKEN_MAX_AGE."""
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign(str(user.pk))
+
+
+def _token_valid(request, token):
+    try:
+        user_pk = signing.TimestampSigner(salt=TOKEN_SALT).unsign(
+            token, max_age=settings.PROFILE_TOKEN_MAX_AGE
+        )
+    except signing.BadSignature:
+        return False
+    user = request.user
+    return user.is_authenticated and user.is_staff and str(user.pk) == user_pk
+
+
+def trigger_for(request):
+    """'token', 'sample' or None."""
+    token = request.GET.get(PROFILE_PARAM) or request.META.get(PROFILE_HEADER)
+    if token and _token_valid(request, token):
+        return 'token'
+    rate = settings.PROFILE_SAMPLE_RATE
+    if rate and random.random() < rate:
+        return 'sample'
+    return None
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    module = frame.f_globals.get('__name__', '?')
+    return f"{module}.{getattr(code, 'co_qualname', code.co_name)}"
+
+
+class StackSampler(threading.Thread):
+    """Sample one thread's stack at a fixed interval, below a given root frame.
+
+    `stacks` counts identical stacks, root first, in the ``a;b;c`` form that
+    flame graph tools read.
+    """
+
+    def __init__(self, thread_id, root_code, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.root_code = root_code
+        self.interval = interval
+        self.stacks = {}
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None and frame.f_code is not self.root_code and len(names) < MAX_STACK_DEPTH:
+                names.append(_frame_name(frame))
+                frame = frame.f_back
+            if names:
+                stack = ';'.join(reversed(names))
+                self.stacks[stack] = self.stacks.get(stack, 0) + 1
+                self.samples += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def collapsed(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in sorted(self.stacks.items()))
+
+
+def run_profiled(view_func, request, args, kwargs):
+    """Call the view under cProfile and the stack sampler.
+
+    Returns ``(response, profile, sampler, seconds)``.
+    """
+    profile = cProfile.Profile()
+    # stacks start at the view: everything from Profile.runcall up is left out
+    sampler = StackSampler(threading.get_ident(), cProfile.Profile.runcall.__code__, settings.PROFILE_SAMPLE_INTERVAL)
+    sampler.start()
+    started = time.perf_counter()
+    try:
+        response = profile.runcall(view_func, request, *args, **kwargs)
+    finally:
+        seconds = time.perf_counter() - started
+        sampler.stop()
+    return response, profile, sampler, seconds
+
+
+def profile_paths(name):
+    base = os.path.join(settings.PROFILE_ROOT, name)
+    return base + '.prof', base + '.collapsed'
+
+
+def save_capture(request, response, profile, sampler, seconds, trigger):
+    from .models import ProfileCapture
+
+    os.makedirs(settings.PROFILE_ROOT, exist_ok=True)
+    name = uuid.uuid4().hex
+    prof_path, collapsed_path = profile_paths(name)
+    profile.dump_stats(prof_path)
+    with open(collapsed_path, 'w', encoding='utf-8') as fh:
+        fh.write(sampler.collapsed())
+    # keep the token out of the admin
+    query = request.GET.copy()
+    query.pop(PROFILE_PARAM, None)
+    path = f"{request.path}?{query.urlencode()}" if query else request.path
+    match = request.resolver_match
+    capture = ProfileCapture.objects.create(
+        name=name,
+        method=request.method,
+        path=path[:500],
+        view_name=match.view_name if match else '',
+        status_code=response.status_code,
+        duration_ms=seconds * 1000,
+        samples=sampler.samples,
+        trigger=trigger,
+    )
+    # the post_delete signal removes their files
+    stale_captures().delete()
+    return capture
+
+
+def stale_captures():
+    """Captures older than PROFILE_MAX_AGE_DAYS or beyond the newest PROFILE_MAX_CAPTURES."""
+    from .models import ProfileCapture
+
+    cutoff = timezone.now() - timedelta(days=settings.PROFILE_MAX_AGE_DAYS)
+    newest = ProfileCapture.objects.order_by('-created_at', '-id').values('id')[:settings.PROFILE_MAX_CAPTURES]
+    return ProfileCapture.objects.filter(Q(created_at__lt=cutoff) | ~Q(id__in=newest))
+
+
+def top_functions(capture, limit=40, sort='cumulative'):
+    """The pstats table for a capture, `limit` rows sorted by `sort`."""
+    prof_path, _ = profile_paths(capture.name)
+    out = io.StringIO()
+    try:
+        stats = pstats.Stats(prof_path, stream=out)
+    except FileNotFoundError:
+        return "Profile file is missing."
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return out.getvalue()
+
+
+def collapsed_stacks(capture):
+    _, collapsed_path = profile_paths(capture.name)
+    try:
+        with open(collapsed_path, encoding='utf-8') as fh:
+            return fh.read()
+    except FileNotFoundError:
+        return ''
+
+
+def delete_files(capture):
+    for path in profile_paths(capture.name):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
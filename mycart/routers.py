@@ -0,0 +1,96 @@
+"""Database routing: the order archive and read replicas.
+
+ArchivedOrder and ArchivedOrderItem live in the 'archive' database and nothing
+else does; ``manage.py migrate --database archive`` creates its tables (and
+``manage.py archive_orders`` runs it before archiving).
+
+Catalog and order-history reads made while serving a GET or HEAD request go to
+one of DATABASE_REPLICAS (see ReplicaPinningMiddleware). Everything else goes
+to the primary: sessions, users, carts, any read outside a request, and every
+read after the request has written. After a write the client also carries a
+cookie for REPLICA_PIN_SECONDS, so the next pages read their own writes even
+while the replicas lag.
+"""
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+
+ARCHIVE_DB = 'archive'
+PRIMARY_DB = 'default'
+PIN_COOKIE = 'pin_primary'
+# models whose reads may lag a little behind the primary
+REPLICA_MODELS = {'mycart.product', 'mycart.category', 'mycart.order', 'mycart.orderitem'}
+ARCHIVE_MODELS = {'archivedorder', 'archivedorderitem'}
+
+
+def _is_archived(model):
+    return model._meta.app_label == 'mycart' and model._meta.model_name in ARCHIVE_MODELS
+
+
+class ArchiveRouter:
+    def db_for_read(self, model, **hints):
+        return ARCHIVE_DB if _is_archived(model) else None
+
+    db_for_write = db_for_read
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # instances, not type(): request.user arrives wrapped in a SimpleLazyObject
+        if _is_archived(obj1) or _is_archived(obj2):
+            return _is_archived(obj1) == _is_archived(obj2)
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        archived = app_label == 'mycart' and model_name in ARCHIVE_MODELS
+        if db == ARCHIVE_DB:
+            return archived
+        return False if archived else None
+
+
+class _RequestState:
+    def __init__(self, replica):
+        self.replica = replica
+        self.wrote = False
+
+
+_request_state = ContextVar('replica_request_state', default=None)
+
+
+def start_request(use_replica):
+    """Route this request's eligible reads to a replica; returns a token for `finish_request`."""
+    replicas = settings.DATABASE_REPLICAS
+    replica = random.choice(replicas) if use_replica and replicas else None
+    return _request_state.set(_RequestState(replica))
+
+
+def finish_request(token):
+    """End the request started with `token`; returns True if it wrote to the primary."""
+    state = _request_state.get()
+    _request_state.reset(token)
+    return state is not None and state.wrote
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _request_state.get()
+        if state is None or state.replica is None or model._meta.label_lower not in REPLICA_MODELS:
+            return None
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            # read your own writes for the rest of the request
+            state.replica = None
+            state.wrote = True
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        same_data = {PRIMARY_DB, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in same_data and obj2._state.db in same_data:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas are copies of the primary, never migrated on their own
+        return False if db in settings.DATABASE_REPLICAS else None
@@ -0,0 +1,55 @@
+from django.core.signals import request_finished
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import carts, metrics, profiling
+from .catalog import bump_catalog_version
+from .models import Cart, CartItem, Category, Product, ProfileCapture
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def product_changed(sender, **kwargs):
+    bump_catalog_version()
+
+
+@receiver(post_save, sender=Cart)
+@receiver(post_delete, sender=Cart)
+def cart_changed(sender, instance, **kwargs):
+    # also covers bulk item changes, which the views follow with a cart save
+    carts.invalidate_summary(instance.user_id)
+
+
+@receiver(post_save, sender=CartItem)
+@receiver(post_delete, sender=CartItem)
+def cart_item_changed(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Cart) or (isinstance(origin, QuerySet) and origin.model is Cart):
+        return  # deleted along with its cart, which invalidates the summary itself
+    if CartItem.cart.is_cached(instance):
+        user_id = instance.cart.user_id
+    else:
+        user_id = Cart.objects.filter(pk=instance.cart_id).values_list('user_id', flat=True).first()
+    if user_id is not None:
+        carts.invalidate_summary(user_id)
+
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    metrics.DB_CONNECTIONS_OPENED.inc(alias=connection.alias)
+
+
+@receiver(request_finished)
+def count_open_connections(sender, **kwargs):
+    # connected after Django's close_old_connections, so this sees what is kept
+    for conn in connections.all(initialized_only=True):
+        metrics.DB_CONNECTIONS.set(int(conn.connection is not None), alias=conn.alias)
+
+
+@receiver(post_delete, sender=ProfileCapture)
+def profile_capture_deleted(sender, instance, **kwargs):
+    profiling.delete_files(instance)
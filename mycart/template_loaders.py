@@ -0,0 +1,58 @@
+"""Template loader that strips insignificant whitespace from template source.
+
+Wrap the real loaders with it, inside the cached loader so the work is done
+once per template per process::
+
+    ('django.template.loaders.cached.Loader', [
+        ('mycart.template_loaders.MinifyingLoader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ])
+
+Any run of whitespace that contains a line break becomes a single newline,
+which drops indentation, trailing spaces and blank lines but renders the same:
+HTML treats one whitespace character like many. ``<pre>``, ``<textarea>`` and
+``<script>`` blocks are kept verbatim, since whitespace in them can matter.
+"""
+import re
+
+from django.template import Origin
+from django.template.loaders.base import Loader
+
+VERBATIM_BLOCK = re.compile(r'(<(pre|textarea|script)\b.*?</\2\s*>)', re.IGNORECASE | re.DOTALL)
+LINE_BREAK_RUN = re.compile(r'[ \t\r\f\v]*\n\s*')
+
+
+def minify(source):
+    parts = VERBATIM_BLOCK.split(source)
+    # split() yields text, block, tag name, text, block, tag name, ...
+    out = []
+    for i, part in enumerate(parts):
+        kind = i % 3
+        if kind == 0:
+            out.append(LINE_BREAK_RUN.sub('\n', part))
+        elif kind == 1:
+            out.append(part)
+    return ''.join(out)
+
+
+class MinifyingLoader(Loader):
+    def __init__(self, engine, loaders):
+        super().__init__(engine)
+        self.loaders = engine.get_template_loaders(loaders)
+
+    def get_contents(self, origin):
+        return minify(origin.source_loader.get_contents(origin))
+
+    def get_template_sources(self, template_name):
+        for loader in self.loaders:
+            for origin in loader.get_template_sources(template_name):
+                # claim the origin, or the cached loader would read it from `loader` directly
+                wrapped = Origin(origin.name, origin.template_name, loader=self)
+                wrapped.source_loader = loader
+                yield wrapped
+
+    def reset(self):
+        for loader in self.loaders:
+            loader.reset()
@@ -0,0 +1,29 @@
+from django import template
+from django.utils.html import format_html
+
+from mycart.idempotency import IDEMPOTENCY_FIELD, new_key
+
+register = template.Library()
+
+
+def _key_for(context):
+    request = context.get('request')
+    # pages written by prerender_catalog are shared by every visitor
+    if getattr(request, 'prerender', False):
+        return ''
+    return new_key()
+
+
+@register.simple_tag(takes_context=True)
+def idempotency_key(context):
+    """A fresh idempotency key for a link's query string (empty when pre-rendering)."""
+    return _key_for(context)
+
+
+@register.simple_tag(takes_context=True)
+def idempotency_field(context):
+    """Hidden form input carrying a fresh idempotency key."""
+    key = _key_for(context)
+    if not key:
+        return ''
+    return format_html('<input type="hidden" name="{}" value="{}">', IDEMPOTENCY_FIELD, key)
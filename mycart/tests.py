@@ -1,3 +1,1252 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.signals import user_login_failed
+from django.contrib.messages import get_messages
+from django.contrib.sessions.models import Session
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connections
+from django.http import HttpResponse, StreamingHttpResponse
+from django.template import Context, Engine, TemplateSyntaxError
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from mycart import (
+    api, carts, compression, exports, listings, metrics, pincodes, prerender, profiling, receipts, throttle,
+    typeahead,
+)
+from mycart.catalog import facet_counts
+from mycart.template_loaders import minify
+from mycart.typeahead import TypeaheadIndex
+from mycart.warmup import warm_templates, warm_up
+from mycart.models import (
+    ArchivedOrder, Cart, CartItem, Category, IdempotencyKey, Order, OrderItem, Product, ProfileCapture, User,
+)
+from mycart.views import ORDERS_PER_PAGE
+
+FAST_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+PRODUCTS = 60
+ORDERS = 25
+ITEMS_PER_ORDER = 4
+CART_LINES = 12
+
+
+def seed_catalog(count=PRODUCTS):
+    mobiles, _ = Category.objects.get_or_create(slug='mobiles', defaults={'name': 'Mobiles'})
+    Product.objects.bulk_create([
+        Product(
+            name=f'Phone {i}',
+            brand=('Apple', 'Samsung', 'Vivo')[i % 3],
+            price=5000 + i * 1000,
+            old_price=8000 + i * 1000,
+            image=f'products/phone{i}.jpg',
+            description='Seeded product.',
+            category=mobiles,
+        )
+        for i in range(count)
+    ])
+    return list(Product.objects.order_by('id'))
+
+
+def seed_orders(user, products, orders=ORDERS, items=ITEMS_PER_ORDER):
+    for n in range(orders):
+        order = Order.objects.create(order_id=f'{user.pk}-{n}', user=user, name='Test', total=0)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=products[(n + i) % len(products)], quantity=1 + i, price=1000)
+            for i in range(items)
+        ])
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class QueryBudgetTests(TestCase):
+    """Every view must run a fixed number of queries, however much data exists.
+
+    Budgets include the session and user lookups done by middleware and the
+    SAVEPOINT statements TestCase wraps around atomic blocks and session saves.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = seed_catalog()
+        cls.user = User.objects.create_user(
+            email='buyer@example.com', username='buyer', phone='9000000001', password='secret-pass'
+        )
+        seed_orders(cls.user, cls.products)
+        cart = Cart.objects.create(user=cls.user)
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart, product=p, quantity=2) for p in cls.products[:CART_LINES]
+        ])
+
+    def setUp(self):
+        cache.clear()
+
+    def login(self):
+        self.client.force_login(self.user)
+
+    def set_session_cart(self, products):
+        session = self.client.session
+        session['cart'] = [{'product_id': p.id, 'price': p.price} for p in products] + [p.id for p in products]
+        session.save()
+
+    def test_home(self):
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('home'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_mobiles(self):
+        # first view fills the facet cache; later views only read it.
+        # category, page count and the page of products
+        self.client.get(reverse('mobiles'))
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('mobiles'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_mobiles_filtered(self):
+        self.client.get(reverse('mobiles'))
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('mobiles'), {'brand': 'Apple', 'sort': '-price'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([p.brand for p in response.context['products']], ['Apple'] * 6)
+
+    def test_cart_guest(self):
+        self.set_session_cart(self.products[:CART_LINES])
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('cart'))
+        self.assertEqual(len(response.context['cart_items']), CART_LINES)
+        self.assertTrue(all(item['quantity'] == 2 for item in response.context['cart_items']))
+
+    def test_cart_logged_in(self):
+        self.login()
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('cart'))
+        self.assertEqual(len(response.context['cart_items']), CART_LINES)
+
+    def test_order(self):
+        self.login()
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('order'))
+        self.assertContains(response, 'Phone 0')
+        self.assertEqual(len(response.context['orders']), ORDERS)
+
+    def test_login_merges_session_cart(self):
+        merged = self.products[CART_LINES - 2:CART_LINES + 8]  # overlaps the DB cart
+        self.set_session_cart(merged)
+        # includes stamping the cart's updated_at; the account is looked up once, by authenticate()
+        with self.assertNumQueries(20):
+            response = self.client.post(
+                reverse('login'), {'email': self.user.email, 'password': 'secret-pass'}
+            )
+        self.assertRedirects(response, reverse('home'), fetch_redirect_response=False)
+        quantities = dict(CartItem.objects.filter(cart__user=self.user).values_list('product_id', 'quantity'))
+        self.assertEqual(len(quantities), CART_LINES + 8)
+        self.assertEqual(quantities[merged[0].id], 4)
+        self.assertEqual(quantities[merged[-1].id], 2)
+        self.assertNotIn('cart', self.client.session)
+
+    def test_place_order(self):
+        session = self.client.session
+        session['buy_id'] = self.products[0].id
+        session.save()
+        # the order and its item are written in one transaction: two savepoint queries here
+        with self.assertNumQueries(9):
+            response = self.client.post(reverse('place_order'), {
+                'name': 'Test', 'address': 'Street 1', 'pincode': '560001',
+            })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Order.objects.filter(user=None).count(), 1)
+
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = seed_catalog(5)
+        cls.user = User.objects.create(email='buyer@example.com', username='buyer')
+        seed_orders(cls.user, cls.products, orders=5, items=2)
+        Order.objects.create(order_id='guest', name='Guest', total=0)
+
+    def test_csv_matches_orders(self):
+        # one query for the orders and one prefetch of items per chunk of two
+        with self.assertNumQueries(1 + 3):
+            rows = list(csv.reader(exports.stream_orders(Order.objects.all(), 'csv', chunk_size=2)))
+        self.assertEqual(rows[0], exports.CSV_HEADER)
+        self.assertEqual(len(rows), 1 + 5 * 2 + 1)
+        first = dict(zip(rows[0], rows[1]))
+        item = OrderItem.objects.filter(order__order_id=first['order_id']).order_by('id').first()
+        self.assertEqual(first['user_email'], 'buyer@example.com')
+        self.assertEqual(
+            (first['product_name'], first['quantity'], first['subtotal']),
+            (item.product.name, str(item.quantity), str(item.subtotal())),
+        )
+        # orders without items still get a row
+        self.assertEqual(rows[-1][0], 'guest')
+        self.assertEqual(rows[-1][7:], ['', '', '', '', ''])
+
+    def test_jsonl_command(self):
+        out = io.StringIO()
+        call_command('export_orders', format='jsonl', user='buyer@example.com', chunk_size=2, stdout=out)
+        records = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([r['order_id'] for r in records], [f'{self.user.pk}-{n}' for n in range(5)])
+        self.assertEqual(
+            [(i['product_id'], i['quantity']) for i in records[1]['items']],
+            [(self.products[1].id, 1), (self.products[2].id, 2)],
+        )
+
+
+class CatalogAPITests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = seed_catalog(7)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cursor_pagination_and_fields(self):
+        url = reverse('api_product_list')
+        seen, cursor = [], None
+        while True:
+            params = {'limit': 3, 'fields': 'name,price'}
+            if cursor:
+                params['cursor'] = cursor
+            page = self.client.get(url, params).json()
+            seen += page['results']
+            cursor = page['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual([row['id'] for row in seen], [p.id for p in self.products])
+        self.assertEqual(set(seen[0]), {'id', 'name', 'price'})
+        self.assertEqual(seen[0]['price'], 5000)
+
+        apple = self.client.get(url, {'brand': 'Apple', 'fields': 'brand'}).json()['results']
+        self.assertEqual({row['brand'] for row in apple}, {'Apple'})
+        for params in ({'fields': 'password'}, {'limit': 0}, {'cursor': '!!'}):
+            self.assertEqual(self.client.get(url, params).status_code, 400)
+
+    def test_batch(self):
+        url = reverse('api_product_batch')
+        ids = [self.products[2].id, 999999, self.products[0].id, self.products[2].id]
+        with self.assertNumQueries(1):
+            body = self.client.get(url, {'ids': ','.join(map(str, ids)), 'fields': 'name'}).json()
+        self.assertEqual([row['name'] for row in body['results']], ['Phone 2', 'Phone 0'])
+        self.assertEqual(body['missing'], [999999])
+
+        too_many = ','.join(str(n) for n in range(api.MAX_BATCH_SIZE + 1))
+        self.assertEqual(self.client.get(url, {'ids': too_many}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'ids': '1,x'}).status_code, 400)
+
+    def test_etag_follows_catalog_version(self):
+        url = reverse('api_product_list')
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        product = self.products[0]
+        product.price = 4000
+        product.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class CatalogListingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = seed_catalog(9)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_mobiles_page_lists_filtered_products(self):
+        response = self.client.get(reverse('mobiles'), {'brand': 'Samsung', 'sort': 'price'})
+        self.assertEqual(
+            [p.name for p in response.context['products']], ['Phone 1', 'Phone 4', 'Phone 7'],
+        )
+        self.assertContains(response, 'Phone 4')
+        self.assertNotContains(response, 'Phone 3<')
+
+        second = self.client.get(reverse('mobiles'), {'page': 2})
+        self.assertEqual([p.name for p in second.context['products']], ['Phone 2', 'Phone 1', 'Phone 0'])
+
+    def test_facets_are_cached_until_the_catalog_changes(self):
+        mobiles = Category.objects.get(slug='mobiles')
+        response = self.client.get(reverse('mobiles'))
+        self.assertContains(response, 'Phone 8')
+        facets = response.context['facets']
+        self.assertEqual([(b['brand'], b['count']) for b in facets['brands']], [('Apple', 3), ('Samsung', 3), ('Vivo', 3)])
+        self.assertEqual({b['slug']: b['count'] for b in facets['price_bands']}['under-10k'], 5)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(facet_counts(mobiles), facets)
+        Product.objects.create(name='Phone X', brand='Apple', price=90000, category=mobiles, description='New.')
+        self.assertEqual(facet_counts(mobiles)['brands'][0]['count'], 4)
+        self.assertContains(self.client.get(reverse('mobiles')), 'Phone X')
+
+
+class PrerenderTests(TransactionTestCase):
+    """Pages are rendered on worker threads, which only see committed rows."""
+
+    def setUp(self):
+        cache.clear()
+        self.products = seed_catalog(3)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings_override = override_settings(PRERENDER_ROOT=directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def prerender(self):
+        out = io.StringIO()
+        call_command('prerender_catalog', stdout=out)
+        return out.getvalue()
+
+    def test_only_changed_pages_are_rendered_and_served(self):
+        self.assertIn('7 rendered, 0 unchanged', self.prerender())
+        self.assertIn('0 rendered, 7 unchanged', self.prerender())
+
+        url = reverse('product_detail', args=[self.products[1].id])
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertIn(b'Phone 1', b''.join(response.streaming_content))
+
+        product = self.products[1]
+        product.name = 'Phone One'
+        product.save()
+        # the product page, the home pages and the listings that show it
+        self.assertIn('5 rendered, 2 unchanged', self.prerender())
+        # picked up by the running middleware without a restart
+        self.assertIn(b'Phone One', b''.join(self.client.get(url).streaming_content))
+        # visitors with a session get the live view
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = 'x'
+        self.assertContains(self.client.get(url), 'Phone One')
+
+    def test_only_listed_pages_are_served(self):
+        self.prerender()
+        with open(os.path.join(settings.PRERENDER_ROOT, 'stray.html'), 'w') as fh:
+            fh.write('left over')
+        self.assertEqual(self.client.get('/stray.html').status_code, 404)
+        self.assertEqual(self.client.get('/' + prerender.MANIFEST_NAME).status_code, 404)
+        self.assertEqual(self.client.get('/index.html.gz').status_code, 404)
+        response = self.client.get(reverse('home'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+
+class WarmUpTests(TestCase):
+    def test_warm_up_compiles_templates_and_primes_caches(self):
+        seed_catalog(3)
+        cache.clear()
+        timings = warm_up()
+        self.assertGreater(timings['urls'][0], 20)
+        self.assertGreater(timings['templates'][0], 10)
+        self.assertEqual(timings['catalog'][0], Category.objects.count())
+        with self.assertNumQueries(0):
+            facet_counts()
+
+    def test_broken_template_fails_boot(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with open(os.path.join(directory, 'broken.html'), 'w') as fh:
+            fh.write('{% if %}')
+        templates = [{**settings.TEMPLATES[0], 'DIRS': [directory]}]
+        with override_settings(TEMPLATES=templates), self.assertRaises(TemplateSyntaxError):
+            warm_templates()
+
+    def test_production_settings_need_a_secret_key(self):
+        env = {k: v for k, v in os.environ.items() if k != 'DJANGO_SECRET_KEY'}
+        result = subprocess.run(
+            [sys.executable, '-c', 'import myshop.settings_production'],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        self.assertIn('ImproperlyConfigured: Set the DJANGO_SECRET_KEY', result.stderr)
+
+    def test_production_caches_are_shared_between_workers(self):
+        env = {**os.environ, 'DJANGO_SECRET_KEY': 'test'}
+        result = subprocess.run(
+            [sys.executable, '-c', 'from myshop.settings_production import CACHES; '
+             'print(*sorted(c["BACKEND"] for c in CACHES.values()))'],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True,
+        )
+        # a per-process cache would keep other workers on an old catalog version
+        self.assertNotIn('locmem', result.stdout)
+
+
+class MediaTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings_override = override_settings(MEDIA_ROOT=directory, MEDIA_SENDFILE_MODE=None)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.data = bytes(range(256)) * 4
+        os.makedirs(os.path.join(directory, 'products'))
+        with open(os.path.join(directory, 'products', 'phone.jpg'), 'wb') as fh:
+            fh.write(self.data)
+        self.url = reverse('media', kwargs={'path': 'products/phone.jpg'})
+
+    def get(self, **headers):
+        response = self.client.get(self.url, **headers)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_ranges(self):
+        response, body = self.get()
+        self.assertEqual((response.status_code, body), (200, self.data))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+        response, body = self.get(HTTP_RANGE='bytes=10-19')
+        self.assertEqual((response.status_code, body), (206, self.data[10:20]))
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/1024')
+        self.assertEqual(response['Content-Length'], '10')
+        # suffix and open-ended ranges, clamped to the file
+        self.assertEqual(self.get(HTTP_RANGE='bytes=-100')[1], self.data[-100:])
+        self.assertEqual(self.get(HTTP_RANGE='bytes=1000-5000')[1], self.data[1000:])
+        # multi-range requests are answered with the whole file
+        self.assertEqual(self.get(HTTP_RANGE='bytes=0-1,5-6')[0].status_code, 200)
+
+        response, _ = self.get(HTTP_RANGE='bytes=2000-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */1024')
+
+    def test_conditional_requests(self):
+        response, _ = self.get()
+        etag, modified = response['ETag'], response['Last-Modified']
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag)[0].status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=modified)[0].status_code, 304)
+
+        # If-Range: the range only applies while the file is unchanged
+        self.assertEqual(self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag)[0].status_code, 206)
+        self.assertEqual(self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=modified)[0].status_code, 206)
+        response, body = self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual((response.status_code, body), (200, self.data))
+
+    def test_offload_and_missing_files(self):
+        with override_settings(MEDIA_SENDFILE_MODE='x-accel-redirect'):
+            response, body = self.get()
+        self.assertEqual(response['X-Accel-Redirect'], '/_media_internal/products/phone.jpg')
+        self.assertEqual(body, b'')
+        self.assertEqual(self.client.get(reverse('media', kwargs={'path': 'products/none.jpg'})).status_code, 404)
+        self.assertEqual(self.client.get(reverse('media', kwargs={'path': '../settings.py'})).status_code, 404)
+
+class IdempotencyTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = seed_catalog(3)
+
+    @mock.patch('mycart.views.time.time', return_value=1700000000.0)
+    def test_same_second_order_id_is_reported(self, _):
+        Order.objects.create(order_id='1700000000', total=0)
+        session = self.client.session
+        session['buy_id'] = self.products[0].id
+        session.save()
+        response = self.client.post(reverse('place_order'), {'name': 'Test'})
+        self.assertRedirects(response, reverse('address'), fetch_redirect_response=False)
+        # nothing of the failed order is left behind
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertFalse(OrderItem.objects.exists())
+
+    def test_failed_order_is_not_replayed(self):
+        session = self.client.session
+        session['buy_id'] = self.products[0].id
+        session.save()
+        data = {'name': 'Test', 'idempotency_key': 'f' * 32}
+        Order.objects.create(order_id='1700000000', total=0)
+        with mock.patch('mycart.views.time.time', return_value=1700000000.0):
+            first = self.client.post(reverse('place_order'), data)
+        self.assertRedirects(first, reverse('address'), fetch_redirect_response=False)
+        # the retry with the same key places the order instead of replaying the failure
+        second = self.client.post(reverse('place_order'), data)
+        order = Order.objects.get(user=None, name='Test')
+        self.assertRedirects(second, reverse('order_qr', args=[order.order_id]), fetch_redirect_response=False)
+        self.assertNotIn('Idempotent-Replayed', second)
+
+    def test_place_order_replay_creates_one_order(self):
+        session = self.client.session
+        session['buy_id'] = self.products[0].id
+        session.save()
+        data = {'name': 'Test', 'address': 'Street 1', 'pincode': '560001', 'idempotency_key': 'k' * 32}
+        first = self.client.post(reverse('place_order'), data)
+        second = self.client.post(reverse('place_order'), data)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(second['Location'], first['Location'])
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+
+    def test_add_to_cart_replay_is_not_counted_twice(self):
+        url = reverse('add_to_cart', args=[self.products[0].id])
+        self.client.get(url, {'idempotency_key': 'a' * 32})
+        self.client.get(url, {'idempotency_key': 'a' * 32})
+        self.client.get(url, {'idempotency_key': 'b' * 32})
+        self.assertEqual(len(self.client.session['cart']), 2)
+
+    def test_request_without_key_runs_normally(self):
+        url = reverse('add_to_cart', args=[self.products[0].id])
+        self.client.get(url)
+        self.client.get(url)
+        self.assertEqual(len(self.client.session['cart']), 2)
+
+
+class PincodeTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = seed_catalog(1)
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        source = os.path.join(directory, 'pincodes.csv')
+        with open(source, 'w') as fh:
+            fh.write('pincode,zone,eta_days,serviceable\n')
+            fh.write('560001,metro,2,1\n110001,metro,3,yes\n799001,special,9,0\n400001,metro,2,\n')
+        self.data_file = os.path.join(directory, 'pincodes.bin')
+        call_command('build_pincodes', source, output=self.data_file, stdout=io.StringIO())
+        settings_override = override_settings(PINCODE_DATA_FILE=self.data_file)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_lookup(self):
+        self.assertEqual(pincodes.lookup('560001'), (560001, 'metro', True, 2))
+        self.assertEqual(pincodes.lookup('400001').eta_days, 2)
+        self.assertFalse(pincodes.lookup('799001').serviceable)
+        self.assertIsNone(pincodes.lookup('560002'))
+        self.assertIsNone(pincodes.lookup('0123'))
+
+    def test_check_endpoint(self):
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('pincode_check'), {'pincode': '110001'})
+        self.assertEqual(response.json()['eta_days'], 3)
+
+    def test_place_order_rejects_unserviceable_pincode(self):
+        session = self.client.session
+        session['buy_id'] = self.products[0].id
+        session.save()
+        response = self.client.post(reverse('place_order'), {'pincode': '799001'})
+        self.assertRedirects(response, reverse('address'), fetch_redirect_response=False)
+        self.assertFalse(Order.objects.exists())
+
+
+class TypeaheadTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.index = TypeaheadIndex([
+            (1, 'Samsung Galaxy S24'),
+            (2, 'Samsung Galaxy A15 5G'),
+            (3, 'Apple iPhone 15'),
+            (4, 'OnePlus Nord 5G'),
+        ])
+
+    def test_prefix(self):
+        self.assertEqual([pk for pk, _ in self.index.suggest('sam')], [1, 2])
+        self.assertEqual([pk for pk, _ in self.index.suggest('5g no')], [4])
+        self.assertEqual(self.index.suggest('sam', limit=1), [(1, 'Samsung Galaxy S24')])
+
+    def test_typo(self):
+        self.assertEqual(self.index.suggest('iphnoe')[0][0], 3)
+        self.assertEqual([pk for pk, _ in self.index.suggest('galxy a15')], [2])
+        self.assertEqual(self.index.suggest('xyz'), [])
+
+    def test_suggest_endpoint(self):
+        products = seed_catalog(5)
+        self.client.get(reverse('search_suggest'), {'q': 'warm'})
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('search_suggest'), {'q': 'phone 3'})
+        self.assertEqual(response.json()['suggestions'][0]['id'], products[3].id)
+
+    def test_index_expires(self):
+        product = seed_catalog(1)[0]
+        self.assertEqual(typeahead.suggest('zenfone'), [])
+        # a bulk update sends no signals, so the catalog version stays the same
+        Product.objects.filter(pk=product.pk).update(name='Zenfone 11')
+        self.assertEqual(typeahead.suggest('zenfone'), [])
+        later = time.monotonic() + typeahead.INDEX_MAX_AGE + 1
+        with mock.patch('mycart.typeahead.time.monotonic', return_value=later):
+            self.assertEqual(typeahead.suggest('zenfone'), [(product.pk, 'Zenfone 11')])
+
+
+def scrape(client):
+    samples = {}
+    for line in client.get(reverse('metrics')).content.decode().splitlines():
+        if line and not line.startswith('#'):
+            name, value = line.rsplit(' ', 1)
+            samples[name] = float(value)
+    return samples
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class MetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.products = seed_catalog(3)
+
+    def test_business_counters(self):
+        before = scrape(self.client)
+        self.client.get(reverse('mobiles'))
+        self.client.get(reverse('mobiles'))
+        self.client.post(reverse('add_to_cart', args=[self.products[0].id]))
+        self.client.post(reverse('add_to_cart', args=[self.products[1].id]))
+        self.client.post(reverse('remove_from_cart', args=[self.products[1].id]))
+        session = self.client.session
+        session['buy_id'] = self.products[0].id
+        session.save()
+        self.client.post(reverse('place_order'), {'name': 'A'})
+        # same second, same order id
+        self.client.post(reverse('place_order'), {'name': 'B'})
+        after = scrape(self.client)
+
+        def delta(name):
+            return after.get(name, 0) - before.get(name, 0)
+
+        self.assertEqual(delta('mycart_cart_additions_total{cart="session"}'), 2)
+        self.assertEqual(delta('mycart_cart_removals_total{cart="session"}'), 1)
+        self.assertEqual(delta('mycart_place_order_total{outcome="success"}'), 1)
+        self.assertEqual(delta('mycart_place_order_total{outcome="duplicate_order_id"}'), 1)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(delta('mycart_request_duration_seconds_count{view="place_order"}'), 2)
+        self.assertEqual(delta('mycart_cache_lookups_total{cache="facets",result="hit"}'), 1)
+        self.assertIn('mycart_cache_hit_ratio{cache="facets"}', after)
+
+    def test_forbidden_to_anonymous_remote_clients(self):
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='203.0.113.9')
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(THROTTLE_PROXY_COUNT=1, METRICS_TOKEN='scrape-secret')
+    def test_behind_a_local_proxy(self):
+        url = reverse('metrics')
+        proxied = {'REMOTE_ADDR': '127.0.0.1', 'HTTP_X_FORWARDED_FOR': '203.0.113.9'}
+        self.assertEqual(self.client.get(url, **proxied).status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer wrong', **proxied).status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer scrape-secret', **proxied).status_code, 200)
+        self.assertEqual(self.client.get(url, REMOTE_ADDR='127.0.0.1', HTTP_X_FORWARDED_FOR='::1').status_code, 200)
+
+    def test_aggregates_process_files(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        exited = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'], capture_output=True)
+        for pid, value in ((os.getpid(), 2), (int(exited.stdout), 3)):
+            store = metrics._Store(os.path.join(directory, f'metrics-{pid}.db'))
+            store.add(metrics._key(metrics.CART_ADDITIONS.name, {'cart': 'user'}), value)
+            store.set(metrics._key(metrics.DB_CONNECTIONS.name, {'alias': 'default'}), 1)
+        with override_settings(METRICS_DIR=directory):
+            text = metrics.render()
+        self.assertIn('mycart_cart_additions_total{cart="user"} 5\n', text)
+        # the exited process no longer holds a connection
+        self.assertIn('mycart_db_connections{alias="default"} 1\n', text)
+
+
+class GarbageCollectionTests(TestCase):
+    databases = {'default', 'archive'}
+
+    def test_collect_garbage(self):
+        now = timezone.now()
+        Session.objects.bulk_create([
+            Session(session_key=f'{i:032d}', session_data='', expire_date=now - timedelta(days=1))
+            for i in range(7)
+        ] + [Session(session_key='live' * 8, session_data='', expire_date=now + timedelta(days=1))])
+        products = seed_catalog(1)
+        users = [User.objects.create(username=f'u{i}', email=f'u{i}@example.com') for i in range(4)]
+        empty_old, full_old, abandoned, fresh = [Cart.objects.create(user=user) for user in users]
+        CartItem.objects.create(cart=full_old, product=products[0])
+        CartItem.objects.create(cart=abandoned, product=products[0])
+        Cart.objects.filter(pk__in=[empty_old.pk, full_old.pk]).update(updated_at=now - timedelta(days=10))
+        Cart.objects.filter(pk=abandoned.pk).update(updated_at=now - timedelta(days=100))
+        IdempotencyKey.objects.create(key='old', scope='s:x')
+        IdempotencyKey.objects.update(created_at=now - timedelta(days=1))
+        IdempotencyKey.objects.create(key='new', scope='s:x')
+
+        out = io.StringIO()
+        call_command('collect_garbage', chunk_size=3, pause=0, stdout=out)
+        self.assertIn('expired sessions: 7 deleted', out.getvalue())
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['live' * 8])
+        self.assertEqual(set(Cart.objects.all()), {full_old, fresh})
+        self.assertEqual(CartItem.objects.count(), 1)
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['new'])
+
+    def test_other_database_leaves_default_alone(self):
+        Session.objects.create(session_key='x' * 32, session_data='', expire_date=timezone.now() - timedelta(days=1))
+        out = io.StringIO()
+        call_command('collect_garbage', database='archive', pause=0, vacuum=True, stdout=out)
+        # the archive holds none of the cleaned tables
+        self.assertNotIn('deleted', out.getvalue())
+        self.assertTrue(Session.objects.exists())
+
+
+class OrderArchiveTests(TestCase):
+    databases = {'default', 'archive'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = seed_catalog(5)
+        cls.user = User.objects.create(email='old@example.com', username='old')
+        seed_orders(cls.user, cls.products, orders=ORDERS_PER_PAGE + 5, items=2)
+        old = Order.objects.order_by('id')[:5]
+        Order.objects.filter(id__in=[o.id for o in old]).update(created_at=timezone.now() - timedelta(days=400))
+
+    def test_archive_and_page_into_it(self):
+        call_command('archive_orders', days=365, chunk_size=2, stdout=io.StringIO())
+        self.assertEqual(Order.objects.count(), ORDERS_PER_PAGE)
+        self.assertEqual(ArchivedOrder.objects.count(), 5)
+        self.assertEqual(OrderItem.objects.count(), ORDERS_PER_PAGE * 2)
+
+        self.client.force_login(self.user)
+        # the only recent page: the user's flag, not the archive, decides whether to offer it
+        with self.assertNumQueries(0, using='archive'):
+            response = self.client.get(reverse('order'))
+        self.assertEqual(len(response.context['orders']), ORDERS_PER_PAGE)
+        self.assertFalse(response.context['in_archive'])
+        self.assertContains(response, 'Show archived orders')
+
+        response = self.client.get(reverse('order'), {'page': 2})
+        self.assertTrue(response.context['in_archive'])
+        self.assertEqual(len(response.context['orders']), 5)
+        self.assertIsNone(response.context['next_page'])
+        self.assertContains(response, 'Phone 0')
+
+        # re-running is harmless, and flags users archived before the flag existed
+        User.objects.filter(pk=self.user.pk).update(has_archived_orders=False)
+        call_command('archive_orders', days=365, stdout=io.StringIO())
+        self.assertEqual(ArchivedOrder.objects.count(), 5)
+        self.assertTrue(User.objects.get(pk=self.user.pk).has_archived_orders)
+
+    def test_archive_link_needs_archived_orders(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('order')).context['next_page'], 2)
+        # the last page of recent orders, and nothing archived
+        with self.assertNumQueries(0, using='archive'):
+            response = self.client.get(reverse('order'), {'page': 2})
+        self.assertEqual(len(response.context['orders']), 5)
+        self.assertIsNone(response.context['next_page'])
+        self.assertNotContains(response, 'Show archived orders')
+
+        # an archive database that was never migrated reads as empty
+        with connections['archive'].cursor() as cursor:
+            cursor.execute('DROP TABLE mycart_archivedorderitem')
+            cursor.execute('DROP TABLE mycart_archivedorder')
+        with self.assertLogs('mycart.archive', 'WARNING'):
+            response = self.client.get(reverse('order'), {'page': 3})
+        self.assertEqual((response.status_code, response.context['orders']), (200, []))
+
+    def test_logged_in_cart_and_checkout_with_archive_router(self):
+        # request.user is a SimpleLazyObject; relating it to a cart or an order goes through allow_relation
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('add_to_cart', args=[self.products[0].id]))
+        self.assertRedirects(response, reverse('cart'), fetch_redirect_response=False)
+        self.assertEqual(CartItem.objects.get(cart__user=self.user).product, self.products[0])
+
+        session = self.client.session
+        session['buy_id'] = self.products[0].id
+        session.save()
+        response = self.client.post(reverse('place_order'), {'name': 'Test', 'pincode': '560001'})
+        order = Order.objects.filter(user=self.user).latest('id')
+        self.assertRedirects(response, reverse('order_qr', args=[order.order_id]), fetch_redirect_response=False)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(TransactionTestCase):
+    """The test replica mirrors the default database over a second connection,
+    which only sees committed rows, hence TransactionTestCase."""
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.products = seed_catalog(3)
+
+    def test_catalog_reads_use_replica_until_client_writes(self):
+        with self.assertNumQueries(0, using='default'):
+            response = self.client.get(reverse('mobiles'))
+        self.assertEqual(len(response.context['products']), 3)
+        self.assertNotIn('pin_primary', response.cookies)
+
+        # checking the product is published is a catalog read; the session write then pins the client
+        with self.assertNumQueries(1, using='replica'):
+            response = self.client.get(reverse('add_to_cart', args=[self.products[0].id]))
+        self.assertIn('pin_primary', response.cookies)
+
+        # pinned: the next page reads from the primary
+        with self.assertNumQueries(0, using='replica'):
+            self.client.get(reverse('mobiles'))
+
+    def test_reads_outside_requests_use_primary(self):
+        with self.assertNumQueries(0, using='replica'):
+            self.assertEqual(Product.objects.count(), 3)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class ProfilingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = seed_catalog(3)
+        cls.staff = User.objects.create(email='ops@example.com', username='ops', is_staff=True, is_superuser=True)
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings_override = override_settings(PROFILE_ROOT=directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_signed_token_profiles_request(self):
+        self.client.force_login(self.staff)
+        token = profiling.make_token(self.staff)
+        response = self.client.get(reverse('cart'), {'_profile': token})
+        capture = ProfileCapture.objects.get()
+        self.assertEqual(response['X-Profile-Capture'], capture.name)
+        self.assertEqual((capture.view_name, capture.trigger, capture.status_code), ('cart', 'token', 200))
+        self.assertEqual(capture.path, reverse('cart'))
+        self.assertIn('cumulative', profiling.top_functions(capture))
+
+        page = self.client.get(reverse('admin:mycart_profilecapture_change', args=[capture.pk]))
+        self.assertContains(page, 'Top functions by cumulative time')
+        stacks = self.client.get(reverse('admin:mycart_profilecapture_collapsed', args=[capture.pk]))
+        self.assertEqual(stacks.status_code, 200)
+
+        capture.delete()
+        self.assertFalse(any(os.path.exists(p) for p in profiling.profile_paths(capture.name)))
+
+    def test_token_ignored_for_other_users(self):
+        token = profiling.make_token(self.staff)
+        self.client.get(reverse('cart'), {'_profile': token})
+        self.client.get(reverse('cart'), {'_profile': 'forged'}, HTTP_X_PROFILE='forged')
+        self.assertFalse(ProfileCapture.objects.exists())
+
+    def test_random_sampling(self):
+        with override_settings(PROFILE_SAMPLE_RATE=1.0):
+            self.client.get(reverse('mobiles'))
+        self.assertEqual(ProfileCapture.objects.get().trigger, 'sample')
+
+    def test_old_captures_are_deleted(self):
+        with override_settings(PROFILE_SAMPLE_RATE=1.0, PROFILE_MAX_CAPTURES=2):
+            for _ in range(3):
+                self.client.get(reverse('mobiles'))
+        self.assertEqual(ProfileCapture.objects.count(), 2)
+        self.assertEqual(len(os.listdir(settings.PROFILE_ROOT)), 2 * 2)
+
+        ProfileCapture.objects.filter(pk=ProfileCapture.objects.earliest('created_at').pk).update(
+            created_at=timezone.now() - timedelta(days=settings.PROFILE_MAX_AGE_DAYS + 1),
+        )
+        out = io.StringIO()
+        call_command('collect_garbage', pause=0, stdout=out)
+        self.assertIn('old profile captures: 1 deleted', out.getvalue())
+        self.assertEqual(len(os.listdir(settings.PROFILE_ROOT)), 2)
+
+
+def image_upload(name='phone.png', size=(1600, 900), fmt='PNG'):
+    from PIL import Image
+
+    data = io.BytesIO()
+    Image.new('RGB', size, (30, 120, 200)).save(data, fmt)
+    data.seek(0)
+    data.name = name
+    return data
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, LISTING_IMAGE_WORKERS=0)
+class ListingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create(email='seller@example.com', username='seller')
+        cls.mobiles, _ = Category.objects.get_or_create(slug='mobiles', defaults={'name': 'Mobiles'})
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        uploads = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, uploads)
+        settings_override = override_settings(MEDIA_ROOT=directory, LISTING_UPLOAD_ROOT=uploads)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.media_root = directory
+        self.upload_root = uploads
+        self.client.force_login(self.seller)
+
+    def post_listing(self, photo, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('sell'), {
+                'name': 'Pixel 9', 'brand': 'Google', 'category': self.mobiles.pk,
+                'price': 60000, 'description': 'Seller listing.', 'photo': photo, **fields,
+            })
+
+    def test_prices_must_be_positive(self):
+        for fields in ({'price': 0}, {'price': -1}, {'old_price': 100}):
+            response = self.post_listing(image_upload(), **fields)
+            self.assertEqual(response.status_code, 200)
+            field = 'old_price' if 'old_price' in fields else 'price'
+            self.assertTrue(response.context['form'].has_error(field))
+        self.assertFalse(Product.objects.filter(seller=self.seller).exists())
+
+    def test_upload_is_processed_and_published(self):
+        response = self.post_listing(image_upload())
+        self.assertRedirects(response, reverse('sell'))
+        product = Product.objects.get(seller=self.seller)
+        self.assertEqual(product.status, Product.PUBLISHED)
+        self.assertEqual(product.source_file, '')
+        self.assertEqual(product.image.name, product.image_variants['main'])
+        self.assertEqual(set(product.image_variants), {'main', 'medium', 'thumb'})
+        for name in product.image_variants.values():
+            self.assertTrue(os.path.exists(os.path.join(self.media_root, name)))
+        # the streamed original is removed once the variants exist, and never was under MEDIA_ROOT
+        self.assertEqual(os.listdir(self.upload_root), [])
+        self.assertEqual(os.listdir(self.media_root), ['products'])
+        self.assertContains(self.client.get(reverse('search_suggest'), {'q': 'pixel 9'}), 'Pixel 9')
+
+    def test_pending_listing_is_hidden(self):
+        with open(os.path.join(self.upload_root, 'upload'), 'wb') as fh:
+            fh.write(image_upload().getvalue())
+        product = Product.objects.create(
+            name='Pixel 9', price=60000, description='Seller listing.', category=self.mobiles,
+            seller=self.seller, status=Product.PENDING, source_file='upload',
+        )
+        self.assertNotContains(self.client.get(reverse('search_suggest'), {'q': 'pixel 9'}), 'Pixel 9')
+        self.assertEqual(self.client.get(reverse('product_detail', args=[product.pk])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('add_to_cart', args=[product.pk])).status_code, 404)
+        self.assertFalse(CartItem.objects.exists())
+        self.assertContains(self.client.get(reverse('sell')), 'Processing')
+
+        # claimed by another worker: left alone unless retried explicitly
+        Product.objects.filter(pk=product.pk).update(status=Product.PROCESSING)
+        self.assertIsNone(listings.process_listing(product.pk))
+        call_command('process_listings', stdout=io.StringIO())
+        product.refresh_from_db()
+        self.assertEqual(product.status, Product.PROCESSING)
+
+        call_command('process_listings', retry_processing=True, stdout=io.StringIO())
+        product.refresh_from_db()
+        self.assertEqual(product.status, Product.PUBLISHED)
+        # processed exactly once
+        self.assertIsNone(listings.process_listing(product.pk))
+        self.assertContains(self.client.get(reverse('search_suggest'), {'q': 'pixel 9'}), 'Pixel 9')
+
+    def test_invalid_image_is_rejected(self):
+        bogus = io.BytesIO(b'not an image at all')
+        bogus.name = 'phone.jpg'
+        self.post_listing(bogus)
+        product = Product.objects.get(seller=self.seller)
+        self.assertEqual(product.status, Product.REJECTED)
+        self.assertIn('Could not use this photo', product.processing_error)
+        self.assertContains(self.client.get(reverse('sell')), 'Rejected')
+
+    def test_oversized_upload_is_refused(self):
+        with override_settings(LISTING_MAX_UPLOAD_SIZE=1024):
+            response = self.post_listing(image_upload(size=(400, 400), fmt='BMP'))
+        self.assertContains(response, 'must be smaller than')
+        self.assertFalse(Product.objects.exists())
+        self.assertEqual(os.listdir(self.upload_root), [])
+
+
+class ReceiptTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create(email='owner@example.com', username='owner')
+        cls.order = Order.objects.create(order_id='1700000000', user=cls.owner, total=56999)
+
+    def test_receipt_round_trip_and_tampering(self):
+        token = receipts.make_receipt(self.order)
+        receipt = receipts.verify_receipt(token)
+        self.assertEqual((receipt.order_id, receipt.total), ('1700000000', 56999))
+        self.assertEqual(int(receipt.issued_at.timestamp()), int(self.order.created_at.timestamp()))
+
+        payload, signature = token.rsplit(':', 1)
+        forged = receipts._signer().sign_object(['1700000000', 1, 0]).rsplit(':', 1)[0]
+        for bad in (f'{forged}:{signature}', f'{payload}:{signature[::-1]}', 'garbage'):
+            with self.assertRaises(receipts.InvalidReceipt):
+                receipts.verify_receipt(bad)
+
+        Order.objects.filter(pk=self.order.pk).update(created_at=timezone.now() - timedelta(days=2))
+        self.order.refresh_from_db()
+        with override_settings(RECEIPT_MAX_AGE=60 * 60), self.assertRaisesMessage(receipts.InvalidReceipt, 'expired'):
+            receipts.verify_receipt(receipts.make_receipt(self.order))
+
+    def test_verify_endpoint_needs_no_database(self):
+        token = receipts.make_receipt(self.order)
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('receipt_verify'), {'r': token})
+            scanned = self.client.get(reverse('receipt_verify'), {'data': f'https://shop.example/accounts/thanks/?r={token}'})
+            forged = self.client.get(reverse('receipt_verify'), {'r': token[:-1]})
+        self.assertEqual(response.json()['order_id'], '1700000000')
+        self.assertEqual(scanned.json()['total'], 56999)
+        self.assertEqual((forged.status_code, forged.json()['valid']), (400, False))
+
+    def test_qr_flow(self):
+        self.assertEqual(self.client.get(reverse('order_qr', args=[self.order.order_id])).status_code, 404)
+        self.client.force_login(self.owner)
+        page = self.client.get(reverse('order_qr', args=[self.order.order_id]))
+        token = receipts.make_receipt(self.order)
+        self.assertContains(page, token.replace(':', '%3A'))
+        self.assertNotContains(page, 'api.qrserver.com')
+
+        self.assertContains(self.client.get(reverse('thanks'), {'r': token}), 'Verified receipt')
+        self.assertContains(self.client.get(reverse('thanks'), {'r': token + 'x'}), 'not valid')
+        url = f"http://testserver{reverse('thanks')}?r={token}"
+        self.assertContains(self.client.get(reverse('qr_result'), {'data': url}), 'Valid receipt')
+
+    def test_receipt_total_comes_from_the_product(self):
+        product = seed_catalog(1)[0]
+        session = self.client.session
+        session['buy_id'] = product.id
+        session.save()
+        response = self.client.post(reverse('place_order'), {'name': 'Guest', 'display_price': 1})
+        order = Order.objects.get(user=None)
+        self.assertEqual((order.total, order.items.get().price), (product.price, product.price))
+
+        # the guest who placed it sees the receipt; a stranger guessing the id does not
+        page = self.client.get(response['Location'])
+        self.assertEqual(page.status_code, 200)
+        receipt = receipts.verify_receipt(receipts.token_from_scan(page.context['receipt_url']))
+        self.assertEqual(receipt.total, product.price)
+        self.client.logout()
+        self.assertEqual(self.client.get(response['Location']).status_code, 404)
+
+
+class RefuseAllBackend(ModelBackend):
+    def user_can_authenticate(self, user):
+        return False
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, THROTTLE_RATES={
+    'login_ip': (4, 60), 'login_account': (2, 60), 'signup_ip': (1, 60),
+    'reset_ip': (1, 60), 'reset_account': (1, 60),
+})
+class ThrottleTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='user@example.com', username='user', phone='9000000001', password='right')
+
+    def setUp(self):
+        caches['throttle'].clear()
+
+    def attempt(self, password, ip='203.0.113.1', email='user@example.com'):
+        return self.client.post(reverse('login'), {'email': email, 'password': password}, REMOTE_ADDR=ip)
+
+    def test_account_locked_after_failures_without_queries(self):
+        self.assertEqual(self.attempt('wrong').status_code, 302)
+        self.assertEqual(self.attempt('wrong', ip='203.0.113.2').status_code, 302)
+        with self.assertNumQueries(0):
+            response = self.attempt('right', ip='203.0.113.3')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '30')
+        self.assertContains(response, 'Too many login attempts', status_code=429)
+
+    def test_ip_limit_and_reset_on_success(self):
+        self.assertEqual(self.attempt('wrong').status_code, 302)
+        self.assertRedirects(self.attempt('right'), reverse('home'), fetch_redirect_response=False)
+        self.client.logout()
+        # the successful login emptied the account bucket
+        self.assertEqual(self.attempt('wrong').status_code, 302)
+        self.assertEqual(self.attempt('wrong', email='nobody@example.com').status_code, 302)
+        self.assertEqual(self.attempt('right').status_code, 429)
+        self.assertEqual(self.attempt('right', ip='203.0.113.9').status_code, 302)
+
+    def test_failure_messages(self):
+        for email, message in [('nobody@example.com', 'No account found. Please signup first.'),
+                               ('user@example.com', 'Incorrect password!')]:
+            response = self.attempt('wrong', email=email)
+            self.assertEqual([str(m) for m in get_messages(response.wsgi_request)], [message])
+            self.client.logout()
+
+    @override_settings(AUTHENTICATION_BACKENDS=['mycart.tests.RefuseAllBackend'])
+    def test_login_goes_through_authentication_backends(self):
+        failures = []
+        def record(sender, credentials, **kwargs):
+            failures.append(credentials['username'])
+        user_login_failed.connect(record)
+        self.addCleanup(user_login_failed.disconnect, record)
+        self.assertRedirects(self.attempt('right'), reverse('login'), fetch_redirect_response=False)
+        self.assertNotIn('_auth_user_id', self.client.session)
+        self.assertEqual(failures, ['user@example.com'])
+
+    def test_signup_and_reset_throttled(self):
+        data = {'username': 'new', 'email': 'new@example.com', 'phone': '9000000002', 'password': 'pw'}
+        self.assertEqual(self.client.post(reverse('signup'), data).status_code, 302)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.post(reverse('signup'), data).status_code, 429)
+        self.assertEqual(self.client.post(reverse('forgot_password'), {'phone': 'x'}).status_code, 302)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.post(reverse('forgot_password'), {'phone': 'x'}).status_code, 429)
+
+    def test_proxy_client_ip(self):
+        request = RequestFactory().get('/', HTTP_X_FORWARDED_FOR='1.1.1.1, 198.51.100.7', REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(throttle.client_ip(request), '10.0.0.1')
+        with override_settings(THROTTLE_PROXY_COUNT=1):
+            self.assertEqual(throttle.client_ip(request), '198.51.100.7')
+
+
+class CompressionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed_catalog(3)
+
+    def test_pages_are_gzipped_when_accepted(self):
+        plain = self.client.get(reverse('home'))
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', plain['Vary'])
+        response = self.client.get(reverse('home'), HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertLess(int(response['Content-Length']), len(plain.content) // 2)
+
+    def test_streaming_responses_compress_incrementally(self):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+        produced = []
+
+        def rows():
+            for n in range(5000):
+                produced.append(n)
+                yield f'{n},Phone {n},{n * 1000}\n'.encode()
+
+        response = compression.compress_response(request, StreamingHttpResponse(rows(), content_type='text/csv'))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        stream = iter(response.streaming_content)
+        first = next(stream)
+        # the first rows went out, in one flush, before the generator was drained
+        self.assertLess(len(produced), 5000)
+        self.assertGreater(len(produced), 100)
+        body = gzip.decompress(first + b''.join(stream))
+        self.assertEqual(body.decode().splitlines()[4999], '4999,Phone 4999,4999000')
+
+    def test_gzip_is_padded_against_breach(self):
+        body = b'<input name="csrfmiddlewaretoken" value="secret">' * 20
+        sizes = set()
+        for _ in range(20):
+            for compressed in (compression.compress_bytes(body, 'gzip'),
+                               b''.join(compression.compress_stream(iter([body]), 'gzip'))):
+                self.assertEqual(gzip.decompress(compressed), body)
+                sizes.add(len(compressed))
+        self.assertGreater(len(sizes), 1)
+
+    def test_no_brotli_for_session_dependent_responses(self):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='br, gzip')
+        with mock.patch.object(compression, 'brotli', mock.Mock()):
+            self.assertEqual(compression.choose_encoding(request, HttpResponse()), 'br')
+            response = HttpResponse()
+            response['Vary'] = 'Cookie'
+            self.assertEqual(compression.choose_encoding(request, response), 'gzip')
+
+    def test_empty_chunk_flushes_the_stream(self):
+        chunks = iter([b'ready\n', b'', b'done\n'])
+        stream = compression.compress_stream(chunks, 'gzip')
+        first = next(stream)
+        self.assertEqual(zlib.decompressobj(31).decompress(first), b'ready\n')
+        self.assertEqual(gzip.decompress(first + b''.join(stream)), b'ready\ndone\n')
+
+    def test_streamed_export_compresses_like_one_shot(self):
+        user = User.objects.create(email='buyer@example.com', username='buyer')
+        seed_orders(user, list(Product.objects.all()), orders=300, items=3)
+        csv_body = ''.join(exports.stream_orders(Order.objects.all(), 'csv')).encode()
+        streamed = b''.join(compression.compress_stream(
+            (line.encode() for line in exports.stream_orders(Order.objects.all(), 'csv')), 'gzip'
+        ))
+        self.assertEqual(gzip.decompress(streamed), csv_body)
+        one_shot = gzip.compress(csv_body, compression.GZIP_LEVEL)
+        self.assertLess(len(streamed), len(one_shot) * 1.1)
+
+    def test_skips_small_binary_and_encoded_bodies(self):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+        cases = [
+            HttpResponse(b'tiny', content_type='text/html'),
+            HttpResponse(b'\xff' * 5000, content_type='image/jpeg'),
+            HttpResponse(b'a' * 5000, content_type='text/html', headers={'Content-Encoding': 'br'}),
+            HttpResponse(b'a' * 5000, content_type='text/html', headers={'Cache-Control': 'no-transform'}),
+        ]
+        for response in cases:
+            self.assertNotEqual(compression.compress_response(request, response).get('Content-Encoding'), 'gzip')
+
+    def test_minifying_loader(self):
+        source = '<div>\r\n    <p>{{ a }}  b</p>\r\n\r\n    <pre>  x\n  y</pre>\n  <script>\n  var s = `1\n  2`;\n</script>\n</div>\n'
+        self.assertEqual(
+            minify(source),
+            '<div>\n<p>{{ a }}  b</p>\n<pre>  x\n  y</pre>\n<script>\n  var s = `1\n  2`;\n</script>\n</div>\n',
+        )
+        engine = Engine(dirs=[os.path.join(settings.BASE_DIR, 'templates')], loaders=[
+            ('django.template.loaders.cached.Loader', [
+                ('mycart.template_loaders.MinifyingLoader', ['django.template.loaders.filesystem.Loader']),
+            ]),
+        ])
+        template = engine.get_template('order_qr.html')
+        self.assertNotIn('\n    ', template.source)
+        self.assertIn('<h3>Order Placed</h3>', template.render(Context({'order_id': '42'})))
+
+
+class CartSummaryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = seed_catalog(3)
+        cls.user = User.objects.create(email='shopper@example.com', username='shopper')
+
+    def setUp(self):
+        cache.clear()
+
+    def add(self, product, **params):
+        self.client.get(reverse('add_to_cart', args=[product.pk]), params)
+
+    def test_prices_come_from_products(self):
+        self.add(self.products[0], price=1, name='Cheap phone')
+        self.add(self.products[0], price=1)
+        response = self.client.get(reverse('cart'))
+        line = response.context['cart_items'][0]
+        self.assertEqual((line['price'], line['subtotal'], line['display_name']), (5000, 10000, 'Cheap phone'))
+        self.assertEqual(response.context['total'], 10000)
+        self.assertNotIn('display_price', vars(line['product']))
+
+        # force_login skips the session cart merge, so the user's cart starts empty
+        self.client.force_login(self.user)
+        self.add(self.products[1], price=1)
+        self.assertEqual(self.client.get(reverse('cart')).context['total'], 6000)
+
+    def test_badge_is_cached_and_invalidated(self):
+        self.client.force_login(self.user)
+        self.add(self.products[0])
+        self.assertContains(self.client.get(reverse('home')), 'rounded-pill">1</span>')
+        # session and user only: the summary is a cache hit
+        with self.assertNumQueries(2):
+            self.client.get(reverse('home'))
+
+        self.add(self.products[0])
+        self.add(self.products[1])
+        self.assertContains(self.client.get(reverse('home')), 'rounded-pill">3</span>')
+        self.assertEqual(carts.user_cart_summary(self.user.pk), (3, 2 * 5000 + 6000))
+
+        # changes outside the views invalidate it too, and so do price changes
+        CartItem.objects.get(cart__user=self.user, product=self.products[1]).delete()
+        self.assertEqual(carts.user_cart_summary(self.user.pk), (2, 10000))
+        product = Product.objects.get(pk=self.products[0].pk)
+        product.price = 7000
+        product.save()
+        self.assertEqual(carts.user_cart_summary(self.user.pk), (2, 14000))
+
+    def test_invalidation_reaches_other_workers(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        shared = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory}
+        with override_settings(CACHES={**settings.CACHES, 'default': shared}):
+            # a separate connection to the same cache, as another worker process has
+            other_worker = caches.create_connection('default')
+            self.client.force_login(self.user)
+            self.add(self.products[0])
+            carts.user_cart_summary(self.user.pk)
+            key = carts._summary_key(self.user.pk)
+            self.assertEqual(other_worker.get(key), (1, 5000))
+            CartItem.objects.filter(cart__user=self.user).get().delete()
+            self.assertIsNone(other_worker.get(key))
+
+    def test_guest_badge_needs_no_product_query(self):
+        self.add(self.products[0])
+        self.add(self.products[2])
+        # just the session
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('home'))
+        self.assertContains(response, 'rounded-pill">2</span>')
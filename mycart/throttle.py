@@ -0,0 +1,89 @@
+"""Token-bucket throttling for the login, signup and password-reset views.
+
+Each bucket holds up to `capacity` tokens and refills evenly over `period`
+seconds; an attempt takes one token and is refused when none is left. Buckets
+are keyed per client IP and per account and live in the 'throttle' cache, so
+they cost a cache round trip, not a query, and refused attempts are turned away
+before any database lookup or password hash.
+
+Bucket updates are read-modify-write without a lock: under a parallel burst a
+few extra attempts may get through, never fewer. That is the price of working
+with any cache backend; the limits are sized with it in mind.
+"""
+import hashlib
+import math
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+
+Rate = namedtuple('Rate', 'capacity period')
+
+
+def _cache():
+    return caches[settings.THROTTLE_CACHE]
+
+
+def rate_for(scope):
+    capacity, period = settings.THROTTLE_RATES[scope]
+    return Rate(capacity, period)
+
+
+def client_ip(request):
+    """The client address, skipping THROTTLE_PROXY_COUNT trusted proxies in X-Forwarded-For."""
+    proxies = settings.THROTTLE_PROXY_COUNT
+    if proxies:
+        forwarded = [ip.strip() for ip in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if ip.strip()]
+        if len(forwarded) >= proxies:
+            return forwarded[-proxies]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def _key(scope, ident):
+    # hashed so emails and addresses of any length make valid, fixed-size keys
+    digest = hashlib.blake2b(str(ident).lower().encode(), digest_size=16).hexdigest()
+    return f"throttle:{scope}:{digest}"
+
+
+def _level(state, rate, now):
+    """Tokens in a bucket last saved as `state` ``(tokens, timestamp)``."""
+    if state is None:
+        return float(rate.capacity)
+    tokens, stamp = state
+    return min(rate.capacity, tokens + (now - stamp) * rate.capacity / rate.period)
+
+
+def _retry_after(tokens, rate):
+    return max(1, math.ceil((1 - tokens) * rate.period / rate.capacity))
+
+
+def peek(scope, ident):
+    """Seconds until `ident` may try `scope` again, or 0 when it may now."""
+    if not settings.THROTTLE_ENABLED:
+        return 0
+    rate = rate_for(scope)
+    tokens = _level(_cache().get(_key(scope, ident)), rate, time.time())
+    return 0 if tokens >= 1 else _retry_after(tokens, rate)
+
+
+def consume(scope, ident):
+    """Take a token from `ident`'s `scope` bucket.
+
+    Returns 0 when the attempt may go ahead, otherwise the seconds to wait.
+    """
+    if not settings.THROTTLE_ENABLED:
+        return 0
+    rate = rate_for(scope)
+    key = _key(scope, ident)
+    now = time.time()
+    tokens = _level(_cache().get(key), rate, now)
+    if tokens < 1:
+        return _retry_after(tokens, rate)
+    # a full bucket needs no entry; keep it only as long as the refill takes
+    _cache().set(key, (tokens - 1, now), timeout=math.ceil(rate.period))
+    return 0
+
+
+def reset(scope, ident):
+    _cache().delete(_key(scope, ident))
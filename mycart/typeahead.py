@@ -0,0 +1,182 @@
+"""In-process typeahead over product names.
+
+A prefix trie answers "what starts with what I typed" and a trigram index adds
+typo-tolerant matches. The index is built once per process and rebuilt when the
+catalog version changes, so queries never touch the database. It is also rebuilt
+after INDEX_MAX_AGE, for catalog changes that bypassed the model signals.
+"""
+import heapq
+import re
+import threading
+import time
+
+from .catalog import get_catalog_version
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+DEFAULT_LIMIT = 8
+MIN_SIMILARITY = 0.25
+INDEX_MAX_AGE = 10 * 60
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+def trigrams(word):
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TypeaheadIndex:
+    """Ranked suggestions for ``(id, name)`` entries."""
+
+    def __init__(self, entries):
+        self.entries = list(entries)
+        self.names = [name.lower() for _, name in self.entries]
+        self.trie = {}
+        self.grams = {}          # trigram -> tokens containing it
+        self.token_grams = {}    # token -> its trigrams
+        self.token_entries = {}  # token -> entry indexes
+        for index, name in enumerate(self.names):
+            for token in tokenize(name):
+                self._add_token(token, index)
+        self._freeze(self.trie)
+
+    def _freeze(self, node):
+        """Store each node's entries as (tuple ordered shortest name first, frozenset)."""
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            for char, child in node.items():
+                if char == '':
+                    ordered = tuple(sorted(child, key=lambda i: (len(self.names[i]), i)))
+                    node[''] = (ordered, frozenset(child))
+                else:
+                    stack.append(child)
+
+    def _add_token(self, token, index):
+        node = self.trie
+        for char in token:
+            node = node.setdefault(char, {})
+            node.setdefault('', set()).add(index)
+        if token not in self.token_grams:
+            self.token_grams[token] = grams = trigrams(token)
+            for gram in grams:
+                self.grams.setdefault(gram, set()).add(token)
+        self.token_entries.setdefault(token, set()).add(index)
+
+    def _prefix(self, prefix):
+        """``(ordered, set)`` of the entries having a word that starts with `prefix`."""
+        node = self.trie
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return (), frozenset()
+        return node['']
+
+    def _fuzzy_tokens(self, word):
+        """Indexed tokens similar to `word`, with their trigram Jaccard similarity."""
+        wanted = trigrams(word)
+        shared = {}
+        for gram in wanted:
+            for token in self.grams.get(gram, ()):
+                shared[token] = shared.get(token, 0) + 1
+        similar = {}
+        for token, count in shared.items():
+            score = count / (len(wanted) + len(self.token_grams[token]) - count)
+            if score >= MIN_SIMILARITY:
+                similar[token] = score
+        return similar
+
+    def _matching(self, word):
+        """{entry index: score} for one query word; prefix hits score 1.0."""
+        scores = dict.fromkeys(self._prefix(word)[1], 1.0)
+        if len(word) >= 3:
+            for token, score in self._fuzzy_tokens(word).items():
+                for index in self.token_entries[token]:
+                    if scores.get(index, 0) < score:
+                        scores[index] = score
+        return scores
+
+    def _rank_exact(self, ordered, phrase, limit):
+        """Pick from equally scored, already length-ordered entries; names starting
+        with the phrase first. Stops as soon as `limit` of those are found."""
+        leading, rest = [], []
+        for i in ordered:
+            if self.names[i].startswith(phrase):
+                leading.append(i)
+                if len(leading) == limit:
+                    return leading
+            elif len(rest) < limit:
+                rest.append(i)
+        return (leading + rest)[:limit]
+
+    def suggest(self, query, limit=DEFAULT_LIMIT):
+        """Return up to `limit` ``(id, name)`` pairs, best first.
+
+        Every query word must match a word of the name by prefix or, for words
+        of three or more letters, by trigram similarity. Names are ranked by
+        their total score, then by whether they start with the query, then by
+        length.
+        """
+        words = tokenize(query)
+        if not words:
+            return []
+
+        phrase = ' '.join(words)
+        # when enough names match every word by prefix no fuzzy match can outrank them
+        matches = sorted((self._prefix(word) for word in words), key=lambda m: len(m[1]))
+        exact = matches[0][0]
+        for _, entries in matches[1:]:
+            exact = [i for i in exact if i in entries]
+        if len(exact) >= limit:
+            return [self.entries[i] for i in self._rank_exact(exact, phrase, limit)]
+
+        total = None
+        for word in words:
+            scores = self._matching(word)
+            if total is None:
+                total = scores
+            else:
+                total = {i: total[i] + s for i, s in scores.items() if i in total}
+            if not total:
+                return []
+
+        ranked = heapq.nsmallest(
+            limit, total,
+            key=lambda i: (-total[i], not self.names[i].startswith(phrase), len(self.names[i]), i),
+        )
+        return [self.entries[i] for i in ranked]
+
+
+_lock = threading.Lock()
+_index = None
+_index_version = None
+_index_built = None
+
+
+def build_index():
+    from .models import Product
+
+    return TypeaheadIndex(Product.objects.published().order_by('id').values_list('id', 'name'))
+
+
+def get_index():
+    """The process-wide index, rebuilt when the catalog version changes or it gets old."""
+    global _index, _index_version, _index_built
+    version = get_catalog_version()
+
+    def stale():
+        return version != _index_version or time.monotonic() - _index_built > INDEX_MAX_AGE
+
+    if stale():
+        with _lock:
+            if stale():
+                _index = build_index()
+                _index_version = version
+                _index_built = time.monotonic()
+    return _index
+
+
+def suggest(query, limit=DEFAULT_LIMIT):
+    return get_index().suggest(query, limit)
@@ -1,5 +1,6 @@
 from django.urls import path
 from .import views 
+from . import api
 
 urlpatterns = [
   path('order/', views.order, name='order'),
@@ -7,7 +8,9 @@ urlpatterns = [
   
   path('signup/', views.signup, name='signup'),
   path('search/', views.search, name='search'),
+  path('search/suggest/', views.search_suggest, name='search_suggest'),
   path('items/mobiles/', views.mobiles, name='mobiles'),
+  path('category/<slug:slug>/', views.category_listing, name='category_listing'),
   path('login/', views.login_view, name='login'),
   path('logout/', views.logout_view, name='logout'),
     # Forgot password via phone number
@@ -21,9 +24,15 @@ urlpatterns = [
   path('buy/<int:id>/', views.buy_now, name='buy_now'),
   path('address/', views.address, name='address'),
   path('place-order/', views.place_order, name='place_order'),
+  path('pincode/', views.pincode_check, name='pincode_check'),
   path('order-qr/<str:order_id>/', views.order_qr, name='order_qr'),
   path('thanks/', views.thanks, name='thanks'),
   path("qr-scan/", views.qr_scanner, name="qr_scanner"),
   path("qr-result/", views.qr_result, name="qr_result"),
+  path("receipt/verify/", views.receipt_verify, name="receipt_verify"),
+
+  # read-only JSON catalog API
+  path('api/v1/products/', api.product_list, name='api_product_list'),
+  path('api/v1/products/batch/', api.product_batch, name='api_product_batch'),
 ]
 
@@ -7,38 +7,158 @@ from django.urls import reverse
 from django.core.mail import send_mail  
 import base64
 from django.contrib.auth.decorators import login_required
-from .models import Product, Cart, CartItem, Order, OrderItem
-from django.db import IntegrityError
+from .models import Product, Category, Cart, CartItem, Order, OrderItem
+from .idempotency import idempotent, retryable
+from .catalog import filter_products, facet_counts, PRICE_BANDS, SORT_OPTIONS
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch
 from django.core.paginator import Paginator
+import math
 import time
 from django.utils.http import urlencode
+from django.http import Http404, JsonResponse
+from django.conf import settings
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from . import carts, listings, metrics, pincodes, receipts, throttle, typeahead
+from .carts import session_cart_counts
+from .forms import ListingForm
+from .listings import StreamingDiskUploadHandler, discard_uploads
+from .archive import archived_orders_page
 
 User = get_user_model()
 
 # initial simple home removed; later `home` renders products
 
+ORDERS_PER_PAGE = 25
+
+
 @login_required(login_url='login')
 def order(request):
-    """Show orders placed by the logged-in user with their items and timestamps."""
-    orders = Order.objects.filter(user=request.user).order_by('-created_at')
-    return render(request, 'order.html', {'orders': orders})
+    """Show orders placed by the logged-in user with their items and timestamps.
+
+    Recent orders come from the main database. Paging past the last of them
+    continues into the archive (see mycart.archive); the archive database is
+    only queried on archive pages, and only offered to users who have some.
+    """
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+    start = (page - 1) * ORDERS_PER_PAGE
+    end = start + ORDERS_PER_PAGE
+
+    items = OrderItem.objects.select_related('product').order_by('id')
+    recent = (
+        Order.objects.filter(user=request.user)
+        .order_by('-created_at', '-id')
+        .prefetch_related(Prefetch('items', queryset=items))
+    )
+    # one extra row tells us whether recent history continues on the next page
+    orders = list(recent[start:end + 1])
+    if orders or page == 1:
+        in_archive = False
+        more_recent = len(orders) > ORDERS_PER_PAGE
+        orders = orders[:ORDERS_PER_PAGE]
+        # the page after the last recent one reads from the archive, if it has anything
+        next_page = page + 1 if more_recent or request.user.has_archived_orders else None
+    else:
+        in_archive = True
+        more_recent = False
+        recent_pages = max(math.ceil(recent.count() / ORDERS_PER_PAGE), 1)
+        archive_start = (page - recent_pages - 1) * ORDERS_PER_PAGE
+        orders = archived_orders_page(request.user, archive_start, archive_start + ORDERS_PER_PAGE + 1)
+        next_page = page + 1 if len(orders) > ORDERS_PER_PAGE else None
+        orders = orders[:ORDERS_PER_PAGE]
+
+    return render(request, 'order.html', {
+        'orders': orders,
+        'in_archive': in_archive,
+        'more_recent': more_recent,
+        'previous_page': page - 1 if page > 1 else None,
+        'next_page': next_page,
+    })
 
 @login_required(login_url='login')
+@csrf_exempt
 def sell(request):
-    return render(request, "sell.html")
+    """Seller hub with the new listing form.
+
+    The photo is streamed to disk by StreamingDiskUploadHandler, which has to be
+    installed before anything reads request.POST -- so CSRF is checked by the
+    inner view rather than by the middleware.
+    """
+    handler = None
+    if request.method == 'POST':
+        handler = StreamingDiskUploadHandler(request)
+        request.upload_handlers = [handler]
+    return _sell(request, handler)
+
+
+@csrf_protect
+def _sell(request, handler):
+    if request.method == 'POST':
+        form = ListingForm(request.POST, request.FILES)
+        if handler.too_large:
+            limit = settings.LISTING_MAX_UPLOAD_SIZE // (1024 * 1024)
+            form.add_error('photo', f"The photo must be smaller than {limit} MB.")
+        if form.is_valid():
+            photo = form.cleaned_data['photo']
+            photo.close()
+            product = form.save(commit=False)
+            product.seller = request.user
+            product.status = Product.PENDING
+            product.source_file = photo.path
+            product.save()
+            # processed on the worker pool once the row is visible to other connections
+            transaction.on_commit(lambda: listings.submit(product.pk))
+            messages.success(request, f"'{product.name}' was submitted and goes live once its photo is processed.")
+            return redirect('sell')
+        discard_uploads(request.FILES)
+    else:
+        form = ListingForm()
+    return render(request, "sell.html", {
+        'form': form,
+        'listings': Product.objects.filter(seller=request.user).order_by('-id'),
+    })
 
 
-def mobiles(request):
-    """Render the mobiles listing page stored at templates/items/mobiles.html."""
-    product_list = Product.objects.all().order_by('-id')
+def _listing_context(request, category):
+    """Filtered, sorted and paginated products of `category` plus cached facets."""
+    product_list = Product.objects.published().order_by('-id')
+    if category is not None:
+        product_list = product_list.filter(category=category)
+    product_list, filters = filter_products(product_list, request.GET)
     # paginate - 6 per page
     paginator = Paginator(product_list, 6)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
-    return render(request, 'items/mobiles.html', {'products': page_obj})
+    return {
+        'products': page_obj,
+        'category': category,
+        'facets': facet_counts(category),
+        'filters': filters,
+        'price_bands': PRICE_BANDS,
+        'sort_options': SORT_OPTIONS,
+    }
+
+
+def mobiles(request):
+    """Render the mobiles listing page stored at templates/items/mobiles.html."""
+    category = Category.objects.filter(slug='mobiles').first()
+    return render(request, 'items/mobiles.html', _listing_context(request, category))
+
+
+def category_listing(request, slug):
+    """Product listing for one category with brand / price filters and sorting."""
+    category = get_object_or_404(Category, slug=slug)
+    return render(request, 'items/category.html', _listing_context(request, category))
 
 def signup(request):
     if request.method == "POST":
+        retry_after = throttle.consume('signup_ip', throttle.client_ip(request))
+        if retry_after:
+            return _throttled(request, "signup.html", retry_after)
+
         username = request.POST.get("username")
         email = request.POST.get("email")
         phone = request.POST.get("phone")
@@ -63,44 +183,71 @@ def signup(request):
 
     return render(request, "signup.html")
 
+def _merge_session_cart(request, user):
+    """Fold the anonymous session cart into the user's DB cart.
+
+    Uses a fixed number of queries however many lines the session cart has.
+    """
+    counts, overrides = session_cart_counts(request.session.get('cart', []))
+    if not counts:
+        return
+    # skip ids of products that no longer exist
+    valid = set(Product.objects.filter(id__in=counts).values_list('id', flat=True))
+    if valid:
+        with transaction.atomic():
+            cart_obj, _ = Cart.objects.get_or_create(user=user)
+            existing = list(CartItem.objects.filter(cart=cart_obj, product_id__in=valid))
+            for ci in existing:
+                ci.quantity += counts[ci.product_id]
+            if existing:
+                CartItem.objects.bulk_update(existing, ['quantity'])
+            seen = {ci.product_id for ci in existing}
+            CartItem.objects.bulk_create([
+                CartItem(cart=cart_obj, product_id=pid, quantity=counts[pid])
+                for pid in sorted(valid - seen)
+            ])
+            cart_obj.save(update_fields=['updated_at'])
+        metrics.CART_MERGES.inc(outcome='merged')
+
+    # keep display overrides for the DB cart, then clear session cart after merging
+    if overrides:
+        stored = request.session.get('overrides', {})
+        stored.update({str(pid): o for pid, o in overrides.items() if pid in valid})
+        request.session['overrides'] = stored
+    del request.session['cart']
+
+
+def _throttled(request, template, retry_after):
+    """429 page for an attempt refused by mycart.throttle, before any query or hash."""
+    metrics.THROTTLED.inc(view=request.resolver_match.url_name)
+    response = render(request, template, {'retry_after': retry_after}, status=429)
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
 def login_view(request):
     if request.method == "POST":
-        email = request.POST.get("email")
+        email = (request.POST.get("email") or "").strip()
         password = request.POST.get("password")
 
-        # Check if email exists
-        if not User.objects.filter(email=email).exists():
-            messages.error(request, "No account found. Please signup first.")
-            return redirect("login")
+        # per-IP on every attempt; per-account only counts failures (see below)
+        retry_after = throttle.consume('login_ip', throttle.client_ip(request)) or throttle.peek('login_account', email)
+        if retry_after:
+            return _throttled(request, "login.html", retry_after)
 
         # pass email as `username` so Django's authentication backend looks up by USERNAME_FIELD
         user = authenticate(request, username=email, password=password)
 
         if user:
+            throttle.reset('login_account', email)
             login(request, user)
 
             # Merge any anonymous session cart into the user's DB cart
             try:
-                session_cart = request.session.get('cart', [])
-                if session_cart:
-                    cart_obj, _ = Cart.objects.get_or_create(user=user)
-                    for pid in session_cart:
-                        try:
-                            ci, created = CartItem.objects.get_or_create(cart=cart_obj, product_id=int(pid))
-                            if not created:
-                                ci.quantity = ci.quantity + 1
-                                ci.save()
-                        except IntegrityError:
-                            # skip malformed product ids
-                            continue
-                    # clear session cart after merging
-                    try:
-                        del request.session['cart']
-                    except KeyError:
-                        pass
+                _merge_session_cart(request, user)
             except Exception:
                 # don't break login flow if merging fails
-                pass
+                metrics.CART_MERGES.inc(outcome='failed')
 
             # Handle redirect to 'next' page
             next_url = request.GET.get('next')
@@ -109,7 +256,12 @@ def login_view(request):
 
             return redirect("home")  # Default home page
         else:
-            messages.error(request, "Incorrect password!")
+            throttle.consume('login_account', email)
+            # only failed attempts pay for a second query, to pick the message
+            if not User.objects.filter(email=email).exists():
+                messages.error(request, "No account found. Please signup first.")
+            else:
+                messages.error(request, "Incorrect password!")
             return redirect("login")
 
     return render(request, "login.html")
@@ -122,6 +274,10 @@ def logout_view(request):
 
 def forgot_password(request):
     if request.method == "POST":
+        retry_after = throttle.consume('reset_ip', throttle.client_ip(request))
+        if retry_after:
+            return _throttled(request, "forgot_password.html", retry_after)
+
         phone = request.POST.get("phone")
 
         # user model must have phone field
@@ -148,6 +304,12 @@ def forgot_password(request):
 
 
 def reset_password(request, uid):
+    if request.method == "POST":
+        retry_after = (throttle.consume('reset_ip', throttle.client_ip(request))
+                       or throttle.consume('reset_account', uid))
+        if retry_after:
+            return _throttled(request, "reset_password.html", retry_after)
+
     try:
         user_id = int(base64.urlsafe_b64decode(uid).decode())
         user = User.objects.get(id=user_id)
@@ -167,18 +329,19 @@ def reset_password(request, uid):
 
 
 def home(request):
-    products = Product.objects.all()
+    products = Product.objects.published()
     return render(request, "home.html", {"products": products})
 
 def product_detail(request, id):
-    product = get_object_or_404(Product, id=id)
+    product = get_object_or_404(Product.objects.published(), id=id)
     return render(request, "product_detail.html", {"product": product})
 
 
 def search(request):
     """Search for a product by name. If found, redirect to that product's Buy Now page.
 
-    If multiple matches exist, redirect to the first match. If none found, show an error and
+    If multiple matches exist, redirect to the first match. If no name contains the term, use
+    the closest typo-tolerant typeahead suggestion; if there is none, show an error and
     redirect back to the mobiles listing.
     """
     q = request.GET.get('q', '') or ''
@@ -187,9 +350,13 @@ def search(request):
         messages.error(request, "Please enter a search term.")
         return redirect('mobiles')
 
-    matches = Product.objects.filter(name__icontains=q)
-    if matches.exists():
-        p = matches.first()
+    p = Product.objects.published().filter(name__icontains=q).first()
+    if p is None:
+        # fall back to the typo-tolerant typeahead index
+        suggestions = typeahead.suggest(q, limit=1)
+        if suggestions:
+            p = Product.objects.published().filter(id=suggestions[0][0]).first()
+    if p is not None:
         # Prefer showing the product image passed to buy page
         img = ''
         try:
@@ -205,36 +372,49 @@ def search(request):
     messages.error(request, "Item is not there")
     return redirect('mobiles')
 
+def search_suggest(request):
+    """Typeahead suggestions for the navbar search box as JSON: ?q=&limit="""
+    try:
+        limit = min(max(int(request.GET.get('limit', typeahead.DEFAULT_LIMIT)), 1), 20)
+    except ValueError:
+        limit = typeahead.DEFAULT_LIMIT
+    suggestions = typeahead.suggest(request.GET.get('q', ''), limit)
+    return JsonResponse({'suggestions': [
+        {'id': pid, 'name': name, 'url': reverse('product_detail', args=[pid])}
+        for pid, name in suggestions
+    ]})
+
+@idempotent
 def add_to_cart(request, id):
     """Add product id to session cart (allows duplicates for quantity).
 
     Uses session key 'cart' which stores a list of product ids.
     Redirects to the cart page.
     """
-    # read optional overrides from query params
+    # listings still being processed, or rejected, cannot be bought
+    product = get_object_or_404(Product.objects.published(), id=id)
+    # read optional display overrides from query params; a ?price= is ignored,
+    # carts are always priced from the product
     q_name = request.GET.get('name')
-    q_price = request.GET.get('price')
     q_img = request.GET.get('img')
 
     if request.user.is_authenticated:
         # persist in DB cart
         cart_obj, _ = Cart.objects.get_or_create(user=request.user)
-        ci, created = CartItem.objects.get_or_create(cart=cart_obj, product_id=int(id))
+        # through the related manager so ci.cart is cached for the cart summary signal
+        ci, created = cart_obj.items.get_or_create(product=product)
         if not created:
             ci.quantity += 1
             ci.save()
+        cart_obj.save(update_fields=['updated_at'])
+        metrics.CART_ADDITIONS.inc(cart='user')
 
         # store any display overrides in session so cart view can pick them up
-        if q_name or q_price or q_img:
+        if q_name or q_img:
             overrides = request.session.get('overrides', {})
             overrides[str(id)] = {}
             if q_name:
                 overrides[str(id)]['name'] = q_name
-            if q_price:
-                try:
-                    overrides[str(id)]['price'] = int(q_price)
-                except Exception:
-                    overrides[str(id)]['price'] = q_price
             if q_img:
                 overrides[str(id)]['img'] = q_img
             request.session['overrides'] = overrides
@@ -244,19 +424,15 @@ def add_to_cart(request, id):
 
     # anonymous session cart: store list of entries (either int product_id or dict with overrides)
     cart = request.session.get("cart", [])
-    entry = {'product_id': int(id)}
+    entry = {'product_id': product.pk}
     if q_name:
         entry['name'] = q_name
-    if q_price:
-        try:
-            entry['price'] = int(q_price)
-        except Exception:
-            entry['price'] = q_price
     if q_img:
         entry['img'] = q_img
 
     cart.append(entry)
     request.session["cart"] = cart
+    metrics.CART_ADDITIONS.inc(cart='session')
     messages.success(request, "Product added to cart.")
     return redirect("cart")
 
@@ -264,79 +440,20 @@ def add_to_cart(request, id):
 def cart(request):
     """Render a Bootstrap cart page showing products, quantities and totals.
 
-    The session 'cart' contains a list of product ids; duplicates indicate quantity.
+    Prices always come from the products; session overrides only change the
+    displayed name and image. See mycart.carts.
     """
     if request.user.is_authenticated:
-        # load from DB
-        cart_obj = None
-        try:
-            cart_obj = request.user.cart
-        except Cart.DoesNotExist:
-            cart_obj = None
-
-        cart_items = []
-        total = 0
-        if cart_obj:
-            items = cart_obj.items.select_related('product').all()
-            overrides = request.session.get('overrides', {})
-            for it in items:
-                # apply override price/name/img if present in session
-                override = overrides.get(str(it.product.id), {})
-                display_price = override.get('price') if override.get('price') is not None else it.product.price
-                subtotal = int(display_price) * it.quantity
-                total += subtotal
-                # create a lightweight display product with override fields
-                display_product = it.product
-                display_product.display_name = override.get('name', it.product.name)
-                display_product.display_img = override.get('img', getattr(it.product.image, 'url', ''))
-                display_product.display_price = display_price
-                cart_items.append({"product": display_product, "quantity": it.quantity, "subtotal": subtotal})
-
-        return render(request, "cart.html", {"cart_items": cart_items, "total": total})
-
-    # anonymous session cart
-    # anonymous session cart may contain dict entries with overrides
-    cart_entries = request.session.get("cart", [])
-    counts = {}
-    overrides = {}
-    for e in cart_entries:
-        if isinstance(e, dict):
-            pid = int(e.get('product_id'))
-            counts[pid] = counts.get(pid, 0) + 1
-            # prefer last override for that product id
-            overrides[pid] = {}
-            if 'name' in e:
-                overrides[pid]['name'] = e['name']
-            if 'price' in e:
-                overrides[pid]['price'] = e['price']
-            if 'img' in e:
-                overrides[pid]['img'] = e['img']
-        else:
-            try:
-                pid = int(e)
-                counts[pid] = counts.get(pid, 0) + 1
-            except Exception:
-                continue
-
-    products = Product.objects.filter(id__in=counts.keys()) if counts else Product.objects.none()
-
-    cart_items = []
-    total = 0
-    for p in products:
-        qty = counts.get(p.id, 0)
-        override = overrides.get(p.id, {})
-        display_price = override.get('price') if override.get('price') is not None else p.price
-        subtotal = int(display_price) * qty
-        total += subtotal
-        # set display fields on the product for template use
-        p.display_name = override.get('name', p.name)
-        p.display_img = override.get('img', getattr(p.image, 'url', ''))
-        p.display_price = display_price
-        cart_items.append({"product": p, "quantity": qty, "subtotal": subtotal})
-
-    return render(request, "cart.html", {"cart_items": cart_items, "total": total})
+        # one query for the lines and their products
+        cart_items, summary = carts.user_cart_lines(request.user, request.session.get('overrides', {}))
+    else:
+        # anonymous session cart may contain dict entries with overrides
+        cart_items, summary = carts.session_cart_lines(request.session.get("cart", []))
+    request._cart_count = summary.count
+    return render(request, "cart.html", {"cart_items": cart_items, "total": summary.subtotal})
 
 
+@idempotent
 def remove_from_cart(request, id):
     """Remove one occurrence of product id from session cart or from DB cart if authenticated."""
     if request.user.is_authenticated:
@@ -347,12 +464,14 @@ def remove_from_cart(request, id):
 
         if cart_obj:
             try:
-                ci = CartItem.objects.get(cart=cart_obj, product_id=int(id))
+                ci = cart_obj.items.get(product_id=int(id))
                 if ci.quantity > 1:
                     ci.quantity -= 1
                     ci.save()
                 else:
                     ci.delete()
+                cart_obj.save(update_fields=['updated_at'])
+                metrics.CART_REMOVALS.inc(cart='user')
                 messages.success(request, "Item removed from your cart.")
             except CartItem.DoesNotExist:
                 messages.error(request, "Item not found in your cart.")
@@ -379,6 +498,7 @@ def remove_from_cart(request, id):
 
     if removed:
         request.session["cart"] = cart
+        metrics.CART_REMOVALS.inc(cart='session')
         messages.success(request, "Item removed from cart.")
     else:
         messages.error(request, "Item not found in cart.")
@@ -387,15 +507,12 @@ def remove_from_cart(request, id):
 
 def buy_now(request, id):
     # store the product id being purchased and show a dedicated Buy Now page
+    product = get_object_or_404(Product.objects.published(), id=id)
     request.session["buy_id"] = int(id)
-    product = get_object_or_404(Product, id=id)
-    # derive display fields from query params if provided so the template is simple
+    # derive display fields from query params if provided so the template is simple;
+    # the price always comes from the product, it is what the order will charge
     display_name = request.GET.get('name') or product.name
-    display_price = request.GET.get('price')
-    try:
-        display_price = int(display_price) if display_price is not None else product.price
-    except Exception:
-        display_price = product.price
+    display_price = product.price
 
     display_img = request.GET.get('img') or (product.image.url if product.image else '')
 
@@ -415,52 +532,86 @@ def address(request):
             product = Product.objects.get(id=buy_id)
         except Product.DoesNotExist:
             product = None
-    # allow display overrides via query params (name/price)
+    # allow a display name override via query params; the price is the product's
     display_name = request.GET.get('name') if request.GET.get('name') else (product.name if product else None)
-    display_price = request.GET.get('price') if request.GET.get('price') else (product.price if product else None)
+    display_price = product.price if product else None
     return render(request, "add_details.html", {"product": product, "display_name": display_name, "display_price": display_price})
 
 
+def pincode_check(request):
+    """JSON serviceability and delivery estimate for ?pincode= (no DB access)."""
+    pincode = request.GET.get('pincode', '')
+    if pincodes.normalize(pincode) is None:
+        return JsonResponse({'pincode': pincode, 'valid': False}, status=400)
+    if pincodes.get_table() is None:
+        # no data file installed: serviceability unknown
+        return JsonResponse({'pincode': pincode, 'valid': True, 'serviceable': None})
+    service = pincodes.lookup(pincode)
+    if service is None:
+        return JsonResponse({'pincode': pincode, 'valid': True, 'serviceable': False})
+    return JsonResponse({
+        'pincode': pincode,
+        'valid': True,
+        'serviceable': service.serviceable,
+        'zone': service.zone,
+        'eta_days': service.eta_days,
+    })
+
+
+@idempotent
 def place_order(request):
     # User reaches here after entering address/pincode and clicking Place Order
+    # only the redirect to the placed order is replayed; failures leave the key for a retry
     if request.method != 'POST':
-        return redirect('address')
+        return retryable(redirect('address'))
 
     buy_id = request.session.get('buy_id')
     if not buy_id:
         # nothing to buy
         messages.error(request, 'Nothing to buy. Please select a product first.')
-        return redirect('mobiles')
+        metrics.ORDERS.inc(outcome='nothing_to_buy')
+        return retryable(redirect('mobiles'))
+
+    # reject undeliverable pincodes when serviceability data is installed
+    if pincodes.get_table() is not None:
+        service = pincodes.lookup(request.POST.get('pincode', ''))
+        if service is None or not service.serviceable:
+            messages.error(request, 'Sorry, we do not deliver to this pincode yet.')
+            metrics.ORDERS.inc(outcome='unserviceable_pincode')
+            return retryable(redirect('address'))
+
     # Create a persistent Order and OrderItem
-    product = get_object_or_404(Product, id=buy_id)
+    product = get_object_or_404(Product.objects.published(), id=buy_id)
 
     order_id = str(int(time.time()))
     name = request.POST.get('name', '')
     address = request.POST.get('address', '')
     pincode = request.POST.get('pincode', '')
-    # if the checkout passed a display_price (from mobiles/buy flow), prefer it
-    display_price = request.POST.get('display_price')
-    try:
-        if display_price is not None:
-            display_price = int(display_price)
-    except Exception:
-        display_price = None
-
-    order = Order.objects.create(
-        order_id=order_id,
-        user=request.user if request.user.is_authenticated else None,
-        name=name,
-        address=address,
-        pincode=pincode,
-        total=display_price if display_price is not None else product.price,
-    )
+    # charged, and signed into the receipt, at the product's price; never one the client sent
 
-    OrderItem.objects.create(
-        order=order,
-        product=product,
-        quantity=1,
-        price=display_price if display_price is not None else product.price,
-    )
+    try:
+        with transaction.atomic():
+            order = Order.objects.create(
+                order_id=order_id,
+                user=request.user if request.user.is_authenticated else None,
+                name=name,
+                address=address,
+                pincode=pincode,
+                total=product.price,
+            )
+
+            OrderItem.objects.create(
+                order=order,
+                product=product,
+                quantity=1,
+                price=product.price,
+            )
+    except IntegrityError:
+        # order ids are timestamps, so two orders in the same second collide
+        metrics.ORDERS.inc(outcome='duplicate_order_id')
+        messages.error(request, 'Could not place your order, please try again.')
+        return retryable(redirect('address'))
+    metrics.ORDERS.inc(outcome='success')
 
     # Store minimal last order info in session for backward compatibility
     request.session['last_order'] = {'order_id': order.order_id, 'product_id': buy_id}
@@ -468,25 +619,69 @@ def place_order(request):
     return redirect('order_qr', order_id=order.order_id)
 
 
+def _placed_by(request, order):
+    """True if `order` belongs to the signed-in user, or is the guest order placed in this session."""
+    if order.user_id is not None:
+        return order.user_id == request.user.pk
+    return request.session.get('last_order', {}).get('order_id') == order.order_id
+
+
 def order_qr(request, order_id):
+    order = get_object_or_404(Order, order_id=order_id)
+    # order ids are timestamps and easy to guess; the receipt is only for the buyer
+    if not _placed_by(request, order):
+        raise Http404("No such order.")
     # Build a URL that the QR will point to; scanning it will open a thank-you page.
     thanks_url = request.build_absolute_uri(reverse('thanks'))
-    # include order id as query string
-    full_url = f"{thanks_url}?{urlencode({'order': order_id})}"
+    # the signed receipt lets anyone verify the order and total without a lookup
+    receipt_url = f"{thanks_url}?{urlencode({receipts.RECEIPT_PARAM: receipts.make_receipt(order)})}"
+    # the QR code is drawn in the browser, so the receipt is never sent to a third party
+    return render(request, 'order_qr.html', {'receipt_url': receipt_url, 'order_id': order_id})
+
 
-    # Use a public QR generator (no server-side dependency required)
-    qr_src = f"https://api.qrserver.com/v1/create-qr-code/?size=300x300&data={full_url}"
-    return render(request, 'order_qr.html', {'qr_src': qr_src, 'order_id': order_id})
+def _check_receipt(token):
+    """``(receipt, error)`` for a receipt token; one of the two is None."""
+    try:
+        return receipts.verify_receipt(token), None
+    except receipts.InvalidReceipt as exc:
+        return None, str(exc)
 
 
 def thanks(request):
-    order_id = request.GET.get('order')
-    return render(request, 'thanks.html', {'order_id': order_id})
+    token = request.GET.get(receipts.RECEIPT_PARAM)
+    receipt, error = _check_receipt(token) if token else (None, None)
+    return render(request, 'thanks.html', {
+        'receipt': receipt,
+        'error': error,
+        # links from before receipts were signed; shown, but not as verified
+        'order_id': receipt.order_id if receipt else request.GET.get('order'),
+    })
+
+
+def receipt_verify(request):
+    """Verify a scanned receipt (?r=<token> or ?data=<scanned text>) as JSON.
+
+    Touches no database, cache or session, so it scales with CPU alone.
+    """
+    token = request.GET.get(receipts.RECEIPT_PARAM) or receipts.token_from_scan(request.GET.get('data'))
+    if not token:
+        return JsonResponse({'valid': False, 'error': 'No receipt given.'}, status=400)
+    receipt, error = _check_receipt(token)
+    if receipt is None:
+        return JsonResponse({'valid': False, 'error': error}, status=400)
+    return JsonResponse({
+        'valid': True,
+        'order_id': receipt.order_id,
+        'total': receipt.total,
+        'issued_at': receipt.issued_at.isoformat(),
+    })
 
 def qr_scanner(request):
     return render(request, "qr_scanner.html")
 
 def qr_result(request):
     data = request.GET.get("data", "")
-    return render(request, "qr_result.html", {"data": data})
+    token = receipts.token_from_scan(data)
+    receipt, error = _check_receipt(token) if token else (None, None)
+    return render(request, "qr_result.html", {"data": data, "receipt": receipt, "error": error})
 
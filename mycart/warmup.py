@@ -0,0 +1,105 @@
+"""Pay one-off start-up costs before a worker takes its first request.
+
+Run from gunicorn (``gunicorn.conf.py``) in the master under ``--preload`` so the
+compiled state is shared copy-on-write by every forked worker, or at worker boot
+otherwise. ``manage.py measure_startup`` shows the effect on first-request latency.
+"""
+import os
+import time
+
+from django.apps import apps
+from django.db import connections
+from django.template import TemplateDoesNotExist, engines
+from django.template.utils import get_app_template_dirs
+from django.urls import URLPattern, URLResolver, get_resolver
+
+from . import pincodes, typeahead
+from .catalog import facet_counts, get_catalog_version
+
+
+def _walk_patterns(patterns):
+    for pattern in patterns:
+        # touching .regex compiles (and caches) the pattern's regular expression
+        pattern.pattern.regex
+        if isinstance(pattern, URLResolver):
+            yield from _walk_patterns(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern):
+            yield pattern
+
+
+def warm_urls():
+    """Compile every URL regex and build the reverse() lookup tables."""
+    resolver = get_resolver()
+    count = sum(1 for _ in _walk_patterns(resolver.url_patterns))
+    resolver.reverse_dict  # populates reverse, namespace and app dicts
+    return count
+
+
+def _template_names(directories):
+    for directory in directories:
+        for dirpath, _, filenames in os.walk(directory):
+            for filename in filenames:
+                if filename.endswith('.html'):
+                    full = os.path.join(dirpath, filename)
+                    yield os.path.relpath(full, directory).replace(os.sep, '/')
+
+
+def warm_templates():
+    """Compile every project and app template into the cached loader.
+
+    A template that fails to compile raises here, at boot, rather than on the
+    first request that renders it.
+    """
+    count = 0
+    for engine in engines.all():
+        directories = list(engine.dirs) + list(get_app_template_dirs('templates'))
+        for name in sorted(set(_template_names(directories))):
+            try:
+                engine.get_template(name)
+            except TemplateDoesNotExist:
+                # on disk, but not in a directory this engine's loaders read
+                continue
+            count += 1
+    return count
+
+
+def warm_catalog():
+    """Prime the catalog version and the facet caches used by listing pages."""
+    from .models import Category
+
+    get_catalog_version()
+    facet_counts()
+    categories = list(Category.objects.all())
+    for category in categories:
+        facet_counts(category)
+    return len(categories)
+
+
+def warm_typeahead():
+    """Build the search typeahead index."""
+    return len(typeahead.get_index().entries)
+
+
+def warm_pincodes():
+    """Map the pincode file so forked workers inherit the mapping."""
+    table = pincodes.get_table()
+    return table.count if table is not None else 0
+
+
+def warm_up():
+    """Run every warm-up step; returns ``{step: (items, seconds)}``."""
+    apps.check_models_ready()
+    timings = {}
+    for name, step in (
+        ('urls', warm_urls),
+        ('templates', warm_templates),
+        ('catalog', warm_catalog),
+        ('typeahead', warm_typeahead),
+        ('pincodes', warm_pincodes),
+    ):
+        started = time.perf_counter()
+        items = step()
+        timings[name] = (items, time.perf_counter() - started)
+    # never hand an open connection to forked workers
+    connections.close_all()
+    return timings
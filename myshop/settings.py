@@ -42,14 +42,19 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'mycart.middleware.MetricsMiddleware',
+    'mycart.middleware.CompressionMiddleware',
+    'mycart.middleware.ReplicaPinningMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware', 
+    'mycart.middleware.PrerenderedPageMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'mycart.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'myshop.urls'
@@ -78,6 +83,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'mycart.context_processors.cart',
             ],
         },
     },
@@ -93,7 +99,44 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    },
+    # old orders moved out by `manage.py archive_orders`, which also creates its
+    # tables (`manage.py migrate --database archive`); see mycart.routers
+    'archive': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'archive.sqlite3',
+    },
+    # local stand-in for a read replica, refreshed by `manage.py sync_replica`
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'replica.sqlite3',
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+
+DATABASE_ROUTERS = ['mycart.routers.ArchiveRouter', 'mycart.routers.ReplicaRouter']
+
+# Aliases that catalog and order-history reads may use (comma separated in the
+# environment, e.g. DATABASE_REPLICAS=replica); empty sends everything to default.
+DATABASE_REPLICAS = [alias for alias in os.environ.get('DATABASE_REPLICAS', '').split(',') if alias]
+# How long a client reads from the primary after it wrote something
+REPLICA_PIN_SECONDS = 10
+
+# Orders older than this are moved to the archive database
+ORDER_ARCHIVE_AFTER_DAYS = 365
+
+CACHES = {
+    # catalog version, facet counts and cart summaries; settings_production shares
+    # it between worker processes
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # login/signup token buckets (see mycart.throttle); settings_production shares
+    # it between worker processes
+    'throttle': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'mycart-throttle',
+    },
 }
 
 
@@ -142,6 +185,50 @@ MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Media is served by mycart.media.serve_media. Set MEDIA_SENDFILE_MODE to
+# 'x-accel-redirect' (nginx, internal location at MEDIA_ACCEL_REDIRECT_PREFIX
+# aliased to MEDIA_ROOT) or 'x-sendfile' (Apache / lighttpd) to offload transfers.
+MEDIA_SENDFILE_MODE = os.environ.get('MEDIA_SENDFILE_MODE') or None
+MEDIA_ACCEL_REDIRECT_PREFIX = '/_media_internal/'
+# Cache lifetime for media files without a content hash in their name
+MEDIA_MAX_AGE = 60 * 60
+
+# Pincode serviceability data built by `manage.py build_pincodes` (see mycart.pincodes)
+PINCODE_DATA_FILE = os.path.join(BASE_DIR, 'data', 'pincodes.bin')
+
+# Static HTML written by `manage.py prerender_catalog`, served to anonymous visitors
+PRERENDER_ROOT = os.path.join(BASE_DIR, 'prerendered')
+
+
+# Directory shared by all worker processes for mycart.metrics samples; when
+# unset each process only reports its own samples.
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
+# Clients allowed to scrape /metrics without a staff login: anyone sending
+# "Authorization: Bearer <METRICS_TOKEN>", and these addresses. Behind a reverse
+# proxy set THROTTLE_PROXY_COUNT, or every request looks like the proxy's address.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN') or None
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+
+
+# Request profiling (see mycart.profiling): where captures are written, the share
+# of requests profiled at random, how long a staff profiling token stays valid,
+# how often the stack sampler looks at the view, and how many captures are kept
+# and for how long.
+PROFILE_ROOT = os.path.join(BASE_DIR, 'profiles')
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+PROFILE_TOKEN_MAX_AGE = 60 * 60
+PROFILE_SAMPLE_INTERVAL = 0.001
+PROFILE_MAX_CAPTURES = 500
+PROFILE_MAX_AGE_DAYS = 14
+
+# Seller listings (see mycart.listings): where uploaded photos are streamed to
+# (outside MEDIA_ROOT, so unprocessed uploads are never served), the largest
+# photo accepted, and the image processing threads per worker process (0
+# processes inline, during the request).
+LISTING_UPLOAD_ROOT = os.environ.get('LISTING_UPLOAD_ROOT', os.path.join(BASE_DIR, 'listing-uploads'))
+LISTING_MAX_UPLOAD_SIZE = 15 * 1024 * 1024
+LISTING_IMAGE_WORKERS = int(os.environ.get('LISTING_IMAGE_WORKERS', 2))
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -150,6 +237,28 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 LOGIN_URL = 'login'
 
+# Seconds a stored idempotency key outcome is replayed for (see mycart.idempotency)
+IDEMPOTENCY_KEY_TTL = 60 * 10
+
+# Throttling of login, signup and password reset (see mycart.throttle): buckets
+# of (capacity, refill period in seconds) per client IP and per account, kept in
+# the 'throttle' cache. THROTTLE_PROXY_COUNT is the number of reverse proxies
+# in front of the app whose X-Forwarded-For entries can be trusted; /metrics
+# uses it too.
+THROTTLE_ENABLED = True
+THROTTLE_CACHE = 'throttle'
+THROTTLE_RATES = {
+    'login_ip': (20, 60),
+    'login_account': (5, 5 * 60),
+    'signup_ip': (5, 60 * 60),
+    'reset_ip': (5, 15 * 60),
+    'reset_account': (3, 15 * 60),
+}
+THROTTLE_PROXY_COUNT = int(os.environ.get('THROTTLE_PROXY_COUNT', 0))
+
+# Seconds a signed order receipt (see mycart.receipts) stays valid; None never expires
+RECEIPT_MAX_AGE = 60 * 60 * 24 * 180
+
 # api key for sending otp
 
 FAST2SMS_API_KEY = "T59plXn3fUSc1GvWy0uxOLmhe8BodgKwZaiMsR6qtrJC7kHAVIkExa8tiMfKV52uehNogLlXWYCOHRZm"
@@ -0,0 +1,66 @@
+"""
+Production settings for myshop.
+
+Select with DJANGO_SETTINGS_MODULE=myshop.settings_production (gunicorn.conf.py
+does this by default). Everything not overridden here comes from settings.py.
+"""
+
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .settings import *  # noqa: F401,F403
+from .settings import ALLOWED_HOSTS, CACHES, DATABASES, TEMPLATES
+
+DEBUG = False
+
+# the key in settings.py is committed to the repository; never sign with it here
+SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY')
+if not SECRET_KEY:
+    raise ImproperlyConfigured("Set the DJANGO_SECRET_KEY environment variable.")
+
+ALLOWED_HOSTS = os.environ.get('DJANGO_ALLOWED_HOSTS', ','.join(ALLOWED_HOSTS)).split(',')
+
+# Compile each template once per process instead of on every render, with the
+# indentation stripped from its source (see mycart.template_loaders).
+TEMPLATES[0]['APP_DIRS'] = False
+TEMPLATES[0]['OPTIONS']['loaders'] = [
+    ('django.template.loaders.cached.Loader', [
+        ('mycart.template_loaders.MinifyingLoader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]),
+]
+
+# Reuse database connections across requests.
+DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('DJANGO_CONN_MAX_AGE', 60))
+DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
+# Hashed static file names never change, so let whitenoise serve them forever.
+WHITENOISE_MAX_AGE = 60 * 60 * 24 * 365
+
+SESSION_COOKIE_SECURE = True
+CSRF_COOKIE_SECURE = True
+
+# Aggregate metrics across gunicorn workers (cleared by gunicorn.conf.py at start-up).
+METRICS_DIR = os.environ.get('METRICS_DIR', '/tmp/myshop-metrics')
+# Behind a local proxy every request comes from 127.0.0.1, so no address is
+# trusted by default: scrape with METRICS_TOKEN.
+METRICS_ALLOWED_IPS = [ip for ip in os.environ.get('METRICS_ALLOWED_IPS', '').split(',') if ip]
+
+# The catalog version, facet counts and cart summaries on local disk, so a write
+# handled by one gunicorn worker retires the cached copies in all of them.
+CACHES['default'] = {
+    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+    'LOCATION': os.environ.get('CACHE_DIR', '/tmp/myshop-cache'),
+    'OPTIONS': {'MAX_ENTRIES': 10000},
+}
+
+# Throttle buckets on local disk, so every gunicorn worker on the host sees the
+# same counts; a per-process cache would multiply the limits by the worker count.
+CACHES['throttle'] = {
+    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+    'LOCATION': os.environ.get('THROTTLE_CACHE_DIR', '/tmp/myshop-throttle'),
+    'OPTIONS': {'MAX_ENTRIES': 10000},
+}